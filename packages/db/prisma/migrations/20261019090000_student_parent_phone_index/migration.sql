@@ -0,0 +1,2 @@
+-- Bot parent lookups match Student."parentPhone" by a single canonical +998XXXXXXXXX key.
+CREATE INDEX IF NOT EXISTS "Student_parentPhone_status_idx" ON "Student"("parentPhone", "status");
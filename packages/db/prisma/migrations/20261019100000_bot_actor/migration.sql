@@ -0,0 +1,279 @@
+-- Denormalized Telegram actor resolution for the bot, maintained by triggers.
+-- Eligibility statuses mirror ELIGIBLE_* in python-aiogram/db/repository.py.
+
+CREATE TABLE IF NOT EXISTS "BotActor" (
+  "telegramUserId" TEXT NOT NULL,
+  "type" TEXT NOT NULL,
+  "userId" TEXT,
+  "studentId" TEXT NOT NULL,
+  "studentCode" TEXT NOT NULL,
+  "fullName" TEXT NOT NULL,
+  "phone" TEXT NOT NULL,
+  "parentPhone" TEXT,
+  "children" JSONB NOT NULL DEFAULT '[]',
+  "isEligible" BOOLEAN NOT NULL,
+  "updatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT "BotActor_pkey" PRIMARY KEY ("telegramUserId")
+);
+
+CREATE OR REPLACE FUNCTION km_student_is_eligible(p_student_id TEXT) RETURNS BOOLEAN
+LANGUAGE sql STABLE AS $$
+  SELECT EXISTS (
+    SELECT 1
+    FROM "Enrollment" e
+    JOIN "GroupCatalog" g ON g.id = e."groupId"
+    WHERE e."studentId" = p_student_id
+      AND e.status IN ('TRIAL', 'ACTIVE')
+      AND g.status IN ('REJADA', 'OCHIQ', 'BOSHLANGAN')
+  )
+$$;
+
+-- Returns the expected "BotActor" row as JSONB (NULL when the Telegram id is not linked).
+-- Resolution order matches the bot: eligible student account, then eligible children of a
+-- parent contact; otherwise a non-eligible row for whichever link exists.
+CREATE OR REPLACE FUNCTION km_bot_actor_compute(p_tg TEXT) RETURNS JSONB
+LANGUAGE plpgsql STABLE AS $$
+DECLARE
+  st RECORD;
+  has_student BOOLEAN;
+  children JSONB;
+  parent_phone TEXT;
+BEGIN
+  IF p_tg IS NULL THEN
+    RETURN NULL;
+  END IF;
+
+  SELECT
+    u.id AS user_id, s.id, s."studentCode", s."fullName", s.phone, s."parentPhone",
+    (u.role = 'STUDENT' AND u."isActive" AND s.status = 'ACTIVE' AND km_student_is_eligible(s.id)) AS eligible
+  INTO st
+  FROM "User" u
+  JOIN "Student" s ON s."userId" = u.id
+  WHERE u."telegramUserId" = p_tg
+  LIMIT 1;
+  has_student := FOUND;
+
+  IF has_student AND st.eligible THEN
+    RETURN jsonb_build_object(
+      'telegramUserId', p_tg, 'type', 'STUDENT', 'userId', st.user_id,
+      'studentId', st.id, 'studentCode', st."studentCode", 'fullName', st."fullName",
+      'phone', st.phone, 'parentPhone', st."parentPhone", 'children', '[]'::jsonb, 'isEligible', true
+    );
+  END IF;
+
+  SELECT pc.phone INTO parent_phone FROM "ParentContact" pc WHERE pc."telegramUserId" = p_tg;
+
+  IF parent_phone IS NOT NULL THEN
+    SELECT jsonb_agg(
+      jsonb_build_object(
+        'id', s.id, 'studentCode', s."studentCode", 'userId', s."userId",
+        'fullName', s."fullName", 'phone', s.phone, 'parentPhone', s."parentPhone"
+      )
+      ORDER BY s."createdAt" DESC, s.id
+    )
+    INTO children
+    FROM "Student" s
+    WHERE s."parentPhone" = parent_phone
+      AND s.status = 'ACTIVE'
+      AND km_student_is_eligible(s.id);
+
+    IF children IS NOT NULL THEN
+      RETURN jsonb_build_object(
+        'telegramUserId', p_tg, 'type', 'PARENT', 'userId', NULL,
+        'studentId', children->0->>'id', 'studentCode', children->0->>'studentCode',
+        'fullName', children->0->>'fullName', 'phone', children->0->>'phone',
+        'parentPhone', children->0->>'parentPhone', 'children', children, 'isEligible', true
+      );
+    END IF;
+  END IF;
+
+  IF has_student THEN
+    RETURN jsonb_build_object(
+      'telegramUserId', p_tg, 'type', 'STUDENT', 'userId', st.user_id,
+      'studentId', st.id, 'studentCode', st."studentCode", 'fullName', st."fullName",
+      'phone', st.phone, 'parentPhone', st."parentPhone", 'children', '[]'::jsonb, 'isEligible', false
+    );
+  END IF;
+
+  IF parent_phone IS NOT NULL THEN
+    RETURN (
+      SELECT jsonb_build_object(
+        'telegramUserId', p_tg, 'type', 'PARENT', 'userId', NULL,
+        'studentId', s.id, 'studentCode', s."studentCode", 'fullName', s."fullName",
+        'phone', s.phone, 'parentPhone', s."parentPhone", 'children', '[]'::jsonb, 'isEligible', false
+      )
+      FROM "Student" s
+      WHERE s."parentPhone" = parent_phone
+      ORDER BY s."createdAt" DESC, s.id
+      LIMIT 1
+    );
+  END IF;
+
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_bot_actor_refresh(p_tg TEXT) RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+  actor JSONB;
+BEGIN
+  IF p_tg IS NULL THEN
+    RETURN;
+  END IF;
+
+  actor := km_bot_actor_compute(p_tg);
+  IF actor IS NULL THEN
+    DELETE FROM "BotActor" WHERE "telegramUserId" = p_tg;
+    RETURN;
+  END IF;
+
+  INSERT INTO "BotActor" AS b
+    ("telegramUserId", "type", "userId", "studentId", "studentCode", "fullName",
+     "phone", "parentPhone", "children", "isEligible", "updatedAt")
+  SELECT r."telegramUserId", r."type", r."userId", r."studentId", r."studentCode", r."fullName",
+         r."phone", r."parentPhone", r."children", r."isEligible", CURRENT_TIMESTAMP
+  FROM jsonb_populate_record(NULL::"BotActor", actor) r
+  ON CONFLICT ("telegramUserId") DO UPDATE SET
+    "type" = EXCLUDED."type",
+    "userId" = EXCLUDED."userId",
+    "studentId" = EXCLUDED."studentId",
+    "studentCode" = EXCLUDED."studentCode",
+    "fullName" = EXCLUDED."fullName",
+    "phone" = EXCLUDED."phone",
+    "parentPhone" = EXCLUDED."parentPhone",
+    "children" = EXCLUDED."children",
+    "isEligible" = EXCLUDED."isEligible",
+    "updatedAt" = EXCLUDED."updatedAt"
+  WHERE (to_jsonb(b) - 'updatedAt') IS DISTINCT FROM (to_jsonb(EXCLUDED) - 'updatedAt');
+END;
+$$;
+
+-- Refreshes every actor that can see the given student: its own account and its parent contact.
+CREATE OR REPLACE FUNCTION km_bot_actor_refresh_links(p_user_id TEXT, p_parent_phone TEXT) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF p_user_id IS NOT NULL THEN
+    PERFORM km_bot_actor_refresh(u."telegramUserId") FROM "User" u WHERE u.id = p_user_id;
+  END IF;
+  IF p_parent_phone IS NOT NULL THEN
+    PERFORM km_bot_actor_refresh(pc."telegramUserId") FROM "ParentContact" pc WHERE pc.phone = p_parent_phone;
+  END IF;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_bot_actor_refresh_student(p_student_id TEXT) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM km_bot_actor_refresh_links(s."userId", s."parentPhone") FROM "Student" s WHERE s.id = p_student_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_bot_actor_on_user() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM km_bot_actor_refresh(NEW."telegramUserId");
+  ELSIF TG_OP = 'UPDATE' THEN
+    PERFORM km_bot_actor_refresh(OLD."telegramUserId");
+    IF NEW."telegramUserId" IS DISTINCT FROM OLD."telegramUserId" THEN
+      PERFORM km_bot_actor_refresh(NEW."telegramUserId");
+    END IF;
+  ELSE
+    PERFORM km_bot_actor_refresh(OLD."telegramUserId");
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_bot_actor_on_student() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM km_bot_actor_refresh_links(NEW."userId", NEW."parentPhone");
+  ELSIF TG_OP = 'UPDATE' THEN
+    PERFORM km_bot_actor_refresh_links(OLD."userId", OLD."parentPhone");
+    IF (NEW."userId", NEW."parentPhone") IS DISTINCT FROM (OLD."userId", OLD."parentPhone") THEN
+      PERFORM km_bot_actor_refresh_links(NEW."userId", NEW."parentPhone");
+    END IF;
+  ELSE
+    PERFORM km_bot_actor_refresh_links(OLD."userId", OLD."parentPhone");
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_bot_actor_on_enrollment() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM km_bot_actor_refresh_student(NEW."studentId");
+  ELSIF TG_OP = 'UPDATE' THEN
+    PERFORM km_bot_actor_refresh_student(OLD."studentId");
+    IF NEW."studentId" IS DISTINCT FROM OLD."studentId" THEN
+      PERFORM km_bot_actor_refresh_student(NEW."studentId");
+    END IF;
+  ELSE
+    PERFORM km_bot_actor_refresh_student(OLD."studentId");
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_bot_actor_on_group() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM km_bot_actor_refresh_student(e."studentId") FROM "Enrollment" e WHERE e."groupId" = OLD.id;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_bot_actor_on_parent_contact() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM km_bot_actor_refresh(NEW."telegramUserId");
+  ELSIF TG_OP = 'UPDATE' THEN
+    PERFORM km_bot_actor_refresh(OLD."telegramUserId");
+    IF NEW."telegramUserId" IS DISTINCT FROM OLD."telegramUserId" THEN
+      PERFORM km_bot_actor_refresh(NEW."telegramUserId");
+    END IF;
+  ELSE
+    PERFORM km_bot_actor_refresh(OLD."telegramUserId");
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "km_bot_actor_user" ON "User";
+CREATE TRIGGER "km_bot_actor_user"
+  AFTER INSERT OR DELETE OR UPDATE OF "telegramUserId", role, "isActive" ON "User"
+  FOR EACH ROW EXECUTE FUNCTION km_bot_actor_on_user();
+
+DROP TRIGGER IF EXISTS "km_bot_actor_student" ON "Student";
+CREATE TRIGGER "km_bot_actor_student"
+  AFTER INSERT OR DELETE OR UPDATE OF "userId", "parentPhone", status, "studentCode", "fullName", phone ON "Student"
+  FOR EACH ROW EXECUTE FUNCTION km_bot_actor_on_student();
+
+DROP TRIGGER IF EXISTS "km_bot_actor_enrollment" ON "Enrollment";
+CREATE TRIGGER "km_bot_actor_enrollment"
+  AFTER INSERT OR DELETE OR UPDATE OF status, "studentId", "groupId" ON "Enrollment"
+  FOR EACH ROW EXECUTE FUNCTION km_bot_actor_on_enrollment();
+
+DROP TRIGGER IF EXISTS "km_bot_actor_group" ON "GroupCatalog";
+CREATE TRIGGER "km_bot_actor_group"
+  AFTER UPDATE OF status ON "GroupCatalog"
+  FOR EACH ROW WHEN (OLD.status IS DISTINCT FROM NEW.status)
+  EXECUTE FUNCTION km_bot_actor_on_group();
+
+DROP TRIGGER IF EXISTS "km_bot_actor_parent_contact" ON "ParentContact";
+CREATE TRIGGER "km_bot_actor_parent_contact"
+  AFTER INSERT OR DELETE OR UPDATE OF phone, "telegramUserId" ON "ParentContact"
+  FOR EACH ROW EXECUTE FUNCTION km_bot_actor_on_parent_contact();
+
+SELECT km_bot_actor_refresh(t.tg)
+FROM (
+  SELECT "telegramUserId" AS tg FROM "User" WHERE "telegramUserId" IS NOT NULL
+  UNION
+  SELECT "telegramUserId" FROM "ParentContact"
+) t;
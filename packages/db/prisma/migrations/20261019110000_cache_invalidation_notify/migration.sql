@@ -0,0 +1,70 @@
+-- Row-change notifications for in-process caches of the Telegram bot.
+-- Channel: TG_ARGV[0]; payload: {"op", "id", <TG_ARGV[1..] columns>} as JSON text.
+-- An UPDATE whose key columns change notifies with both the old and the new keys.
+
+CREATE OR REPLACE FUNCTION km_notify_invalidation() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+  rows JSONB[];
+  rec JSONB;
+  payload JSONB;
+  i INT;
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    rows := ARRAY[to_jsonb(NEW)];
+  ELSIF TG_OP = 'DELETE' THEN
+    rows := ARRAY[to_jsonb(OLD)];
+  ELSE
+    IF OLD IS NOT DISTINCT FROM NEW THEN
+      RETURN NULL;
+    END IF;
+    rows := ARRAY[to_jsonb(OLD), to_jsonb(NEW)];
+  END IF;
+
+  FOREACH rec IN ARRAY rows LOOP
+    payload := jsonb_build_object('op', TG_OP, 'id', rec->>'id');
+    FOR i IN 1 .. TG_NARGS - 1 LOOP
+      payload := payload || jsonb_build_object(TG_ARGV[i], rec->TG_ARGV[i]);
+    END LOOP;
+    -- Identical payloads within one transaction are delivered once.
+    PERFORM pg_notify(TG_ARGV[0], payload::text);
+  END LOOP;
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "km_notify_student" ON "Student";
+CREATE TRIGGER "km_notify_student"
+  AFTER INSERT OR UPDATE OR DELETE ON "Student"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_student', 'userId', 'parentPhone');
+
+DROP TRIGGER IF EXISTS "km_notify_enrollment" ON "Enrollment";
+CREATE TRIGGER "km_notify_enrollment"
+  AFTER INSERT OR UPDATE OR DELETE ON "Enrollment"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_enrollment', 'studentId', 'groupId');
+
+DROP TRIGGER IF EXISTS "km_notify_group" ON "GroupCatalog";
+CREATE TRIGGER "km_notify_group"
+  AFTER INSERT OR UPDATE OR DELETE ON "GroupCatalog"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_group');
+
+DROP TRIGGER IF EXISTS "km_notify_test" ON "Test";
+CREATE TRIGGER "km_notify_test"
+  AFTER INSERT OR UPDATE OR DELETE ON "Test"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_test', 'lessonId');
+
+DROP TRIGGER IF EXISTS "km_notify_test_image" ON "TestImage";
+CREATE TRIGGER "km_notify_test_image"
+  AFTER INSERT OR UPDATE OR DELETE ON "TestImage"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_test_image', 'testId');
+
+DROP TRIGGER IF EXISTS "km_notify_access_window" ON "AccessWindow";
+CREATE TRIGGER "km_notify_access_window"
+  AFTER INSERT OR UPDATE OR DELETE ON "AccessWindow"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_access_window', 'studentId', 'testId');
+
+DROP TRIGGER IF EXISTS "km_notify_payment" ON "Payment";
+CREATE TRIGGER "km_notify_payment"
+  AFTER INSERT OR UPDATE OR DELETE ON "Payment"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_payment', 'studentId', 'groupId');
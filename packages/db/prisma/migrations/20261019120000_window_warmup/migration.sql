@@ -0,0 +1,13 @@
+-- Upcoming-window scan for the bot's warm-up job.
+CREATE INDEX IF NOT EXISTS "AccessWindow_isActive_openFrom_idx" ON "AccessWindow"("isActive", "openFrom");
+
+-- Let the bot evict cached actors and test images precisely.
+DROP TRIGGER IF EXISTS "km_notify_bot_actor" ON "BotActor";
+CREATE TRIGGER "km_notify_bot_actor"
+  AFTER INSERT OR UPDATE OR DELETE ON "BotActor"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_bot_actor', 'telegramUserId');
+
+DROP TRIGGER IF EXISTS "km_notify_test_image" ON "TestImage";
+CREATE TRIGGER "km_notify_test_image"
+  AFTER INSERT OR UPDATE OR DELETE ON "TestImage"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_test_image', 'testId', 'imageUrl');
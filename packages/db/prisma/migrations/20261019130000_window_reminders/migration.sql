@@ -0,0 +1,11 @@
+-- One row per reminder the bot has sent, so restarts never notify twice.
+CREATE TABLE IF NOT EXISTS "WindowReminder" (
+  "windowId" TEXT NOT NULL,
+  "kind" TEXT NOT NULL,
+  "sentAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT "WindowReminder_pkey" PRIMARY KEY ("windowId", "kind"),
+  CONSTRAINT "WindowReminder_windowId_fkey" FOREIGN KEY ("windowId") REFERENCES "AccessWindow"("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- Closing-reminder scan by openTo.
+CREATE INDEX IF NOT EXISTS "AccessWindow_isActive_openTo_idx" ON "AccessWindow"("isActive", "openTo");
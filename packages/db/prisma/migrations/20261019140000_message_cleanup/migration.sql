@@ -0,0 +1,13 @@
+-- Telegram messages the bot still has to delete (test images after a submission).
+CREATE TABLE IF NOT EXISTS "MessageCleanup" (
+  "id" TEXT NOT NULL,
+  "chatId" BIGINT NOT NULL,
+  "messageIds" INTEGER[] NOT NULL,
+  "attempts" INTEGER NOT NULL DEFAULT 0,
+  "nextAttemptAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  "lastError" TEXT,
+  "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT "MessageCleanup_pkey" PRIMARY KEY ("id")
+);
+
+CREATE INDEX IF NOT EXISTS "MessageCleanup_nextAttemptAt_idx" ON "MessageCleanup"("nextAttemptAt");
@@ -0,0 +1,264 @@
+-- Per-student results summary read by the bot instead of scanning "Submission".
+-- "monthly" maps 'YYYY-MM' to {"count", "score", "questions"}; "recent" holds the
+-- latest results (RESULT_SUMMARY_RECENT in python-aiogram/db/repository.py) newest
+-- first, with lesson and book titles denormalized. Triggers on "Submission", "Test",
+-- "Lesson" and "Book" keep it current, whoever writes those tables.
+
+CREATE TABLE IF NOT EXISTS "StudentResultSummary" (
+  "studentId" TEXT NOT NULL,
+  "submissionCount" INTEGER NOT NULL DEFAULT 0,
+  "monthly" JSONB NOT NULL DEFAULT '{}',
+  "recent" JSONB NOT NULL DEFAULT '[]',
+  "updatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT "StudentResultSummary_pkey" PRIMARY KEY ("studentId"),
+  CONSTRAINT "StudentResultSummary_studentId_fkey" FOREIGN KEY ("studentId") REFERENCES "User"("id") ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION km_result_item(p_submission_ids TEXT[])
+RETURNS TABLE ("studentId" TEXT, month TEXT, score INTEGER, questions INTEGER, item JSONB)
+LANGUAGE sql STABLE AS $$
+  SELECT
+    s."studentId",
+    to_char(s."createdAt", 'YYYY-MM'),
+    s.score,
+    t."totalQuestions",
+    jsonb_build_object(
+      'id', s.id,
+      'score', s.score,
+      'totalQuestions', t."totalQuestions",
+      'lessonNumber', l."lessonNumber",
+      'lessonTitle', l.title,
+      'bookTitle', b.title,
+      'createdAt', to_char(s."createdAt", 'YYYY-MM-DD"T"HH24:MI:SS.US')
+    )
+  FROM "Submission" s
+  JOIN "Test" t ON t.id = s."testId"
+  JOIN "Lesson" l ON l.id = t."lessonId"
+  JOIN "Book" b ON b.id = l."bookId"
+  WHERE s.id = ANY(p_submission_ids)
+$$;
+
+-- Folds freshly inserted submissions into their students' summaries. Called once per
+-- INSERT statement by the "km_result_summary_insert" trigger.
+CREATE OR REPLACE FUNCTION km_result_summary_add(p_submission_ids TEXT[]) RETURNS VOID
+LANGUAGE plpgsql AS $$
+BEGIN
+  WITH items AS (
+    SELECT * FROM km_result_item(p_submission_ids)
+  ),
+  per_student AS (
+    SELECT
+      i."studentId",
+      count(*)::int AS n,
+      jsonb_agg(i.item ORDER BY i.item->>'createdAt' DESC, i.item->>'id' DESC) AS recent
+    FROM items i
+    GROUP BY i."studentId"
+  ),
+  per_month AS (
+    SELECT
+      i."studentId",
+      jsonb_object_agg(
+        i.month,
+        jsonb_build_object('count', i.n, 'score', i.score, 'questions', i.questions)
+      ) AS monthly
+    FROM (
+      SELECT "studentId", month, count(*)::int AS n, sum(score)::int AS score, sum(questions)::int AS questions
+      FROM items
+      GROUP BY "studentId", month
+    ) i
+    GROUP BY i."studentId"
+  )
+  INSERT INTO "StudentResultSummary" ("studentId", "submissionCount", "monthly", "recent", "updatedAt")
+  SELECT ps."studentId", ps.n, pm.monthly, (
+    SELECT jsonb_agg(x.e ORDER BY x.ord)
+    FROM jsonb_array_elements(ps.recent) WITH ORDINALITY AS x(e, ord)
+    WHERE x.ord <= 50
+  ), CURRENT_TIMESTAMP
+  FROM per_student ps
+  JOIN per_month pm ON pm."studentId" = ps."studentId"
+  ON CONFLICT ("studentId") DO UPDATE SET
+    "submissionCount" = "StudentResultSummary"."submissionCount" + EXCLUDED."submissionCount",
+    "monthly" = (
+      SELECT jsonb_object_agg(m.key, jsonb_build_object(
+        'count', m.count, 'score', m.score, 'questions', m.questions
+      ))
+      FROM (
+        SELECT
+          key,
+          sum((value->>'count')::int) AS count,
+          sum((value->>'score')::int) AS score,
+          sum((value->>'questions')::int) AS questions
+        FROM (
+          SELECT * FROM jsonb_each("StudentResultSummary"."monthly")
+          UNION ALL
+          SELECT * FROM jsonb_each(EXCLUDED."monthly")
+        ) merged
+        GROUP BY key
+      ) m
+    ),
+    "recent" = (
+      SELECT COALESCE(jsonb_agg(r.e ORDER BY r.e->>'createdAt' DESC, r.e->>'id' DESC), '[]'::jsonb)
+      FROM (
+        SELECT e
+        FROM jsonb_array_elements(EXCLUDED."recent" || "StudentResultSummary"."recent") e
+        ORDER BY e->>'createdAt' DESC, e->>'id' DESC
+        LIMIT 50
+      ) r
+    ),
+    "updatedAt" = CURRENT_TIMESTAMP;
+END;
+$$;
+
+-- Recomputes one student's summary from history (deletes, updates, renames, rebuild tool).
+CREATE OR REPLACE FUNCTION km_result_summary_compute(p_student_id TEXT) RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+  WITH items AS (
+    SELECT *
+    FROM km_result_item(ARRAY(SELECT id FROM "Submission" WHERE "studentId" = p_student_id))
+  )
+  SELECT CASE WHEN NOT EXISTS (SELECT 1 FROM items) THEN NULL ELSE jsonb_build_object(
+    'submissionCount', (SELECT count(*) FROM items),
+    'monthly', (
+      SELECT jsonb_object_agg(month, jsonb_build_object('count', n, 'score', score, 'questions', questions))
+      FROM (
+        SELECT month, count(*)::int AS n, sum(score)::int AS score, sum(questions)::int AS questions
+        FROM items
+        GROUP BY month
+      ) m
+    ),
+    'recent', (
+      SELECT jsonb_agg(item ORDER BY item->>'createdAt' DESC, item->>'id' DESC)
+      FROM (SELECT item FROM items ORDER BY item->>'createdAt' DESC, item->>'id' DESC LIMIT 50) r
+    )
+  ) END
+$$;
+
+CREATE OR REPLACE FUNCTION km_result_summary_rebuild(p_student_id TEXT) RETURNS VOID
+LANGUAGE plpgsql AS $$
+DECLARE
+  summary JSONB;
+BEGIN
+  summary := km_result_summary_compute(p_student_id);
+  IF summary IS NULL THEN
+    DELETE FROM "StudentResultSummary" WHERE "studentId" = p_student_id;
+    RETURN;
+  END IF;
+
+  INSERT INTO "StudentResultSummary" ("studentId", "submissionCount", "monthly", "recent", "updatedAt")
+  VALUES (
+    p_student_id,
+    (summary->>'submissionCount')::int,
+    summary->'monthly',
+    summary->'recent',
+    CURRENT_TIMESTAMP
+  )
+  ON CONFLICT ("studentId") DO UPDATE SET
+    "submissionCount" = EXCLUDED."submissionCount",
+    "monthly" = EXCLUDED."monthly",
+    "recent" = EXCLUDED."recent",
+    "updatedAt" = EXCLUDED."updatedAt";
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_result_summary_on_submission_insert() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM km_result_summary_add(ARRAY(SELECT id FROM new_rows));
+  RETURN NULL;
+END;
+$$;
+
+-- Deletes (including the cascade from "Test") and updates change totals that cannot be
+-- folded in incrementally; the affected students are recomputed instead.
+CREATE OR REPLACE FUNCTION km_result_summary_on_submission_delete() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM km_result_summary_rebuild(o."studentId") FROM (SELECT DISTINCT "studentId" FROM old_rows) o;
+  RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION km_result_summary_on_submission_update() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  PERFORM km_result_summary_rebuild(c.id)
+  FROM (
+    SELECT DISTINCT unnest(ARRAY[o."studentId", n."studentId"]) AS id
+    FROM old_rows o
+    JOIN new_rows n ON n.id = o.id
+    WHERE (o."studentId", o."testId", o.score, o."createdAt")
+      IS DISTINCT FROM (n."studentId", n."testId", n.score, n."createdAt")
+  ) c;
+  RETURN NULL;
+END;
+$$;
+
+-- "recent" carries test sizes and lesson and book titles; edits in the admin app
+-- refresh every student with a submission on the changed rows.
+CREATE OR REPLACE FUNCTION km_result_summary_on_catalog() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+  IF TG_TABLE_NAME = 'Test' THEN
+    PERFORM km_result_summary_rebuild(s."studentId")
+    FROM (SELECT DISTINCT "studentId" FROM "Submission" WHERE "testId" = NEW.id) s;
+  ELSIF TG_TABLE_NAME = 'Lesson' THEN
+    PERFORM km_result_summary_rebuild(s."studentId")
+    FROM (
+      SELECT DISTINCT sub."studentId"
+      FROM "Test" t
+      JOIN "Submission" sub ON sub."testId" = t.id
+      WHERE t."lessonId" = NEW.id
+    ) s;
+  ELSE
+    PERFORM km_result_summary_rebuild(s."studentId")
+    FROM (
+      SELECT DISTINCT sub."studentId"
+      FROM "Lesson" l
+      JOIN "Test" t ON t."lessonId" = l.id
+      JOIN "Submission" sub ON sub."testId" = t.id
+      WHERE l."bookId" = NEW.id
+    ) s;
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+-- Transition tables allow one event per trigger and no column list.
+DROP TRIGGER IF EXISTS "km_result_summary_insert" ON "Submission";
+CREATE TRIGGER "km_result_summary_insert"
+  AFTER INSERT ON "Submission"
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION km_result_summary_on_submission_insert();
+
+DROP TRIGGER IF EXISTS "km_result_summary_delete" ON "Submission";
+CREATE TRIGGER "km_result_summary_delete"
+  AFTER DELETE ON "Submission"
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION km_result_summary_on_submission_delete();
+
+DROP TRIGGER IF EXISTS "km_result_summary_update" ON "Submission";
+CREATE TRIGGER "km_result_summary_update"
+  AFTER UPDATE ON "Submission"
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT EXECUTE FUNCTION km_result_summary_on_submission_update();
+
+DROP TRIGGER IF EXISTS "km_result_summary_test" ON "Test";
+CREATE TRIGGER "km_result_summary_test"
+  AFTER UPDATE OF "totalQuestions", "lessonId" ON "Test"
+  FOR EACH ROW WHEN ((OLD."totalQuestions", OLD."lessonId") IS DISTINCT FROM (NEW."totalQuestions", NEW."lessonId"))
+  EXECUTE FUNCTION km_result_summary_on_catalog();
+
+DROP TRIGGER IF EXISTS "km_result_summary_lesson" ON "Lesson";
+CREATE TRIGGER "km_result_summary_lesson"
+  AFTER UPDATE OF title, "lessonNumber", "bookId" ON "Lesson"
+  FOR EACH ROW WHEN ((OLD.title, OLD."lessonNumber", OLD."bookId") IS DISTINCT FROM (NEW.title, NEW."lessonNumber", NEW."bookId"))
+  EXECUTE FUNCTION km_result_summary_on_catalog();
+
+DROP TRIGGER IF EXISTS "km_result_summary_book" ON "Book";
+CREATE TRIGGER "km_result_summary_book"
+  AFTER UPDATE OF title ON "Book"
+  FOR EACH ROW WHEN (OLD.title IS DISTINCT FROM NEW.title)
+  EXECUTE FUNCTION km_result_summary_on_catalog();
+
+SELECT km_result_summary_rebuild(s."studentId")
+FROM (SELECT DISTINCT "studentId" FROM "Submission") s;
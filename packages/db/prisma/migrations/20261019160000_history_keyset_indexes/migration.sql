@@ -0,0 +1,3 @@
+-- Keyset pagination of the bot's journal and payment history per student.
+CREATE INDEX IF NOT EXISTS "GroupJournalEntry_studentId_updatedAt_id_idx" ON "GroupJournalEntry"("studentId", "updatedAt", "id");
+CREATE INDEX IF NOT EXISTS "Payment_studentId_createdAt_id_idx" ON "Payment"("studentId", "createdAt", "id");
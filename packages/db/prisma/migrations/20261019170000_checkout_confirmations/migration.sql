@@ -0,0 +1,12 @@
+-- Telegram chat that started a checkout and when its "paid" confirmation was sent.
+ALTER TABLE "PaymentCheckout"
+  ADD COLUMN IF NOT EXISTS "telegramChatId" TEXT,
+  ADD COLUMN IF NOT EXISTS "notifiedAt" TIMESTAMP(3);
+
+CREATE INDEX IF NOT EXISTS "PaymentCheckout_status_updatedAt_idx" ON "PaymentCheckout"("status", "updatedAt");
+
+-- Status changes only, so marking a confirmation as sent does not notify again.
+DROP TRIGGER IF EXISTS "km_notify_payment_checkout" ON "PaymentCheckout";
+CREATE TRIGGER "km_notify_payment_checkout"
+  AFTER INSERT OR UPDATE OF status OR DELETE ON "PaymentCheckout"
+  FOR EACH ROW EXECUTE FUNCTION km_notify_invalidation('km_inv_payment_checkout', 'studentId', 'status');
@@ -0,0 +1,268 @@
+"""Generate a production-sized dataset for the query-plan checks.
+
+    PLAN_DATABASE_URL=postgresql://... python benchmarks/plan_dataset.py             # 100k students
+    PLAN_DATABASE_URL=postgresql://... python benchmarks/plan_dataset.py --scale 0.05
+
+At --scale 1: 100k students, 5M submissions with 50M detail rows, ~1.2M payments,
+~3M journal entries, 300k checkouts, plus users, parents, enrollments and windows.
+Row counts scale linearly; the catalog (books, lessons, tests) stays fixed.
+
+The target must be a scratch database with all migrations applied and no students.
+Rows are built server-side with generate_series and a seeded random(), so the
+same --seed gives the same data. Triggers are off during the load
+(session_replication_role, superuser only); BotActor and StudentResultSummary are
+rebuilt through their functions afterwards and everything is ANALYZEd.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+
+import asyncpg
+
+BOOKS = 20
+LESSONS_PER_BOOK = 30
+TESTS = BOOKS * LESSONS_PER_BOOK
+IMAGES_PER_TEST = 3
+QUESTIONS = 10
+SUBMISSIONS_PER_STUDENT = 50
+PAYMENTS_PER_STUDENT = 12
+JOURNAL_DATES_PER_GROUP = 24
+CHECKOUTS_PER_STUDENT = 3
+STUDENTS_PER_GROUP = 250
+
+# Every fifth student never linked Telegram; the rest have User 'u<n>'.
+# k-th linked student (1-based) -> student number.
+LINKED_STUDENT = "({k} + ({k} - 1) / 4)"
+
+
+def steps(students: int) -> list[tuple[str, str]]:
+    groups = max(8, students // STUDENTS_PER_GROUP)
+    linked = students - students // 5
+    submissions = students * SUBMISSIONS_PER_STUDENT
+    payments = students * PAYMENTS_PER_STUDENT
+    checkouts = students * CHECKOUTS_PER_STUDENT
+    skewed = LINKED_STUDENT.format(k=f"(1 + floor({linked} * power(random(), 1.6))::int)")
+    any_linked = LINKED_STUDENT.format(k=f"(1 + floor({linked} * random())::int)")
+
+    return [
+        (
+            "catalog",
+            f"""
+            INSERT INTO "User" (id, role, username) VALUES ('plan_admin', 'ADMIN', 'plan_admin');
+            INSERT INTO "GroupCatalog" (id, code, fan, "scheduleText", capacity, "priceMonthly", status)
+            SELECT 'g' || n, 'G' || lpad(n::text, 4, '0'),
+                   CASE WHEN n % 2 = 0 THEN 'kimyo' ELSE 'biologiya' END,
+                   CASE WHEN n % 2 = 0 THEN 'du-chor-ju' ELSE 'se-pay-shan' END,
+                   30, (ARRAY[400000, 500000, 650000])[1 + n % 3],
+                   (CASE WHEN n % 10 < 2 THEN 'YOPIQ' WHEN n % 10 = 2 THEN 'REJADA'
+                         WHEN n % 10 < 6 THEN 'OCHIQ' ELSE 'BOSHLANGAN' END)::"GroupCatalogStatus"
+            FROM generate_series(1, {groups}) n;
+            INSERT INTO "Book" (id, title)
+            SELECT 'b' || n, CASE WHEN n % 2 = 0 THEN 'Kimyo ' ELSE 'Biologiya ' END || n
+            FROM generate_series(1, {BOOKS}) n;
+            INSERT INTO "Lesson" (id, "bookId", "lessonNumber", title)
+            SELECT 'l' || b || '_' || n, 'b' || b, n, 'Mavzu ' || n
+            FROM generate_series(1, {BOOKS}) b, generate_series(1, {LESSONS_PER_BOOK}) n;
+            INSERT INTO "Test" (id, "lessonId", "answerKey", "totalQuestions", "isActive")
+            SELECT 't' || ((b - 1) * {LESSONS_PER_BOOK} + n), 'l' || b || '_' || n,
+                   '["A","B","C","D","A","B","C","D","A","B"]', {QUESTIONS}, n % 15 <> 0
+            FROM generate_series(1, {BOOKS}) b, generate_series(1, {LESSONS_PER_BOOK}) n;
+            INSERT INTO "TestImage" (id, "testId", "imageUrl", "pageNumber")
+            SELECT 'ti' || t || '_' || p, 't' || t, '/uploads/tests/' || t || '-' || p || '.jpg', p
+            FROM generate_series(1, {TESTS}) t, generate_series(1, {IMAGES_PER_TEST}) p;
+            """,
+        ),
+        (
+            "students",
+            f"""
+            INSERT INTO "User" (id, role, phone, "telegramUserId", "isActive", "createdAt")
+            SELECT 'u' || n, 'STUDENT', '+99890' || lpad(n::text, 7, '0'), (1000000000 + n)::text, true,
+                   now() - random() * interval '1000 days'
+            FROM generate_series(1, {students}) n
+            WHERE n % 5 <> 0;
+            INSERT INTO "Student" (id, "fullName", phone, "parentPhone", status, "userId", "createdAt", "studentCode")
+            SELECT 'st' || n, 'Talaba ' || n, '+99890' || lpad(n::text, 7, '0'),
+                   CASE WHEN n % 10 = 9 THEN NULL ELSE '+99891' || lpad((n / 2)::text, 7, '0') END,
+                   (CASE WHEN n % 20 = 7 THEN 'PAUSED' WHEN n % 50 = 11 THEN 'BLOCKED' ELSE 'ACTIVE' END)::"StudentStatus",
+                   CASE WHEN n % 5 <> 0 THEN 'u' || n END,
+                   now() - random() * interval '1000 days',
+                   lpad(n::text, 6, '0')
+            FROM generate_series(1, {students}) n;
+            INSERT INTO "Enrollment" (id, "studentId", "groupId", status, "createdAt")
+            SELECT 'e' || n || '_' || k, 'st' || n, 'g' || (1 + (n * 31 + (k - 1) * 7) % {groups}),
+                   (CASE WHEN random() < 0.8 THEN 'ACTIVE' WHEN random() < 0.5 THEN 'TRIAL' ELSE 'LEFT' END)::"EnrollmentStatus",
+                   now() - random() * interval '900 days'
+            FROM generate_series(1, {students}) n, generate_series(1, 2) k
+            WHERE k = 1 OR n % 10 < 3;
+            INSERT INTO "ParentContact" (id, phone, "telegramUserId", "updatedAt")
+            SELECT 'pc' || n, '+99891' || lpad((n / 2)::text, 7, '0'), (2000000000 + n)::text, now()
+            FROM generate_series(1, {students}) n
+            WHERE n % 4 = 0 AND n % 10 <> 9;
+            """,
+        ),
+        (
+            "submissions",
+            f"""
+            INSERT INTO "Submission" (id, "studentId", "testId", "rawAnswerText", "parsedAnswers", score, "createdAt")
+            SELECT 'sub' || n, 'u' || {skewed}, 't' || (1 + floor(random() * {TESTS})::int),
+                   '1A2B3C4D5A6B7C8D9A10B', '["A","B","C","D","A","B","C","D","A","B"]',
+                   floor(random() * {QUESTIONS + 1})::int,
+                   now() - interval '1 hour' - random() * interval '730 days'
+            FROM generate_series(1, {submissions}) n;
+            """,
+        ),
+        (
+            "submission details",
+            f"""
+            INSERT INTO "SubmissionDetail" (id, "submissionId", "questionNumber", "givenAnswer", "correctAnswer", "isCorrect")
+            SELECT 'sd' || n || '_' || q, 'sub' || n, q, a, a, random() < 0.6
+            FROM generate_series(1, {submissions}) n,
+                 LATERAL (SELECT q, (ARRAY['A','B','C','D'])[1 + q % 4] AS a FROM generate_series(1, {QUESTIONS}) q) d;
+            """,
+        ),
+        (
+            "access windows",
+            f"""
+            INSERT INTO "AccessWindow" (id, "studentId", "testId", "openFrom", "openTo", "createdBy", "isActive",
+                                        "createdAt", "openedAt", "submittedAt")
+            SELECT 'aw' || substr(s.id, 4), s."studentId", s."testId", s."createdAt" - interval '30 minutes',
+                   s."createdAt", 'plan_admin', false, s."createdAt" - interval '1 day',
+                   s."createdAt" - interval '20 minutes', s."createdAt"
+            FROM "Submission" s;
+            INSERT INTO "AccessWindow" (id, "studentId", "testId", "openFrom", "openTo", "createdBy", "isActive", "createdAt")
+            SELECT 'awx' || n, 'u' || {any_linked}, 't' || (1 + floor(random() * {TESTS})::int),
+                   now() + (random() * 4 - 2) * interval '1 hour', now() + interval '2 hours' + random() * interval '1 day',
+                   'plan_admin', true, now() - interval '1 day'
+            FROM generate_series(1, {max(10, students // 50)}) n;
+            INSERT INTO "WindowReminder" ("windowId", kind, "sentAt")
+            SELECT id, 'OPEN', "openFrom" FROM "AccessWindow" WHERE id LIKE 'aw%' AND random() < 0.2;
+            """,
+        ),
+        (
+            "payments",
+            f"""
+            INSERT INTO "Payment" (id, "studentId", subject, month, "amountRequired", "amountPaid", discount,
+                                   "paymentMethod", status, "paidAt", "createdAt", "updatedAt", "groupId",
+                                   "periodStart", "periodEnd", "isDeleted")
+            SELECT 'p' || n, 'st' || (1 + (n - 1) % {students}), 'CHEMISTRY',
+                   to_char(p.start, 'YYYY-MM'), p.price, paid, 0,
+                   (ARRAY['CASH','PAYME','CLICK','UZUM'])[1 + n % 4]::"PaymentMethod",
+                   (CASE WHEN paid >= p.price THEN 'PAID' WHEN paid > 0 THEN 'PARTIAL' ELSE 'DEBT' END)::"PaymentStatus",
+                   p.start + interval '3 days', p.start + interval '3 days', p.start + interval '3 days',
+                   'g' || (1 + ((1 + (n - 1) % {students}) * 31) % {groups}),
+                   p.start, p.start + interval '1 month', n % 50 = 0
+            FROM generate_series(1, {payments}) n,
+                 LATERAL (SELECT date_trunc('month', now()) - ((n - 1) / {students}) * interval '1 month' AS start,
+                                 (ARRAY[400000, 500000, 650000])[1 + n % 3] AS price) p,
+                 LATERAL (SELECT CASE WHEN random() < 0.8 THEN p.price ELSE floor(random() * p.price)::int END AS paid) a;
+            INSERT INTO "PaymentCheckout" (id, "studentId", "groupId", provider, amount, status, "studentCode",
+                                           "callbackToken", "telegramChatId", "notifiedAt", "createdAt", "updatedAt")
+            SELECT 'pco' || n, 'st' || s, 'g' || (1 + (s * 31) % {groups}),
+                   (ARRAY['PAYME','CLICK','UZUM','PAYNET'])[1 + n % 4]::"PaymentProvider", 500000,
+                   (CASE WHEN n % 100 = 0 THEN 'PENDING' WHEN n % 3 = 0 THEN 'PAID' ELSE 'EXPIRED' END)::"PaymentCheckoutStatus",
+                   lpad(s::text, 6, '0'), md5('pco' || n), (1000000000 + s)::text,
+                   CASE WHEN n % 3 = 0 AND n % 500 <> 0 THEN created + interval '5 minutes' END,
+                   created, created + interval '5 minutes'
+            FROM generate_series(1, {checkouts}) n,
+                 LATERAL (SELECT 1 + (n - 1) % {students} AS s,
+                                 CASE WHEN n % 100 = 0 THEN now() - random() * interval '2 hours'
+                                      ELSE now() - random() * interval '365 days' END AS created) c;
+            """,
+        ),
+        (
+            "journal",
+            f"""
+            INSERT INTO "GroupJournalDate" (id, "groupId", "journalDate", "monthKey")
+            SELECT 'jd' || g || '_' || d, 'g' || g, day, to_char(day, 'YYYY-MM')
+            FROM generate_series(1, {groups}) g, generate_series(1, {JOURNAL_DATES_PER_GROUP}) d,
+                 LATERAL (SELECT date_trunc('day', now()) - (d * 3) * interval '1 day' AS day) x;
+            INSERT INTO "GroupJournalEntry" (id, "journalDateId", "studentId", attendance, "lessonId",
+                                             "theoryScore", "practicalScore", "createdAt", "updatedAt")
+            SELECT 'je' || e.id || '_' || d, 'jd' || substr(e."groupId", 2) || '_' || d, e."studentId",
+                   (CASE WHEN random() < 0.85 THEN 'PRESENT' WHEN random() < 0.5 THEN 'ABSENT' ELSE 'EXCUSED' END)::"JournalAttendance",
+                   'l1_' || (1 + d % {LESSONS_PER_BOOK}), floor(random() * 6)::int, floor(random() * 6)::int,
+                   day, day + random() * interval '2 days'
+            FROM "Enrollment" e, generate_series(1, {JOURNAL_DATES_PER_GROUP}) d,
+                 LATERAL (SELECT date_trunc('day', now()) - (d * 3) * interval '1 day' AS day) x;
+            """,
+        ),
+        (
+            "audit, appeals, cleanups",
+            f"""
+            INSERT INTO "AuditLog" (id, "actorId", action, entity, "entityId", "createdAt")
+            SELECT 'al' || substr(id, 4), "studentId", 'SUBMIT', 'Submission', id, "createdAt"
+            FROM "Submission" WHERE random() < 0.2;
+            INSERT INTO "Appeal" (id, "studentId", "senderType", "senderTelegramUserId", text, "updatedAt")
+            SELECT 'ap' || n, 'st' || n, 'STUDENT', (1000000000 + n)::text, 'Murojaat ' || n, now()
+            FROM generate_series(1, {students}) n WHERE n % 20 = 1;
+            INSERT INTO "MessageCleanup" (id, "chatId", "messageIds", "nextAttemptAt")
+            SELECT 'mc' || n, 1000000000 + n, ARRAY[n, n + 1, n + 2], now() + (random() * 2 - 1) * interval '1 hour'
+            FROM generate_series(1, {max(100, students // 100)}) n;
+            """,
+        ),
+        (
+            "bot actors",
+            """
+            SELECT count(km_bot_actor_refresh(t.tg))
+            FROM (
+              SELECT "telegramUserId" AS tg FROM "User" WHERE "telegramUserId" IS NOT NULL
+              UNION
+              SELECT "telegramUserId" FROM "ParentContact"
+            ) t;
+            """,
+        ),
+        (
+            "result summaries",
+            """
+            SELECT count(km_result_summary_rebuild(u.id))
+            FROM "User" u
+            WHERE u.role = 'STUDENT';
+            """,
+        ),
+        ("analyze", "ANALYZE;"),
+    ]
+
+
+async def run(dsn: str, scale: float, seed: float) -> None:
+    students = max(100, int(100_000 * scale))
+    conn = await asyncpg.connect(dsn, command_timeout=None)
+    try:
+        if await conn.fetchval('SELECT EXISTS (SELECT 1 FROM "Student")'):
+            raise SystemExit("Target already has students; point PLAN_DATABASE_URL at a fresh, migrated database.")
+
+        await conn.execute("SET session_replication_role = replica")
+        await conn.execute("SELECT setseed($1)", seed)
+        print(f"PLAN_DATASET students={students}")
+        for label, sql in steps(students):
+            started = time.perf_counter()
+            if label == "analyze":
+                # Triggers back on before ANALYZE: bot actors and summaries are built by now.
+                await conn.execute("SET session_replication_role = origin")
+            async with conn.transaction():
+                await conn.execute(sql)
+            print(f"  {label:<26} {time.perf_counter() - started:8.1f}s")
+
+        for table in ("Student", "Submission", "SubmissionDetail", "Payment", "GroupJournalEntry", "AccessWindow"):
+            count = await conn.fetchval(f'SELECT count(*) FROM "{table}"')
+            print(f"  {table:<26} {count:>12,}")
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("PLAN_DATABASE_URL", ""))
+    parser.add_argument("--scale", type=float, default=1.0, help="1.0 = 100k students")
+    parser.add_argument("--seed", type=float, default=0.42, help="setseed() value in [-1, 1]")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("--dsn or PLAN_DATABASE_URL is required (never the production DATABASE_URL)")
+    asyncio.run(run(args.dsn, args.scale, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+"""Check the plan of every BotRepository statement against a production-sized dataset.
+
+    PLAN_DATABASE_URL=postgresql://... python benchmarks/query_plans.py
+    PLAN_DATABASE_URL=postgresql://... python benchmarks/query_plans.py --verbose --json plans.json
+
+Load the data with benchmarks/plan_dataset.py first. Each case calls a repository
+method with parameters picked from that data: the student with the most
+submissions, the parent with the most children, an open window, and so on. Every
+statement the method sends is first run as EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)
+inside a savepoint and then for real. The whole case is rolled back, so the write
+paths leave no trace.
+
+A statement fails when its plan:
+- sequentially scans a table with at least --large-table-rows rows;
+- has a total cost above its budget; or
+- takes longer than its time budget to execute.
+A public BotRepository method without a case also fails, so a new query cannot
+skip the check. Statements inside plpgsql functions and triggers (km_result_summary_add()
+and the others) are not expanded.
+
+Exits with code 1 on any failure.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+import inspect
+import json
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import asyncpg
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from db.repository import BotRepository  # noqa: E402
+from services.cache import BotCaches  # noqa: E402
+
+# Public methods that never touch the database.
+NOT_QUERIES = {"close", "gather_reads"}
+
+
+@dataclass
+class Sample:
+    now: datetime
+    student: dict
+    telegram_user_id: int
+    parent_phone: str
+    parent_telegram_user_id: int
+    window: dict
+    telegram_user_ids: list[int]
+    submission_cursor: Optional[tuple[datetime, str]]
+    journal_cursor: Optional[tuple[datetime, str]]
+    payment_cursor: Optional[tuple[datetime, str]]
+    cleanup_id: str
+    paid_checkout_ids: list[str]
+
+
+@dataclass
+class PlanCase:
+    method: str
+    label: str
+    call: Callable[[BotRepository, Sample], Awaitable[Any]]
+    cost_budget: Optional[float] = None
+    time_budget_ms: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} [{self.label}]" if self.label else self.method
+
+
+def _details() -> list[tuple[int, Optional[str], str, bool]]:
+    return [(number, "A", "A", True) for number in range(1, 11)]
+
+
+CASES = [
+    PlanCase("find_eligible_student_by_phone", "student", lambda r, s: r.find_eligible_student_by_phone(s.student["phone"])),
+    PlanCase("find_eligible_student_by_phone", "parent", lambda r, s: r.find_eligible_student_by_phone(s.parent_phone)),
+    PlanCase(
+        "link_student_for_bot",
+        "",
+        lambda r, s: r.link_student_for_bot(s.student, s.student["phone"], s.telegram_user_id),
+    ),
+    PlanCase(
+        "upsert_parent_contact",
+        "",
+        lambda r, s: r.upsert_parent_contact(s.parent_phone, s.parent_telegram_user_id),
+    ),
+    PlanCase("resolve_actor_by_telegram_user_id", "", lambda r, s: r.resolve_actor_by_telegram_user_id(s.telegram_user_id)),
+    PlanCase("warm_actors", "200 ids", lambda r, s: r.warm_actors(s.telegram_user_ids)),
+    PlanCase("get_test", "", lambda r, s: r.get_test(s.window["testId"])),
+    PlanCase("get_active_window", "", lambda r, s: r.get_active_window(s.window["studentId"])),
+    PlanCase(
+        "get_upcoming_window_targets",
+        "10 min",
+        lambda r, s: r.get_upcoming_window_targets(s.now, s.now + timedelta(minutes=10)),
+    ),
+    PlanCase("mark_window_opened_once", "", lambda r, s: r.mark_window_opened_once(s.window["id"], s.now)),
+    PlanCase("reset_window_opened", "", lambda r, s: r.reset_window_opened(s.window["id"])),
+    PlanCase(
+        "get_window_events",
+        "sweep",
+        lambda r, s: r.get_window_events(s.now - timedelta(minutes=1), s.now, timedelta(minutes=15)),
+    ),
+    PlanCase(
+        "get_window_events",
+        "by id",
+        lambda r, s: r.get_window_events(
+            s.now - timedelta(days=1), s.now + timedelta(days=1), timedelta(minutes=15), [s.window["id"]]
+        ),
+    ),
+    PlanCase(
+        "claim_window_reminders",
+        "",
+        lambda r, s: r.claim_window_reminders(
+            [(s.window["id"], "OPEN"), (s.window["id"], "CLOSING")], s.now, timedelta(minutes=15)
+        ),
+    ),
+    PlanCase(
+        "get_active_window_for_submit",
+        "",
+        lambda r, s: r.get_active_window_for_submit(s.window["id"], s.window["studentId"], s.window["testId"], s.now),
+    ),
+    PlanCase(
+        "lock_window_for_submission",
+        "",
+        lambda r, s: r.lock_window_for_submission(s.window["id"], s.window["studentId"], s.window["testId"], s.now),
+    ),
+    PlanCase(
+        "create_submission_with_details",
+        "",
+        lambda r, s: r.create_submission_with_details(
+            s.window["studentId"], s.window["testId"], "1A2A3A4A5A6A7A8A9A10A", ["A"] * 10, 10, _details()
+        ),
+    ),
+    PlanCase(
+        "commit_submission_batch",
+        "",
+        lambda r, s: r.commit_submission_batch(
+            [
+                {
+                    "windowId": s.window["id"],
+                    "submissionId": r._new_id(),
+                    "studentUserId": s.window["studentId"],
+                    "testId": s.window["testId"],
+                    "submittedAt": s.now,
+                    "rawAnswerText": "1A2A3A4A5A6A7A8A9A10A",
+                    "parsedAnswers": ["A"] * 10,
+                    "score": 10,
+                    "details": _details(),
+                }
+            ]
+        ),
+    ),
+    PlanCase(
+        "create_appeal",
+        "",
+        lambda r, s: r.create_appeal(s.student["id"], "STUDENT", s.telegram_user_id, s.student["phone"], "Murojaat"),
+    ),
+    PlanCase("get_student_result_summary", "", lambda r, s: r.get_student_result_summary(s.student["userId"])),
+    PlanCase("get_student_payments", "", lambda r, s: r.get_student_payments(s.student["id"])),
+    PlanCase(
+        "create_payment_checkout",
+        "reuse",
+        lambda r, s: r.create_payment_checkout(
+            student_id=s.student["id"],
+            student_code=s.student["studentCode"],
+            provider="PAYME",
+            amount=500000,
+            group_id=None,
+            note=None,
+            reuse_since=s.now - timedelta(minutes=30),
+            telegram_chat_id=s.telegram_user_id,
+        ),
+    ),
+    PlanCase("expire_payment_checkouts", "", lambda r, s: r.expire_payment_checkouts(s.now - timedelta(minutes=30))),
+    PlanCase("claim_paid_checkouts", "poll", lambda r, s: r.claim_paid_checkouts(updated_since=s.now - timedelta(days=1))),
+    PlanCase("claim_paid_checkouts", "ids", lambda r, s: r.claim_paid_checkouts(checkout_ids=s.paid_checkout_ids)),
+    PlanCase("get_student_submission_page", "first", lambda r, s: r.get_student_submission_page(s.student["userId"], limit=11)),
+    PlanCase(
+        "get_student_submission_page",
+        "older",
+        lambda r, s: r.get_student_submission_page(s.student["userId"], s.submission_cursor, older=True, limit=11),
+    ),
+    PlanCase(
+        "get_student_submission_page",
+        "newer",
+        lambda r, s: r.get_student_submission_page(s.student["userId"], s.submission_cursor, older=False, limit=11),
+    ),
+    PlanCase("get_student_journal_rows", "first", lambda r, s: r.get_student_journal_rows(s.student["id"], limit=11)),
+    PlanCase(
+        "get_student_journal_rows",
+        "older",
+        lambda r, s: r.get_student_journal_rows(s.student["id"], s.journal_cursor, older=True, limit=11),
+    ),
+    PlanCase("get_student_payment_page", "first", lambda r, s: r.get_student_payment_page(s.student["id"], limit=11)),
+    PlanCase(
+        "get_student_payment_page",
+        "older",
+        lambda r, s: r.get_student_payment_page(s.student["id"], s.payment_cursor, older=True, limit=11),
+    ),
+    PlanCase("enqueue_message_cleanup", "", lambda r, s: r.enqueue_message_cleanup(s.telegram_user_id, [1, 2, 3])),
+    PlanCase("get_due_message_cleanups", "", lambda r, s: r.get_due_message_cleanups(s.now)),
+    PlanCase("get_next_message_cleanup_at", "", lambda r, s: r.get_next_message_cleanup_at()),
+    PlanCase("finish_message_cleanup", "", lambda r, s: r.finish_message_cleanup(s.cleanup_id)),
+    PlanCase(
+        "retry_message_cleanup",
+        "",
+        lambda r, s: r.retry_message_cleanup(s.cleanup_id, s.now + timedelta(minutes=5), "Bad Request"),
+    ),
+]
+
+
+@dataclass
+class StatementPlan:
+    case: str
+    index: int
+    sql: str
+    cost: float = 0.0
+    time_ms: float = 0.0
+    nodes: list[str] = field(default_factory=list)
+    problems: list[str] = field(default_factory=list)
+    plan: Optional[dict] = None
+
+
+class ExplainingConnection:
+    """Runs every statement as EXPLAIN ANALYZE in a savepoint before executing it."""
+
+    def __init__(self, conn: asyncpg.Connection) -> None:
+        self._conn = conn
+        self.plans: list[tuple[str, dict]] = []
+
+    async def _explain(self, sql: str, args: tuple) -> None:
+        savepoint = self._conn.transaction()
+        await savepoint.start()
+        try:
+            raw = await self._conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args)
+        finally:
+            await savepoint.rollback()
+        self.plans.append((sql, json.loads(raw)[0]))
+
+    async def fetch(self, sql: str, *args: Any, **kwargs: Any) -> list[asyncpg.Record]:
+        await self._explain(sql, args)
+        return await self._conn.fetch(sql, *args, **kwargs)
+
+    async def fetchrow(self, sql: str, *args: Any, **kwargs: Any) -> Optional[asyncpg.Record]:
+        await self._explain(sql, args)
+        return await self._conn.fetchrow(sql, *args, **kwargs)
+
+    async def fetchval(self, sql: str, *args: Any, **kwargs: Any) -> Any:
+        await self._explain(sql, args)
+        return await self._conn.fetchval(sql, *args, **kwargs)
+
+    async def execute(self, sql: str, *args: Any, **kwargs: Any) -> str:
+        await self._explain(sql, args)
+        return await self._conn.execute(sql, *args, **kwargs)
+
+    async def executemany(self, sql: str, args: list[tuple], **kwargs: Any) -> None:
+        if args:
+            await self._explain(sql, tuple(args[0]))
+        await self._conn.executemany(sql, args, **kwargs)
+
+    async def copy_records_to_table(self, *args: Any, **kwargs: Any) -> str:
+        return await self._conn.copy_records_to_table(*args, **kwargs)
+
+    def transaction(self, **kwargs: Any) -> Any:
+        return self._conn.transaction(**kwargs)
+
+
+class ExplainingPool:
+    def __init__(self, conn: ExplainingConnection) -> None:
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[ExplainingConnection]:
+        yield self.conn
+
+    async def close(self) -> None:
+        pass
+
+
+async def load_sample(conn: asyncpg.Connection) -> Sample:
+    now = datetime.utcnow()
+    student = await conn.fetchrow(
+        """
+        SELECT s.id, s."studentCode", s."fullName", s.phone, s."parentPhone", s."userId", u."telegramUserId"
+        FROM "StudentResultSummary" r
+        JOIN "Student" s ON s."userId" = r."studentId"
+        JOIN "User" u ON u.id = s."userId"
+        WHERE u."telegramUserId" IS NOT NULL
+        ORDER BY r."submissionCount" DESC
+        LIMIT 1
+        """
+    )
+    parent = await conn.fetchrow(
+        """
+        SELECT s."parentPhone", max(pc."telegramUserId") AS "telegramUserId"
+        FROM "Student" s
+        LEFT JOIN "ParentContact" pc ON pc.phone = s."parentPhone"
+        WHERE s."parentPhone" IS NOT NULL
+        GROUP BY s."parentPhone"
+        ORDER BY count(*) DESC, s."parentPhone"
+        LIMIT 1
+        """
+    )
+    window = await conn.fetchrow(
+        """
+        SELECT id, "studentId", "testId"
+        FROM "AccessWindow"
+        WHERE "isActive" = true AND "submittedAt" IS NULL AND "openFrom" <= $1 AND "openTo" >= $1
+        ORDER BY id
+        LIMIT 1
+        """,
+        now,
+    )
+    if student is None or parent is None or window is None:
+        raise SystemExit("Dataset is missing students, parents or an open window; run benchmarks/plan_dataset.py.")
+
+    async def cursor(table: str, column: str, owner: str) -> Optional[tuple[datetime, str]]:
+        row = await conn.fetchrow(
+            f'SELECT "{column}" AS at, id FROM "{table}" WHERE "studentId" = $1 ORDER BY "{column}" DESC, id DESC OFFSET 20 LIMIT 1',
+            owner,
+        )
+        return (row["at"], row["id"]) if row else None
+
+    return Sample(
+        now=now,
+        student=dict(student),
+        telegram_user_id=int(student["telegramUserId"]),
+        parent_phone=parent["parentPhone"],
+        parent_telegram_user_id=int(parent["telegramUserId"] or 2_999_999_999),
+        window=dict(window),
+        telegram_user_ids=[
+            int(row["telegramUserId"])
+            for row in await conn.fetch('SELECT "telegramUserId" FROM "BotActor" ORDER BY "telegramUserId" LIMIT 200')
+        ],
+        submission_cursor=await cursor("Submission", "createdAt", student["userId"]),
+        journal_cursor=await cursor("GroupJournalEntry", "updatedAt", student["id"]),
+        payment_cursor=await cursor("Payment", "createdAt", student["id"]),
+        cleanup_id=await conn.fetchval('SELECT id FROM "MessageCleanup" ORDER BY "nextAttemptAt" LIMIT 1'),
+        paid_checkout_ids=[
+            row["id"]
+            for row in await conn.fetch(
+                """
+                SELECT id FROM "PaymentCheckout"
+                WHERE status = 'PAID' AND "notifiedAt" IS NULL AND "telegramChatId" IS NOT NULL
+                ORDER BY id
+                LIMIT 5
+                """
+            )
+        ],
+    )
+
+
+def _walk(node: dict) -> list[dict]:
+    nodes = [node]
+    for child in node.get("Plans", []):
+        nodes.extend(_walk(child))
+    return nodes
+
+
+def _describe(node: dict) -> str:
+    parts = [node["Node Type"]]
+    if "Relation Name" in node:
+        parts.append(node["Relation Name"])
+    if "Index Name" in node:
+        parts.append(f"using {node['Index Name']}")
+    return " ".join(parts)
+
+
+def check_plan(
+    statement: StatementPlan,
+    plan: dict,
+    table_rows: dict[str, float],
+    large_table_rows: float,
+    cost_budget: float,
+    time_budget_ms: float,
+) -> None:
+    root = plan["Plan"]
+    statement.plan = plan
+    statement.cost = float(root["Total Cost"])
+    statement.time_ms = float(plan.get("Execution Time", 0.0))
+    for node in _walk(root):
+        if node["Node Type"] in ("Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan", "Bitmap Index Scan"):
+            statement.nodes.append(_describe(node))
+        if node["Node Type"] == "Seq Scan":
+            rows = table_rows.get(node["Relation Name"], 0)
+            if rows >= large_table_rows:
+                statement.problems.append(f'seq scan on "{node["Relation Name"]}" (~{int(rows):,} rows)')
+    if statement.cost > cost_budget:
+        statement.problems.append(f"cost {statement.cost:,.0f} > {cost_budget:,.0f}")
+    if statement.time_ms > time_budget_ms:
+        statement.problems.append(f"{statement.time_ms:.1f}ms > {time_budget_ms:.0f}ms")
+
+
+def uncovered_methods() -> list[str]:
+    methods = {
+        name
+        for name, member in inspect.getmembers(BotRepository, inspect.iscoroutinefunction)
+        if not name.startswith("_") and name not in NOT_QUERIES
+    }
+    return sorted(methods - {case.method for case in CASES})
+
+
+async def run(args: argparse.Namespace) -> int:
+    conn = await asyncpg.connect(args.dsn)
+    try:
+        table_rows = {
+            row["relname"]: float(row["reltuples"])
+            for row in await conn.fetch(
+                "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace"
+            )
+        }
+        sample = await load_sample(conn)
+        statements: list[StatementPlan] = []
+        failures = 0
+
+        for case in CASES:
+            if args.case and args.case not in case.method:
+                continue
+            explaining = ExplainingConnection(conn)
+            repo = BotRepository(pool=ExplainingPool(explaining), cache=BotCaches())  # type: ignore[arg-type]
+            outer = conn.transaction()
+            await outer.start()
+            started = time.perf_counter()
+            error = None
+            try:
+                await case.call(repo, sample)
+            except Exception as exc:
+                error = exc
+            finally:
+                await outer.rollback()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            if error is not None:
+                failures += 1
+                print(f"FAIL {case.name}: {type(error).__name__}: {error}")
+                continue
+            if not explaining.plans:
+                print(f"  ok {case.name}: no statements ({elapsed_ms:.1f}ms)")
+                continue
+
+            for index, (sql, plan) in enumerate(explaining.plans, start=1):
+                statement = StatementPlan(case=case.name, index=index, sql=" ".join(sql.split()))
+                check_plan(
+                    statement,
+                    plan,
+                    table_rows,
+                    args.large_table_rows,
+                    case.cost_budget or args.cost_budget,
+                    case.time_budget_ms or args.time_budget_ms,
+                )
+                statements.append(statement)
+                status = "FAIL" if statement.problems else "  ok"
+                failures += bool(statement.problems)
+                print(f"{status} {case.name} #{index}: cost={statement.cost:,.1f} time={statement.time_ms:.2f}ms")
+                for problem in statement.problems:
+                    print(f"       {problem}")
+                if args.verbose or statement.problems:
+                    for node in dict.fromkeys(statement.nodes):
+                        print(f"       - {node}")
+                if statement.problems:
+                    print(f"       {statement.sql[:300]}")
+
+        if not args.case:
+            for method in uncovered_methods():
+                failures += 1
+                print(f"FAIL {method}: no PlanCase; add one to benchmarks/query_plans.py")
+
+        if args.json:
+            Path(args.json).write_text(
+                json.dumps(
+                    [
+                        {
+                            "case": s.case,
+                            "statement": s.index,
+                            "sql": s.sql,
+                            "cost": s.cost,
+                            "timeMs": s.time_ms,
+                            "problems": s.problems,
+                            "plan": s.plan,
+                        }
+                        for s in statements
+                    ],
+                    indent=2,
+                    default=str,
+                ),
+                encoding="utf-8",
+            )
+
+        print(f"QUERY_PLANS statements={len(statements)} failures={failures}")
+        return failures
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.getenv("PLAN_DATABASE_URL", ""))
+    parser.add_argument("--large-table-rows", type=float, default=50_000, help="seq scans above this many rows fail")
+    parser.add_argument("--cost-budget", type=float, default=5_000)
+    parser.add_argument("--time-budget-ms", type=float, default=50)
+    parser.add_argument("--case", help="only methods whose name contains this")
+    parser.add_argument("--json", help="write every plan to this file")
+    parser.add_argument("--verbose", action="store_true", help="print scan nodes of passing statements too")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("--dsn or PLAN_DATABASE_URL is required")
+    if asyncio.run(run(args)):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Micro-benchmarks for the pure per-request hot paths.
+
+    python benchmarks/run_benchmarks.py                  # compare with baseline.json
+    python benchmarks/run_benchmarks.py --save           # record a new baseline
+    python benchmarks/run_benchmarks.py --tolerance 0.3  # allow 30% slowdown
+
+Exits with code 1 when any case is slower than baseline by more than the tolerance.
+Baselines are machine specific: re-record them on the machine that runs the check.
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import date, datetime, timedelta
+import json
+from pathlib import Path
+import random
+import sys
+import timeit
+from typing import Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from config import Settings  # noqa: E402
+from services.answer_parser import compile_answer_key, parse_answer_text, scan_answers  # noqa: E402
+from services.bot_logic import BotLogic  # noqa: E402
+from services.debt import summarize_debt  # noqa: E402
+from services.formatters import add_months_keeping_day  # noqa: E402
+from services.phone import normalize_uz_phone  # noqa: E402
+from services.session_store import SessionStore  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+TOTAL_QUESTIONS = 600
+
+
+def _answer_text(rng: random.Random) -> str:
+    # "1A 2b 3C ..." with the occasional separator typo, capped at the 3000-char parser limit.
+    parts = []
+    size = 0
+    for number in range(1, TOTAL_QUESTIONS + 1):
+        part = f"{number}{rng.choice('ABCDabcd')}{rng.choice(['', ' ', ' ', ','])}"
+        if size + len(part) > 3000:
+            break
+        parts.append(part)
+        size += len(part)
+    return "".join(parts)
+
+
+def _payment_rows(rng: random.Random, count: int = 500) -> list[dict]:
+    rows = []
+    start = datetime(2024, 1, 5)
+    groups = [f"g{idx}" for idx in range(6)]
+    for idx in range(count):
+        group_id = groups[idx % len(groups)]
+        period_start = start + timedelta(days=30 * (idx // len(groups)))
+        required = rng.choice([400_000, 500_000, 650_000])
+        rows.append(
+            {
+                "id": f"p{idx}",
+                "amountRequired": required,
+                "amountPaid": rng.choice([0, required // 2, required]),
+                "discount": rng.choice([0, 0, 50_000]),
+                "month": period_start.strftime("%Y-%m"),
+                "periodStart": period_start,
+                "periodEnd": period_start + timedelta(days=30),
+                "groupId": group_id,
+                "status": "PARTIAL",
+                "group_code": group_id.upper(),
+                "group_status": "OCHIQ",
+                "group_price": required,
+            }
+        )
+    return rows
+
+
+def build_cases() -> dict[str, Callable[[], object]]:
+    rng = random.Random(2026)
+    answer_text = _answer_text(rng)
+    answer_key = compile_answer_key([rng.choice("ABCD") for _ in range(TOTAL_QUESTIONS)], TOTAL_QUESTIONS)
+    scan = scan_answers(answer_text, TOTAL_QUESTIONS, answer_key)
+    rows = _payment_rows(rng)
+    today = date(2026, 2, 15)
+    debt = summarize_debt(rows, today)
+
+    logic = BotLogic(
+        repo=None,  # type: ignore[arg-type]
+        settings=Settings(
+            bot_token="x",
+            web_base_url="https://online.kelajakmediklari.uz",
+            database_url="postgres://x",
+            webhook_url=None,
+            webhook_path=None,
+            bot_port=4000,
+            node_env="production",
+            allow_partial_submissions=False,
+            debug_updates=False,
+            payme_url_template="https://checkout.paycom.uz/?m=1&a={amount_tiyin}&c={comment_url}&cb={callback_url_encoded}",
+        ),
+        sessions=SessionStore(),
+    )
+    checkout = {
+        "id": "c" * 32,
+        "studentCode": "KM-000123",
+        "groupId": "g1",
+        "amount": 650_000,
+        "callbackToken": "t" * 32,
+    }
+    phones = ["+998 90 123-45-67", "998901234567", "901234567", "+998(93)1112233"]
+
+    return {
+        "parse_answer_text": lambda: parse_answer_text(answer_text, TOTAL_QUESTIONS),
+        "scan_answers_scored": lambda: scan_answers(answer_text, TOTAL_QUESTIONS, answer_key),
+        "submission_details": lambda: scan.details(answer_key),
+        "summarize_debt": lambda: summarize_debt(rows, today),
+        "build_debt_summary_text": lambda: logic._build_debt_summary_text(debt, "KM-000123"),
+        "build_provider_payment_url": lambda: logic._build_provider_payment_url("PAYME", checkout),
+        "normalize_uz_phone": lambda: [normalize_uz_phone(phone) for phone in phones],
+        "add_months_keeping_day": lambda: add_months_keeping_day(date(2024, 1, 31), 13),
+    }
+
+
+def measure(func: Callable[[], object], repeat: int = 5) -> float:
+    timer = timeit.Timer(func)
+    # autorange doubles as a warm-up pass; the best of several repeats filters scheduler noise.
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return number / best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="write results to baseline.json")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed throughput drop (0.25 = 25%%)")
+    parser.add_argument("--only", nargs="*", help="run only these cases")
+    args = parser.parse_args()
+
+    cases = build_cases()
+    if args.only:
+        cases = {name: func for name, func in cases.items() if name in set(args.only)}
+
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {}
+    results: dict[str, float] = {}
+    regressions = []
+
+    for name, func in cases.items():
+        ops = measure(func)
+        results[name] = ops
+        base = baseline.get(name)
+        if base:
+            change = ops / base - 1
+            flag = ""
+            if change < -args.tolerance:
+                flag = "  <-- REGRESSION"
+                regressions.append(name)
+            print(f"{name:<28} {ops:>14,.0f} ops/s  baseline {base:>14,.0f}  {change:+.1%}{flag}")
+        else:
+            print(f"{name:<28} {ops:>14,.0f} ops/s  (no baseline)")
+
+    if args.save:
+        merged = {**baseline, **{name: round(ops, 1) for name, ops in results.items()}}
+        BASELINE_PATH.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"Baseline saved: {BASELINE_PATH}")
+        return
+
+    if regressions:
+        print(f"BENCH_FAIL: {', '.join(regressions)} slower than baseline by more than {args.tolerance:.0%}")
+        raise SystemExit(1)
+    print("BENCH_OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,49 @@ class Settings:
     paynet_url_template: str = ""
     payment_callback_base_url: str = ""
     allow_mock_payment_links: bool = True
+    record_updates_dir: str = ""
+    record_updates_max_mb: int = 64
+    record_updates_salt: str = ""
+    record_updates_max_files: int = 20
+    profile_dir: str = ""
+    profile_enabled: bool = False
+    profile_sample_rate: float = 0.01
+    profile_slow_ms: int = 1000
+    profile_interval_ms: int = 5
+    profile_admin_ids: tuple[int, ...] = ()
+    loop_monitor_interval_ms: int = 100
+    loop_block_threshold_ms: int = 100
+    loop_lag_report_seconds: int = 60
+    trace_dir: str = ""
+    trace_slow_ms: int = 1000
+    trace_sample_rate: float = 0.0
+    trace_max_mb: int = 64
+    memory_trace_on_start: bool = False
+    db_listen_invalidation: bool = True
+    db_fanout_budget: int = 2
+    database_replica_url: str = ""
+    replica_max_lag_seconds: float = 5.0
+    replica_check_seconds: float = 1.0
+    cache_image_mb: int = 64
+    image_max_side: int = 2048
+    image_jpeg_quality: int = 85
+    image_cache_dir: str = ""
+    image_cache_dir_mb: int = 512
+    warmup_lead_minutes: int = 10
+    warmup_interval_seconds: int = 60
+    warmup_chat_id: int | None = None
+    reminders_enabled: bool = False
+    reminder_close_lead_minutes: int = 15
+    submission_journal_dir: str = ""
+    audit_async: bool = True
+    audit_flush_ms: int = 200
+    audit_batch_size: int = 500
+    audit_queue_size: int = 10000
+    audit_overflow: str = "block"
+    audit_max_attempts: int = 5
+    audit_dead_letter_file: str = ""
+    audit_report_seconds: int = 300
+    payment_checkout_ttl_minutes: int = 30
 
     @property
     def is_production(self) -> bool:
@@ -54,6 +97,8 @@ def load_settings() -> Settings:
 
     webhook_url = os.getenv("BOT_WEBHOOK_URL")
     webhook_path = os.getenv("BOT_WEBHOOK_PATH")
+    warmup_chat_id = os.getenv("WARMUP_CHAT_ID", "").strip()
+    profile_admin_ids = os.getenv("PROFILE_ADMIN_IDS", "")
 
     return Settings(
         bot_token=bot_token,
@@ -74,4 +119,47 @@ def load_settings() -> Settings:
             f"{web_base_url.rstrip('/')}/api/payment-gateway/callback",
         ).strip(),
         allow_mock_payment_links=os.getenv("ALLOW_MOCK_PAYMENT_LINKS", "true").lower() == "true",
+        record_updates_dir=os.getenv("RECORD_UPDATES_DIR", "").strip(),
+        record_updates_max_mb=int(os.getenv("RECORD_UPDATES_MAX_MB", "64")),
+        record_updates_salt=os.getenv("RECORD_UPDATES_SALT", "").strip(),
+        record_updates_max_files=int(os.getenv("RECORD_UPDATES_MAX_FILES", "20")),
+        profile_dir=os.getenv("PROFILE_DIR", "").strip(),
+        profile_enabled=os.getenv("PROFILE_ENABLED", "false").lower() == "true",
+        profile_sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0.01")),
+        profile_slow_ms=int(os.getenv("PROFILE_SLOW_MS", "1000")),
+        profile_interval_ms=int(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        profile_admin_ids=tuple(int(item) for item in profile_admin_ids.replace(",", " ").split()),
+        loop_monitor_interval_ms=int(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100")),
+        loop_block_threshold_ms=int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")),
+        loop_lag_report_seconds=int(os.getenv("LOOP_LAG_REPORT_SECONDS", "60")),
+        trace_dir=os.getenv("TRACE_DIR", "").strip(),
+        trace_slow_ms=int(os.getenv("TRACE_SLOW_MS", "1000")),
+        trace_sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")),
+        trace_max_mb=int(os.getenv("TRACE_MAX_MB", "64")),
+        memory_trace_on_start=os.getenv("MEMORY_TRACE_ON_START", "false").lower() == "true",
+        db_listen_invalidation=os.getenv("DB_LISTEN_INVALIDATION", "true").lower() == "true",
+        db_fanout_budget=int(os.getenv("DB_FANOUT_BUDGET", "2")),
+        database_replica_url=os.getenv("DATABASE_REPLICA_URL", "").strip(),
+        replica_max_lag_seconds=float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5")),
+        replica_check_seconds=float(os.getenv("REPLICA_CHECK_SECONDS", "1")),
+        cache_image_mb=int(os.getenv("CACHE_IMAGE_MB", "64")),
+        image_max_side=int(os.getenv("IMAGE_MAX_SIDE", "2048")),
+        image_jpeg_quality=int(os.getenv("IMAGE_JPEG_QUALITY", "85")),
+        image_cache_dir=os.getenv("IMAGE_CACHE_DIR", "").strip(),
+        image_cache_dir_mb=int(os.getenv("IMAGE_CACHE_DIR_MB", "512")),
+        warmup_lead_minutes=int(os.getenv("WARMUP_LEAD_MINUTES", "10")),
+        warmup_interval_seconds=int(os.getenv("WARMUP_INTERVAL_SECONDS", "60")),
+        warmup_chat_id=int(warmup_chat_id) if warmup_chat_id else None,
+        reminders_enabled=os.getenv("REMINDERS_ENABLED", "false").lower() == "true",
+        reminder_close_lead_minutes=int(os.getenv("REMINDER_CLOSE_LEAD_MINUTES", "15")),
+        submission_journal_dir=os.getenv("SUBMISSION_JOURNAL_DIR", "").strip(),
+        audit_async=os.getenv("AUDIT_ASYNC", "true").lower() == "true",
+        audit_flush_ms=int(os.getenv("AUDIT_FLUSH_MS", "200")),
+        audit_batch_size=int(os.getenv("AUDIT_BATCH_SIZE", "500")),
+        audit_queue_size=int(os.getenv("AUDIT_QUEUE_SIZE", "10000")),
+        audit_overflow=os.getenv("AUDIT_OVERFLOW", "block").strip().lower(),
+        audit_max_attempts=int(os.getenv("AUDIT_MAX_ATTEMPTS", "5")),
+        audit_dead_letter_file=os.getenv("AUDIT_DEAD_LETTER_FILE", "").strip(),
+        audit_report_seconds=int(os.getenv("AUDIT_REPORT_SECONDS", "300")),
+        payment_checkout_ttl_minutes=int(os.getenv("PAYMENT_CHECKOUT_TTL_MINUTES", "30")),
     )
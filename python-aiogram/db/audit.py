@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime
+import json
+import time
+from typing import Any, Optional
+from uuid import uuid4
+
+import asyncpg
+
+
+AUDIT_COLUMNS = ["id", "actorId", "action", "entity", "entityId", "payload", "createdAt"]
+OVERFLOW_POLICIES = ("block", "drop")
+
+
+@dataclass
+class AuditEvent:
+    action: str
+    entity: str
+    entity_id: str
+    actor_id: Optional[str] = None
+    payload: Optional[dict[str, Any]] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    id: str = field(default_factory=lambda: uuid4().hex)
+    # time.monotonic() at enqueue, for the enqueue -> commit latency metric.
+    queued_at: float = 0.0
+
+    def record(self) -> tuple:
+        payload = json.dumps(self.payload) if self.payload is not None else None
+        return (self.id, self.actor_id, self.action, self.entity, self.entity_id, payload, self.created_at)
+
+
+async def write_audit_events(conn: asyncpg.Connection, events: list[AuditEvent]) -> None:
+    """COPY events into "AuditLog" on ``conn`` (inside the caller's transaction, if any)."""
+    if events:
+        await conn.copy_records_to_table("AuditLog", records=[event.record() for event in events], columns=AUDIT_COLUMNS)
+
+
+@dataclass
+class AuditStats:
+    enqueued: int = 0
+    written: int = 0
+    sync_written: int = 0
+    flushes: int = 0
+    flush_errors: int = 0
+    dropped: int = 0
+    # Events given up on after ``max_attempts`` failed flushes.
+    dead_lettered: int = 0
+    lost: int = 0
+    blocked: int = 0
+    queue_high_water: int = 0
+    last_flush_ms: float = 0.0
+    max_flush_ms: float = 0.0
+    last_latency_ms: float = 0.0
+    max_latency_ms: float = 0.0
+
+
+class AuditLogWriter:
+    """Buffers AuditLog rows in a bounded queue and COPYs them in the background.
+
+    A flush happens every ``flush_interval`` seconds or as soon as ``batch_size``
+    events are queued. When the queue is full, ``overflow="block"`` makes ``record``
+    wait for room and ``overflow="drop"`` discards the new event; both are counted.
+    Events that must commit atomically with other writes are passed with ``conn``
+    and written straight into that connection's transaction instead.
+
+    A batch that fails ``max_attempts`` flushes in a row is given up on, so a broken
+    database cannot stall ``record`` behind a full queue: it is appended to
+    ``dead_letter_path`` as JSON lines when set, and dropped otherwise. The stats are
+    printed every ``report_interval`` seconds while they change.
+    """
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        overflow: str = "block",
+        retry_delay: float = 2.0,
+        max_attempts: int = 5,
+        dead_letter_path: str = "",
+        report_interval: float = 300.0,
+    ) -> None:
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"UNKNOWN_AUDIT_OVERFLOW: {overflow}")
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.dead_letter_path = dead_letter_path
+        self.report_interval = report_interval
+        self.stats = AuditStats()
+        self._queue: asyncio.Queue[AuditEvent] = asyncio.Queue(maxsize=max_queue)
+        self._batch: list[AuditEvent] = []
+        self._task: Optional[asyncio.Task] = None
+        self._report_task: Optional[asyncio.Task] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    async def record(self, event: AuditEvent, conn: Optional[asyncpg.Connection] = None) -> bool:
+        """Queue ``event``, or write it on ``conn`` right away; False if it was dropped."""
+        if conn is not None or self._task is None:
+            if conn is None:
+                async with self.pool.acquire() as own:
+                    await write_audit_events(own, [event])
+            else:
+                await write_audit_events(conn, [event])
+            self.stats.sync_written += 1
+            return True
+
+        event.queued_at = time.monotonic()
+        if self._queue.full():
+            if self.overflow == "drop":
+                self.stats.dropped += 1
+                if self.stats.dropped == 1 or self.stats.dropped % 1000 == 0:
+                    print("AUDIT_QUEUE_FULL", "dropped", self.stats.dropped)
+                return False
+            self.stats.blocked += 1
+            await self._queue.put(event)
+        else:
+            self._queue.put_nowait(event)
+
+        self.stats.enqueued += 1
+        self.stats.queue_high_water = max(self.stats.queue_high_water, self._queue.qsize())
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+        if self._report_task is None and self.report_interval > 0:
+            self._report_task = asyncio.create_task(self._report_loop())
+
+    async def close(self, timeout: float = 10.0) -> None:
+        if self._report_task is not None:
+            self._report_task.cancel()
+            try:
+                await self._report_task
+            except asyncio.CancelledError:
+                pass
+            self._report_task = None
+        if self._task is not None:
+            deadline = asyncio.get_running_loop().time() + timeout
+            while (self._batch or not self._queue.empty()) and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.05)
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        # Whatever is still collected or queued gets one last attempt.
+        events, self._batch = self._batch, []
+        while not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        if events:
+            try:
+                await asyncio.wait_for(self._flush(events), timeout=timeout)
+            except Exception as error:
+                self.stats.flush_errors += 1
+                print("AUDIT_FLUSH_ERROR", len(events), "on shutdown", error)
+                await self._give_up(events)
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "queueDepth": self.queue_depth,
+            "queueHighWater": self.stats.queue_high_water,
+            "overflow": self.overflow,
+            "enqueued": self.stats.enqueued,
+            "written": self.stats.written,
+            "syncWritten": self.stats.sync_written,
+            "dropped": self.stats.dropped,
+            "blocked": self.stats.blocked,
+            "flushes": self.stats.flushes,
+            "flushErrors": self.stats.flush_errors,
+            "deadLettered": self.stats.dead_lettered,
+            "lost": self.stats.lost,
+            "lastFlushMs": round(self.stats.last_flush_ms, 1),
+            "maxFlushMs": round(self.stats.max_flush_ms, 1),
+            "lastLatencyMs": round(self.stats.last_latency_ms, 1),
+            "maxLatencyMs": round(self.stats.max_latency_ms, 1),
+        }
+
+    async def _loop(self) -> None:
+        while True:
+            self._batch = events = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+            while len(events) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    events.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            for attempt in range(self.max_attempts):
+                if attempt:
+                    await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+                try:
+                    await self._flush(events)
+                    break
+                except Exception as error:
+                    self.stats.flush_errors += 1
+                    print("AUDIT_FLUSH_ERROR", len(events), error)
+            else:
+                await self._give_up(events)
+            self._batch = []
+
+    async def _give_up(self, events: list[AuditEvent]) -> None:
+        if self.dead_letter_path:
+            try:
+                await asyncio.to_thread(self._write_dead_letter, events)
+                self.stats.dead_lettered += len(events)
+                print("AUDIT_DEAD_LETTER", len(events), self.dead_letter_path)
+                return
+            except OSError as error:
+                print("AUDIT_DEAD_LETTER_ERROR", error)
+        self.stats.lost += len(events)
+        print("AUDIT_DROPPED", len(events), "events after", self.max_attempts, "failed flushes")
+
+    def _write_dead_letter(self, events: list[AuditEvent]) -> None:
+        with open(self.dead_letter_path, "a", encoding="utf-8") as handle:
+            for event in events:
+                handle.write(json.dumps(dict(zip(AUDIT_COLUMNS, event.record())), default=str) + "\n")
+
+    async def _report_loop(self) -> None:
+        last: Optional[dict[str, Any]] = None
+        while True:
+            await asyncio.sleep(self.report_interval)
+            report = self.report()
+            if report != last:
+                print("AUDIT", report)
+                last = report
+
+    async def _flush(self, events: list[AuditEvent]) -> None:
+        started = time.monotonic()
+        async with self.pool.acquire() as conn:
+            await write_audit_events(conn, events)
+        finished = time.monotonic()
+
+        self.stats.flushes += 1
+        self.stats.written += len(events)
+        self.stats.last_flush_ms = (finished - started) * 1000
+        self.stats.max_flush_ms = max(self.stats.max_flush_ms, self.stats.last_flush_ms)
+        oldest = min(event.queued_at for event in events)
+        self.stats.last_latency_ms = (finished - oldest) * 1000
+        self.stats.max_latency_ms = max(self.stats.max_latency_ms, self.stats.last_latency_ms)
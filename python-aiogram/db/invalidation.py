@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+import json
+import time
+from typing import Any, Awaitable, Callable, Optional, Union
+
+import asyncpg
+
+
+# NOTIFY channel -> table, see migrations 20261019110000_cache_invalidation_notify,
+# 20261019120000_window_warmup and 20261019170000_checkout_confirmations.
+CHANNELS = {
+    "km_inv_student": "Student",
+    "km_inv_enrollment": "Enrollment",
+    "km_inv_group": "GroupCatalog",
+    "km_inv_test": "Test",
+    "km_inv_test_image": "TestImage",
+    "km_inv_access_window": "AccessWindow",
+    "km_inv_payment": "Payment",
+    "km_inv_bot_actor": "BotActor",
+    "km_inv_payment_checkout": "PaymentCheckout",
+}
+
+
+@dataclass(frozen=True)
+class InvalidationEvent:
+    table: str
+    op: str
+    # None means "anything in this table may have changed".
+    row_id: Optional[str]
+    keys: dict[str, Any] = field(default_factory=dict)
+
+    def get(self, key: str) -> Any:
+        return self.keys.get(key)
+
+
+EventHandler = Callable[[InvalidationEvent], Union[None, Awaitable[None]]]
+FlushHandler = Callable[[], Union[None, Awaitable[None]]]
+
+
+@dataclass
+class InvalidationStats:
+    connected: bool = False
+    events: int = 0
+    flushes: int = 0
+    reconnects: int = 0
+    handler_errors: int = 0
+    last_event_at: Optional[float] = None
+
+
+class InvalidationBus:
+    """Dispatches row-change NOTIFYs from Postgres to in-process cache handlers.
+
+    Uses its own long-lived connection outside the pool. Notifications sent while
+    that connection is down are lost, so every (re)connect calls the flush handlers
+    once LISTEN is in place; caches should then drop everything they hold.
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        reconnect_min: float = 1.0,
+        reconnect_max: float = 30.0,
+        health_interval: float = 30.0,
+    ) -> None:
+        self.database_url = database_url
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.health_interval = health_interval
+        self.stats = InvalidationStats()
+        self._handlers: dict[str, list[EventHandler]] = {}
+        self._flush_handlers: list[FlushHandler] = []
+        self._pending: set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._conn: Optional[asyncpg.Connection] = None
+
+    def subscribe(self, table: str, handler: EventHandler) -> None:
+        if table not in CHANNELS.values():
+            raise ValueError(f"UNKNOWN_INVALIDATION_TABLE: {table}")
+        self._handlers.setdefault(table, []).append(handler)
+
+    def on_flush(self, handler: FlushHandler) -> None:
+        self._flush_handlers.append(handler)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    async def _run(self) -> None:
+        delay = self.reconnect_min
+        first = True
+        while True:
+            try:
+                conn = await asyncpg.connect(self.database_url)
+            except Exception as error:
+                print("INVALIDATION_CONNECT_ERROR", repr(error))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max)
+                continue
+
+            delay = self.reconnect_min
+            if not first:
+                self.stats.reconnects += 1
+            first = False
+
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _conn: lost.set())
+            self._conn = conn
+            try:
+                for channel in CHANNELS:
+                    await conn.add_listener(channel, self._on_notify)
+                self.stats.connected = True
+                # Whatever changed before LISTEN was in place has no event; start clean.
+                self._flush()
+
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), timeout=self.health_interval)
+                    except asyncio.TimeoutError:
+                        await conn.fetchval("SELECT 1", timeout=5)
+            except Exception as error:
+                print("INVALIDATION_LISTENER_ERROR", repr(error))
+            finally:
+                self.stats.connected = False
+                self._conn = None
+                if not conn.is_closed():
+                    try:
+                        await asyncio.wait_for(conn.close(), timeout=5)
+                    except Exception:
+                        conn.terminate()
+
+            await asyncio.sleep(delay)
+
+    def _on_notify(self, _conn: asyncpg.Connection, _pid: int, channel: str, payload: str) -> None:
+        table = CHANNELS.get(channel)
+        if table is None:
+            return
+
+        try:
+            data = json.loads(payload)
+            op = str(data.pop("op"))
+            row_id = data.pop("id", None)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            op, row_id, data = "UNKNOWN", None, {}
+
+        self.stats.events += 1
+        self.stats.last_event_at = time.time()
+        event = InvalidationEvent(table=table, op=op, row_id=row_id, keys=data)
+        for handler in self._handlers.get(table, []):
+            self._call(handler, event)
+
+    def _flush(self) -> None:
+        self.stats.flushes += 1
+        for handler in self._flush_handlers:
+            self._call(handler)
+
+    def _call(self, handler: Callable[..., Any], *args: Any) -> None:
+        try:
+            result = handler(*args)
+        except Exception as error:
+            self.stats.handler_errors += 1
+            print("INVALIDATION_HANDLER_ERROR", getattr(handler, "__qualname__", handler), error)
+            return
+
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self._pending.add(task)
+            task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.handler_errors += 1
+            print("INVALIDATION_HANDLER_ERROR", task.exception())
@@ -1,7 +1,109 @@
 from __future__ import annotations
 
+import re
+import sys
+from typing import Any
+
 import asyncpg
 
+from services.tracing import KIND_CLIENT, span, tracing_active
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _caller() -> str:
+    # The function that issued the query: a repository method, or asyncpg itself for
+    # the reset query it runs when a connection goes back to the pool.
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get("__name__") == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return "query"
+    module = frame.f_globals.get("__name__", "")
+    if module.startswith("asyncpg"):
+        return f"asyncpg.{frame.f_code.co_name}"
+    return frame.f_code.co_name
+
+
+def _status_rows(status: Any) -> int:
+    # "UPDATE 3", "INSERT 0 1", "COPY 12"
+    try:
+        return int(str(status).split()[-1])
+    except (ValueError, IndexError):
+        return 0
+
+
+def _sql_span(query: str) -> Any:
+    statement = _WHITESPACE.sub(" ", query).strip()
+    return span(
+        f"sql {_caller()}",
+        KIND_CLIENT,
+        **{
+            "db.system": "postgresql",
+            "db.operation": statement.split(" ", 1)[0].upper(),
+            "db.statement": statement[:2000],
+        },
+    )
+
+
+class TracedConnection(asyncpg.Connection):
+    """Adds a span per query while an update is being traced (see services.tracing)."""
+
+    async def execute(self, query: str, *args: Any, **kwargs: Any) -> str:
+        if not tracing_active():
+            return await super().execute(query, *args, **kwargs)
+        with _sql_span(query) as current:
+            status = await super().execute(query, *args, **kwargs)
+            if current is not None:
+                current.set(**{"db.rows": _status_rows(status)})
+            return status
+
+    async def executemany(self, command: str, args: Any, **kwargs: Any) -> None:
+        if not tracing_active():
+            return await super().executemany(command, args, **kwargs)
+        args = list(args)
+        with _sql_span(command) as current:
+            if current is not None:
+                current.set(**{"db.batch_size": len(args)})
+            return await super().executemany(command, args, **kwargs)
+
+    async def fetch(self, query: str, *args: Any, **kwargs: Any) -> list:
+        if not tracing_active():
+            return await super().fetch(query, *args, **kwargs)
+        with _sql_span(query) as current:
+            rows = await super().fetch(query, *args, **kwargs)
+            if current is not None:
+                current.set(**{"db.rows": len(rows)})
+            return rows
+
+    async def fetchrow(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        if not tracing_active():
+            return await super().fetchrow(query, *args, **kwargs)
+        with _sql_span(query) as current:
+            row = await super().fetchrow(query, *args, **kwargs)
+            if current is not None:
+                current.set(**{"db.rows": int(row is not None)})
+            return row
+
+    async def fetchval(self, query: str, *args: Any, **kwargs: Any) -> Any:
+        if not tracing_active():
+            return await super().fetchval(query, *args, **kwargs)
+        with _sql_span(query) as current:
+            value = await super().fetchval(query, *args, **kwargs)
+            if current is not None:
+                current.set(**{"db.rows": int(value is not None)})
+            return value
+
+    async def copy_records_to_table(self, table_name: str, **kwargs: Any) -> str:
+        if not tracing_active():
+            return await super().copy_records_to_table(table_name, **kwargs)
+        with _sql_span(f"COPY {table_name}") as current:
+            status = await super().copy_records_to_table(table_name, **kwargs)
+            if current is not None:
+                current.set(**{"db.rows": _status_rows(status)})
+            return status
+
 
 async def create_pool(database_url: str) -> asyncpg.Pool:
     return await asyncpg.create_pool(
@@ -9,4 +111,5 @@ async def create_pool(database_url: str) -> asyncpg.Pool:
         min_size=1,
         max_size=10,
         command_timeout=60,
+        connection_class=TracedConnection,
     )
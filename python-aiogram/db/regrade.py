@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+import time
+from typing import Callable, Optional
+
+import asyncpg
+
+from db.audit import AuditEvent, write_audit_events
+from db.repository import BotRepository
+from services.answer_parser import compile_answer_key
+
+
+@dataclass
+class RegradeProgress:
+    test_id: str
+    total: int
+    scanned: int = 0
+    score_changed: int = 0
+    details_changed: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+
+# New score per submission in regrade_batch: parsedAnswers (answer per question, ""
+# when not given) compared position by position with regrade_key.
+_SCORED = """
+    SELECT b.id, count(k.answer) FILTER (WHERE a.answer <> '' AND a.answer = k.answer)::int AS score
+    FROM regrade_batch b
+    JOIN "Submission" s ON s.id = b.id
+    LEFT JOIN LATERAL jsonb_array_elements_text(
+      CASE WHEN jsonb_typeof(s."parsedAnswers") = 'array' THEN s."parsedAnswers" ELSE '[]'::jsonb END
+    ) WITH ORDINALITY AS a(answer, "questionNumber") ON true
+    LEFT JOIN regrade_key k ON k."questionNumber" = a."questionNumber"
+    GROUP BY b.id
+"""
+
+
+@dataclass
+class RegradeJob:
+    """Recomputes Submission.score and SubmissionDetail for one test after its key changes.
+
+    Submission ids are streamed through a server-side cursor on one connection while a
+    second connection COPYs each batch into a temp table; scores and details are then
+    recomputed against the key table in set-based UPDATE ... FROM, one transaction per
+    batch.
+    """
+
+    pool: asyncpg.Pool
+    batch_size: int = 2000
+    dry_run: bool = False
+    on_progress: Optional[Callable[[RegradeProgress], None]] = None
+
+    async def run(self, test_id: str) -> RegradeProgress:
+        async with self.pool.acquire() as reader, self.pool.acquire() as writer:
+            test = await reader.fetchrow(
+                'SELECT id, "totalQuestions", "answerKey" FROM "Test" WHERE id = $1',
+                test_id,
+            )
+            if not test:
+                raise ValueError("TEST_NOT_FOUND")
+
+            raw_key = test["answerKey"]
+            key_list = json.loads(raw_key) if isinstance(raw_key, str) else raw_key
+            compiled_key = compile_answer_key(key_list, int(test["totalQuestions"]))
+
+            total = await reader.fetchval('SELECT count(*) FROM "Submission" WHERE "testId" = $1', test_id)
+            progress = RegradeProgress(test_id=test_id, total=int(total or 0))
+
+            await self._prepare_writer(writer, compiled_key)
+
+            batch: list[tuple[str]] = []
+            async with reader.transaction(readonly=True):
+                cursor = reader.cursor(
+                    'SELECT id FROM "Submission" WHERE "testId" = $1',
+                    test_id,
+                    prefetch=self.batch_size,
+                )
+                async for row in cursor:
+                    batch.append((row["id"],))
+                    if len(batch) >= self.batch_size:
+                        await self._flush(writer, batch, progress)
+                        batch = []
+
+            if batch:
+                await self._flush(writer, batch, progress)
+
+            if not self.dry_run and progress.scanned:
+                await write_audit_events(
+                    writer,
+                    [
+                        AuditEvent(
+                            action="UPDATE",
+                            entity="Test",
+                            entity_id=test_id,
+                            payload={
+                                "regrade": True,
+                                "submissions": progress.scanned,
+                                "scoreChanged": progress.score_changed,
+                                "detailsChanged": progress.details_changed,
+                            },
+                        )
+                    ],
+                )
+
+            return progress
+
+    @staticmethod
+    async def _prepare_writer(conn: asyncpg.Connection, compiled_key: tuple[str, ...]) -> None:
+        await conn.execute(
+            """
+            CREATE TEMP TABLE IF NOT EXISTS regrade_key ("questionNumber" int PRIMARY KEY, answer text NOT NULL);
+            TRUNCATE regrade_key;
+            CREATE TEMP TABLE IF NOT EXISTS regrade_batch (id text PRIMARY KEY) ON COMMIT DELETE ROWS;
+            """
+        )
+        await conn.copy_records_to_table(
+            "regrade_key",
+            records=[(idx + 1, answer) for idx, answer in enumerate(compiled_key)],
+            columns=["questionNumber", "answer"],
+        )
+        await conn.execute("ANALYZE regrade_key")
+
+    async def _flush(self, conn: asyncpg.Connection, batch: list[tuple[str]], progress: RegradeProgress) -> None:
+        progress.scanned += len(batch)
+        async with conn.transaction():
+            await conn.copy_records_to_table("regrade_batch", records=batch, columns=["id"])
+            if self.dry_run:
+                progress.score_changed += await conn.fetchval(
+                    f"""
+                    SELECT count(*)
+                    FROM ({_SCORED}) b
+                    JOIN "Submission" s ON s.id = b.id
+                    WHERE s.score <> b.score
+                    """
+                )
+                progress.details_changed += await conn.fetchval(
+                    """
+                    SELECT count(*)
+                    FROM "SubmissionDetail" d
+                    JOIN regrade_batch b ON b.id = d."submissionId"
+                    JOIN regrade_key k ON k."questionNumber" = d."questionNumber"
+                    WHERE d."correctAnswer" IS DISTINCT FROM k.answer
+                       OR d."isCorrect" IS DISTINCT FROM COALESCE(d."givenAnswer" = k.answer, false)
+                    """
+                )
+            else:
+                # The Submission update trigger rebuilds the affected result summaries.
+                result = await conn.execute(
+                    f"""
+                    UPDATE "Submission" s
+                    SET score = b.score
+                    FROM ({_SCORED}) b
+                    WHERE s.id = b.id
+                      AND s.score <> b.score
+                    """
+                )
+                progress.score_changed += BotRepository._rows_affected(result)
+                result = await conn.execute(
+                    """
+                    UPDATE "SubmissionDetail" d
+                    SET "correctAnswer" = k.answer,
+                        "isCorrect" = COALESCE(d."givenAnswer" = k.answer, false)
+                    FROM regrade_batch b, regrade_key k
+                    WHERE d."submissionId" = b.id
+                      AND k."questionNumber" = d."questionNumber"
+                      AND (
+                        d."correctAnswer" IS DISTINCT FROM k.answer
+                        OR d."isCorrect" IS DISTINCT FROM COALESCE(d."givenAnswer" = k.answer, false)
+                      )
+                    """
+                )
+                progress.details_changed += BotRepository._rows_affected(result)
+
+        if self.on_progress:
+            self.on_progress(progress)
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import time
+from typing import Any, AsyncIterator, Hashable, Optional
+
+import asyncpg
+
+from db.invalidation import InvalidationBus, InvalidationEvent
+
+
+# Keys a read can be pinned by; see BotRepository for which reads use which.
+PIN_ACTOR = "actor"  # Telegram user id
+PIN_TEST = "test"  # Test id
+PIN_STUDENT = "student"  # Student (registry) id: payments, debt, journal
+PIN_RESULTS = "results"  # student User id: submissions and their summary
+
+PRIMARY_LSN_SQL = "SELECT pg_current_wal_lsn()"
+# Seconds the replica is behind ``$1`` (the primary's current LSN); 0 when it has replayed
+# that far. A server that is not in recovery is treated as fully caught up.
+REPLICA_LAG_SQL = """
+SELECT CASE
+  WHEN NOT pg_is_in_recovery() THEN 0
+  WHEN pg_last_wal_replay_lsn() >= $1::pg_lsn THEN 0
+  ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 'Infinity')
+END::float8
+"""
+
+
+@dataclass
+class ReplicaStats:
+    checks: int = 0
+    check_errors: int = 0
+    replica_reads: int = 0
+    lag_fallbacks: int = 0
+    down_fallbacks: int = 0
+    pinned_reads: int = 0
+    max_lag: float = 0.0
+
+
+class ReplicaRouter:
+    """Chooses the pool for BotRepository reads: a streaming replica when it is close enough.
+
+    Every ``check_interval`` seconds the replica's replay position is compared with
+    the primary's WAL position. While the lag is above ``max_lag``, the last check
+    failed, or no check has succeeded yet, reads go to the primary.
+
+    Rows the bot itself just wrote, or that an invalidation event reported as
+    changed, are pinned to the primary for ``pin_seconds`` (default ``max_lag`` plus
+    one check interval, the longest the replica can be behind while in use). This
+    keeps a cache from being refilled with the old row from the replica, and a
+    user's next read from missing their own write.
+    """
+
+    def __init__(
+        self,
+        primary: asyncpg.Pool,
+        replica: asyncpg.Pool,
+        max_lag: float = 5.0,
+        check_interval: float = 1.0,
+        pin_seconds: Optional[float] = None,
+    ) -> None:
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.pin_seconds = pin_seconds if pin_seconds is not None else max_lag + check_interval
+        self.stats = ReplicaStats()
+        # None until the first successful check.
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self._pins: dict[tuple[str, Optional[Hashable]], float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def usable(self) -> bool:
+        return self.healthy and self.lag is not None and self.lag <= self.max_lag
+
+    def pin(self, kind: str, key: Optional[Hashable] = None) -> None:
+        """Route reads of ``kind``/``key`` (every key when None) to the primary for a while."""
+        if key is not None:
+            key = str(key)
+        self._pins[(kind, key)] = time.monotonic() + self.pin_seconds
+
+    def pinned(self, kind: str, *keys: Hashable) -> bool:
+        now = time.monotonic()
+        for pin_key in [(kind, None), *((kind, str(key)) for key in keys)]:
+            expires_at = self._pins.get(pin_key)
+            if expires_at is not None:
+                if expires_at > now:
+                    return True
+                del self._pins[pin_key]
+        return False
+
+    def pool_for(self, kind: str, *keys: Hashable) -> asyncpg.Pool:
+        if self.pinned(kind, *keys):
+            self.stats.pinned_reads += 1
+            return self.primary
+        if not self.usable:
+            if self.healthy:
+                self.stats.lag_fallbacks += 1
+            else:
+                self.stats.down_fallbacks += 1
+            return self.primary
+        self.stats.replica_reads += 1
+        return self.replica
+
+    @asynccontextmanager
+    async def acquire(self, kind: str, *keys: Hashable) -> AsyncIterator[asyncpg.Connection]:
+        pool = self.pool_for(kind, *keys)
+        if pool is self.replica:
+            try:
+                conn = await self.replica.acquire()
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, asyncio.TimeoutError) as error:
+                # Down since the last check: mark it and serve this read from the primary.
+                self._mark_down(error)
+                self.stats.replica_reads -= 1
+                self.stats.down_fallbacks += 1
+                pool = self.primary
+            else:
+                try:
+                    yield conn
+                finally:
+                    await self.replica.release(conn)
+                return
+
+        async with pool.acquire() as conn:
+            yield conn
+
+    def attach(self, bus: InvalidationBus) -> None:
+        bus.subscribe("BotActor", self._on_actor)
+        bus.subscribe("Test", lambda event: self.pin(PIN_TEST, event.row_id))
+        bus.subscribe("TestImage", lambda event: self.pin(PIN_TEST, event.get("testId")))
+        bus.subscribe("Payment", lambda event: self.pin(PIN_STUDENT, event.get("studentId")))
+        bus.subscribe("PaymentCheckout", lambda event: self.pin(PIN_STUDENT, event.get("studentId")))
+        bus.subscribe("GroupCatalog", lambda _event: self.pin(PIN_STUDENT))
+
+    def _on_actor(self, event: InvalidationEvent) -> None:
+        self.pin(PIN_ACTOR, event.get("telegramUserId"))
+
+    async def check(self) -> Optional[float]:
+        self.stats.checks += 1
+        try:
+            async with self.primary.acquire() as conn:
+                lsn = await conn.fetchval(PRIMARY_LSN_SQL, timeout=5)
+            async with self.replica.acquire() as conn:
+                lag = await conn.fetchval(REPLICA_LAG_SQL, lsn, timeout=5)
+        except Exception as error:
+            self._mark_down(error)
+            return None
+
+        if not self.healthy:
+            print("REPLICA_UP", f"lag={lag:.3f}s")
+        self.healthy = True
+        self.lag = float(lag)
+        self.stats.max_lag = max(self.stats.max_lag, self.lag)
+        return self.lag
+
+    def _mark_down(self, error: BaseException) -> None:
+        self.stats.check_errors += 1
+        if self.healthy or self.stats.check_errors == 1:
+            print("REPLICA_DOWN", repr(error))
+        self.healthy = False
+
+    async def start(self) -> None:
+        if self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.replica.close()
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+            now = time.monotonic()
+            for pin_key in [pin_key for pin_key, expires_at in self._pins.items() if expires_at <= now]:
+                del self._pins[pin_key]
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "lag": None if self.lag is None else round(self.lag, 3),
+            "maxLag": round(self.stats.max_lag, 3),
+            "checks": self.stats.checks,
+            "checkErrors": self.stats.check_errors,
+            "replicaReads": self.stats.replica_reads,
+            "lagFallbacks": self.stats.lag_fallbacks,
+            "downFallbacks": self.stats.down_fallbacks,
+            "pinnedReads": self.stats.pinned_reads,
+            "pins": len(self._pins),
+        }
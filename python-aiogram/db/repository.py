@@ -1,25 +1,77 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional
 from uuid import uuid4
 
 import asyncpg
 
+from db.audit import AuditEvent, AuditLogWriter, write_audit_events
+from db.replica import PIN_ACTOR, PIN_RESULTS, PIN_STUDENT, PIN_TEST, ReplicaRouter
+from services.answer_parser import compile_answer_key
+from services.cache import BotCaches
+
 
 ELIGIBLE_GROUP_STATUSES = ("REJADA", "OCHIQ", "BOSHLANGAN")
 ELIGIBLE_ENROLLMENT_STATUSES = ("TRIAL", "ACTIVE")
+# Length of StudentResultSummary.recent, see migration 20261019150000_student_result_summary.
+RESULT_SUMMARY_RECENT = 50
 
 
 @dataclass
 class BotRepository:
     pool: asyncpg.Pool
+    # Pooled connections one request may hold at once in gather_reads().
+    fanout_budget: int = 2
+    cache: Optional[BotCaches] = None
+    # When set, routine audit rows are queued after commit instead of inserted in the transaction.
+    audit: Optional[AuditLogWriter] = None
+    # When set, read-only lookups go to a streaming replica while its lag allows. Writes,
+    # the contact-linking lookup and the window/submit paths always use ``pool``.
+    replica: Optional[ReplicaRouter] = None
 
     async def close(self) -> None:
         await self.pool.close()
 
+    def _read(self, kind: str, *keys: Any) -> Any:
+        """Connection context for a replica-safe read of rows pinned by ``kind``/``keys``."""
+        if self.replica is None:
+            return self.pool.acquire()
+        return self.replica.acquire(kind, *keys)
+
+    def _pin(self, kind: str, key: Any) -> None:
+        # The replica may not have our own write yet; read it back from the primary.
+        if self.replica is not None:
+            self.replica.pin(kind, key)
+
+    async def gather_reads(self, *calls: Callable[[], Awaitable[Any]], budget: Optional[int] = None) -> list[Any]:
+        """Run independent read methods concurrently, each on its own pooled connection.
+
+        At most ``budget`` (default ``fanout_budget``) calls run at the same time so one
+        request cannot take the whole pool. If any call fails the rest are cancelled.
+        """
+        limit = max(1, min(budget or self.fanout_budget, len(calls)))
+        if limit == 1:
+            return [await call() for call in calls]
+
+        semaphore = asyncio.Semaphore(limit)
+
+        async def run(call: Callable[[], Awaitable[Any]]) -> Any:
+            async with semaphore:
+                return await call()
+
+        tasks = [asyncio.ensure_future(run(call)) for call in calls]
+        try:
+            return list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
     @staticmethod
     def _new_id() -> str:
         return uuid4().hex
@@ -38,229 +90,263 @@ class BotRepository:
             return json.loads(value)
         return value
 
-    async def find_eligible_student_by_phone(self, variants: list[str]) -> Optional[dict]:
-        if not variants:
+    async def find_eligible_student_by_phone(self, phone: str) -> Optional[dict]:
+        if not phone:
             return None
 
+        # A student match by own phone wins over a parent match; both branches in one round trip.
         sql = """
-        SELECT s.id, s."studentCode", s."userId", s."fullName", s.phone, s."parentPhone", s.status
-        FROM "Student" s
-        WHERE s.status = 'ACTIVE'
-          AND s.phone = ANY($1::text[])
-          AND EXISTS (
-              SELECT 1
-              FROM "Enrollment" e
-              JOIN "GroupCatalog" g ON g.id = e."groupId"
-              WHERE e."studentId" = s.id
-                AND e.status = ANY($2::"EnrollmentStatus"[])
-                AND g.status = ANY($3::"GroupCatalogStatus"[])
-          )
+        SELECT m.person_type, m.id, m."studentCode", m."userId", m."fullName", m.phone, m."parentPhone", m.status
+        FROM (
+          SELECT 'STUDENT' AS person_type, 0 AS rank, s.*
+          FROM "Student" s
+          WHERE s.status = 'ACTIVE'
+            AND s.phone = $1
+          UNION ALL
+          SELECT 'PARENT' AS person_type, 1 AS rank, s.*
+          FROM "Student" s
+          WHERE s.status = 'ACTIVE'
+            AND s."parentPhone" = $1
+        ) m
+        WHERE EXISTS (
+            SELECT 1
+            FROM "Enrollment" e
+            JOIN "GroupCatalog" g ON g.id = e."groupId"
+            WHERE e."studentId" = m.id
+              AND e.status = ANY($2::"EnrollmentStatus"[])
+              AND g.status = ANY($3::"GroupCatalogStatus"[])
+        )
+        ORDER BY m.rank ASC, m."createdAt" DESC
         LIMIT 1
         """
 
         async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(sql, variants, list(ELIGIBLE_ENROLLMENT_STATUSES), list(ELIGIBLE_GROUP_STATUSES))
-            if row:
-                return {"personType": "STUDENT", "student": dict(row)}
+            row = await conn.fetchrow(sql, phone, list(ELIGIBLE_ENROLLMENT_STATUSES), list(ELIGIBLE_GROUP_STATUSES))
 
-            row = await conn.fetchrow(
-                """
-                SELECT s.id, s."studentCode", s."userId", s."fullName", s.phone, s."parentPhone", s.status
-                FROM "Student" s
-                WHERE s.status = 'ACTIVE'
-                  AND s."parentPhone" = ANY($1::text[])
-                  AND EXISTS (
-                      SELECT 1
-                      FROM "Enrollment" e
-                      JOIN "GroupCatalog" g ON g.id = e."groupId"
-                      WHERE e."studentId" = s.id
-                        AND e.status = ANY($2::"EnrollmentStatus"[])
-                        AND g.status = ANY($3::"GroupCatalogStatus"[])
-                  )
-                ORDER BY s."createdAt" DESC
-                LIMIT 1
-                """,
-                variants,
-                list(ELIGIBLE_ENROLLMENT_STATUSES),
-                list(ELIGIBLE_GROUP_STATUSES),
-            )
+        if not row:
+            return None
 
-            if row:
-                return {"personType": "PARENT", "student": dict(row)}
+        student = dict(row)
+        person_type = student.pop("person_type")
+        return {"personType": person_type, "student": student}
 
-        return None
+    async def link_student_for_bot(self, student: dict, phone: str, telegram_user_id: int) -> str:
+        """Upserts the STUDENT user, links Student.userId and the Telegram id in one statement.
 
-    async def ensure_student_user_for_bot(self, student: dict, phone_variants: list[str]) -> str:
+        Raises ValueError("PHONE_USED_BY_OTHER_ROLE") when the matching user is not a student.
+        """
         async with self.pool.acquire() as conn:
-            async with conn.transaction():
-                existing_user = None
-                if student.get("userId"):
-                    existing_user = await conn.fetchrow(
-                        'SELECT id, role FROM "User" WHERE id = $1',
-                        student["userId"],
-                    )
-                if not existing_user:
-                    existing_user = await conn.fetchrow(
-                        'SELECT id, role FROM "User" WHERE phone = ANY($1::text[]) ORDER BY "createdAt" DESC LIMIT 1',
-                        phone_variants,
-                    )
-
-                if existing_user and existing_user["role"] != "STUDENT":
-                    raise ValueError("PHONE_USED_BY_OTHER_ROLE")
-
-                active = student.get("status") == "ACTIVE"
-                if existing_user:
-                    user_id = existing_user["id"]
-                    await conn.execute(
-                        'UPDATE "User" SET role = $2, phone = $3, "isActive" = $4 WHERE id = $1',
-                        user_id,
-                        "STUDENT",
-                        student["phone"],
-                        active,
-                    )
-                else:
-                    user_id = self._new_id()
-                    await conn.execute(
-                        'INSERT INTO "User" (id, role, phone, "isActive") VALUES ($1, $2, $3, $4)',
-                        user_id,
-                        "STUDENT",
-                        student["phone"],
-                        active,
-                    )
-
-                if student.get("userId") != user_id:
-                    await conn.execute(
-                        'UPDATE "Student" SET "userId" = $2 WHERE id = $1',
-                        student["id"],
-                        user_id,
-                    )
+            row = await conn.fetchrow(
+                """
+                WITH existing AS (
+                  SELECT id, role
+                  FROM "User"
+                  WHERE id = $5 OR phone = $2
+                  ORDER BY (id = $5) DESC NULLS LAST, "createdAt" DESC
+                  LIMIT 1
+                ),
+                updated AS (
+                  UPDATE "User" u
+                  SET phone = $2, "isActive" = true, "telegramUserId" = $3
+                  FROM existing x
+                  WHERE u.id = x.id
+                    AND x.role = 'STUDENT'
+                  RETURNING u.id
+                ),
+                inserted AS (
+                  INSERT INTO "User" (id, role, phone, "isActive", "telegramUserId")
+                  SELECT $1, 'STUDENT', $2, true, $3
+                  WHERE NOT EXISTS (SELECT 1 FROM existing)
+                  ON CONFLICT (phone) DO UPDATE
+                    SET "isActive" = true, "telegramUserId" = EXCLUDED."telegramUserId"
+                    WHERE "User".role = 'STUDENT'
+                  RETURNING id
+                ),
+                chosen AS (
+                  SELECT id FROM updated
+                  UNION ALL
+                  SELECT id FROM inserted
+                ),
+                linked AS (
+                  UPDATE "Student" s
+                  SET "userId" = c.id
+                  FROM chosen c
+                  WHERE s.id = $4
+                    AND s."userId" IS DISTINCT FROM c.id
+                  RETURNING s.id
+                )
+                SELECT (SELECT id FROM chosen LIMIT 1) AS user_id
+                """,
+                self._new_id(),
+                phone,
+                str(telegram_user_id),
+                student["id"],
+                student.get("userId"),
+            )
 
-                return user_id
+        user_id = row["user_id"] if row else None
+        if not user_id:
+            raise ValueError("PHONE_USED_BY_OTHER_ROLE")
+        self._pin(PIN_ACTOR, telegram_user_id)
+        return user_id
 
-    async def link_user_telegram(self, user_id: str, telegram_user_id: int) -> None:
+    async def upsert_parent_contact(self, phone: str, telegram_user_id: int) -> None:
         async with self.pool.acquire() as conn:
             await conn.execute(
-                'UPDATE "User" SET "telegramUserId" = $2, "isActive" = true WHERE id = $1',
-                user_id,
+                """
+                WITH moved AS (
+                  UPDATE "ParentContact"
+                  SET phone = $2, "updatedAt" = now()
+                  WHERE "telegramUserId" = $3
+                    AND NOT EXISTS (SELECT 1 FROM "ParentContact" WHERE phone = $2)
+                  RETURNING id
+                )
+                INSERT INTO "ParentContact" (id, phone, "telegramUserId", "updatedAt")
+                SELECT $1, $2, $3, now()
+                WHERE NOT EXISTS (SELECT 1 FROM moved)
+                ON CONFLICT (phone) DO UPDATE
+                  SET "telegramUserId" = EXCLUDED."telegramUserId", "updatedAt" = now()
+                """,
+                self._new_id(),
+                phone,
                 str(telegram_user_id),
             )
+        self._pin(PIN_ACTOR, telegram_user_id)
 
-    async def upsert_parent_contact(self, phone: str, telegram_user_id: int) -> None:
-        tg = str(telegram_user_id)
-        async with self.pool.acquire() as conn:
-            async with conn.transaction():
-                by_phone = await conn.fetchrow('SELECT id FROM "ParentContact" WHERE phone = $1', phone)
-                if by_phone:
-                    await conn.execute(
-                        'UPDATE "ParentContact" SET "telegramUserId" = $2, "updatedAt" = now() WHERE id = $1',
-                        by_phone["id"],
-                        tg,
-                    )
-                    return
-
-                by_tg = await conn.fetchrow('SELECT id FROM "ParentContact" WHERE "telegramUserId" = $1', tg)
-                if by_tg:
-                    await conn.execute(
-                        'UPDATE "ParentContact" SET phone = $2, "updatedAt" = now() WHERE id = $1',
-                        by_tg["id"],
-                        phone,
-                    )
-                    return
+    @classmethod
+    def _actor_from_row(cls, row: asyncpg.Record) -> dict:
+        if row["type"] == "STUDENT":
+            return {
+                "type": "STUDENT",
+                "userId": row["userId"],
+                "student": {
+                    "id": row["studentId"],
+                    "studentCode": row["studentCode"],
+                    "fullName": row["fullName"],
+                    "phone": row["phone"],
+                    "parentPhone": row["parentPhone"],
+                },
+            }
 
-                await conn.execute(
-                    'INSERT INTO "ParentContact" (id, phone, "telegramUserId", "updatedAt") VALUES ($1, $2, $3, now())',
-                    self._new_id(),
-                    phone,
-                    tg,
-                )
+        # "student" stays the most recently registered child for single-child views.
+        children = cls._json_load(row["children"]) or []
+        return {"type": "PARENT", "student": children[0], "children": children}
 
     async def resolve_actor_by_telegram_user_id(self, telegram_user_id: int) -> Optional[dict]:
-        tg = str(telegram_user_id)
-        async with self.pool.acquire() as conn:
+        generation = 0
+        if self.cache is not None:
+            cached = self.cache.actors.get(telegram_user_id)
+            if cached is not None:
+                return cached
+            generation = self.cache.actors.generation
+
+        # "BotActor" is maintained by triggers (see migration 20261019100000_bot_actor).
+        async with self._read(PIN_ACTOR, telegram_user_id) as conn:
             row = await conn.fetchrow(
                 """
-                SELECT u.id AS user_id, s.id AS student_id, s."studentCode", s."fullName", s.phone, s."parentPhone"
-                FROM "User" u
-                JOIN "Student" s ON s."userId" = u.id
-                WHERE u."telegramUserId" = $1
-                  AND u.role = 'STUDENT'
-                  AND u."isActive" = true
-                  AND s.status = 'ACTIVE'
-                  AND EXISTS (
-                    SELECT 1
-                    FROM "Enrollment" e
-                    JOIN "GroupCatalog" g ON g.id = e."groupId"
-                    WHERE e."studentId" = s.id
-                      AND e.status = ANY($2::"EnrollmentStatus"[])
-                      AND g.status = ANY($3::"GroupCatalogStatus"[])
-                  )
-                LIMIT 1
+                SELECT "type", "userId", "studentId", "studentCode", "fullName", phone, "parentPhone", children
+                FROM "BotActor"
+                WHERE "telegramUserId" = $1
+                  AND "isEligible" = true
                 """,
-                tg,
-                list(ELIGIBLE_ENROLLMENT_STATUSES),
-                list(ELIGIBLE_GROUP_STATUSES),
-            )
-            if row:
-                return {
-                    "type": "STUDENT",
-                    "userId": row["user_id"],
-                    "student": {
-                        "id": row["student_id"],
-                        "studentCode": row["studentCode"],
-                        "fullName": row["fullName"],
-                        "phone": row["phone"],
-                        "parentPhone": row["parentPhone"],
-                    },
-                }
-
-            parent = await conn.fetchrow(
-                'SELECT phone FROM "ParentContact" WHERE "telegramUserId" = $1',
-                tg,
+                str(telegram_user_id),
             )
-            if not parent:
-                return None
 
-            phone = parent["phone"]
-            variants = [phone, phone.lstrip("+")] if phone else []
-            if not variants:
-                return None
+        if not row:
+            return None
+
+        actor = self._actor_from_row(row)
+        if self.cache is not None:
+            self.cache.actors.put(telegram_user_id, actor, generation=generation)
+        return actor
+
+    async def warm_actors(self, telegram_user_ids: list[int]) -> int:
+        """Load eligible actors into the cache in one query; returns how many are cached."""
+        if self.cache is None or not telegram_user_ids:
+            return 0
+
+        missing = [str(tg) for tg in telegram_user_ids if tg not in self.cache.actors]
+        if missing:
+            generation = self.cache.actors.generation
+            async with self._read(PIN_ACTOR, *missing) as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT "telegramUserId", "type", "userId", "studentId", "studentCode", "fullName", phone, "parentPhone", children
+                    FROM "BotActor"
+                    WHERE "telegramUserId" = ANY($1::text[])
+                      AND "isEligible" = true
+                    """,
+                    missing,
+                )
+            for row in rows:
+                self.cache.actors.put(int(row["telegramUserId"]), self._actor_from_row(row), generation=generation)
+
+        return sum(1 for tg in telegram_user_ids if tg in self.cache.actors)
+
+    async def get_test(self, test_id: str, primary: bool = False) -> Optional[dict]:
+        """Test with its answer key and images; ``primary`` skips the replica on a cache miss."""
+        generation = 0
+        if self.cache is not None:
+            cached = self.cache.tests.get(test_id)
+            if cached is not None:
+                return cached
+            generation = self.cache.tests.generation
 
+        async with self.pool.acquire() if primary else self._read(PIN_TEST, test_id) as conn:
             row = await conn.fetchrow(
                 """
-                SELECT s.id AS student_id, s."studentCode", s."userId", s."fullName", s.phone, s."parentPhone"
-                FROM "Student" s
-                WHERE s.status = 'ACTIVE'
-                  AND s."parentPhone" = ANY($1::text[])
-                  AND EXISTS (
-                    SELECT 1
-                    FROM "Enrollment" e
-                    JOIN "GroupCatalog" g ON g.id = e."groupId"
-                    WHERE e."studentId" = s.id
-                      AND e.status = ANY($2::"EnrollmentStatus"[])
-                      AND g.status = ANY($3::"GroupCatalogStatus"[])
-                  )
-                ORDER BY s."createdAt" DESC
-                LIMIT 1
+                SELECT
+                  t.id,
+                  t."totalQuestions",
+                  t."answerKey",
+                  t."telegramGroupLink",
+                  l.id AS lesson_id,
+                  l."lessonNumber",
+                  l.title AS lesson_title,
+                  b.id AS book_id,
+                  b.title AS book_title,
+                  COALESCE(
+                    (
+                      SELECT json_agg(
+                        json_build_object('imageUrl', ti."imageUrl", 'pageNumber', ti."pageNumber")
+                        ORDER BY ti."pageNumber" ASC
+                      )
+                      FROM "TestImage" ti
+                      WHERE ti."testId" = t.id
+                    ),
+                    '[]'
+                  ) AS images
+                FROM "Test" t
+                JOIN "Lesson" l ON l.id = t."lessonId"
+                JOIN "Book" b ON b.id = l."bookId"
+                WHERE t.id = $1
                 """,
-                variants,
-                list(ELIGIBLE_ENROLLMENT_STATUSES),
-                list(ELIGIBLE_GROUP_STATUSES),
+                test_id,
             )
+        if not row:
+            return None
 
-            if not row:
-                return None
-
-            return {
-                "type": "PARENT",
-                "student": {
-                    "id": row["student_id"],
-                    "studentCode": row["studentCode"],
-                    "userId": row["userId"],
-                    "fullName": row["fullName"],
-                    "phone": row["phone"],
-                    "parentPhone": row["parentPhone"],
+        answer_key = self._json_load(row["answerKey"])
+        test = {
+            "id": row["id"],
+            "totalQuestions": row["totalQuestions"],
+            "answerKey": answer_key,
+            "compiledKey": compile_answer_key(answer_key, int(row["totalQuestions"])),
+            "telegramGroupLink": row["telegramGroupLink"],
+            "lesson": {
+                "id": row["lesson_id"],
+                "lessonNumber": row["lessonNumber"],
+                "title": row["lesson_title"],
+                "book": {
+                    "id": row["book_id"],
+                    "title": row["book_title"],
                 },
-            }
+            },
+            "images": self._json_load(row["images"]),
+        }
+        if self.cache is not None:
+            self.cache.tests.put(test_id, test, generation=generation)
+        return test
 
     async def get_active_window(self, student_user_id: str) -> Optional[dict]:
         now = datetime.utcnow()
@@ -275,19 +361,9 @@ class BotRepository:
                   aw."openTo",
                   aw."openedAt",
                   aw."submittedAt",
-                  aw."isActive",
-                  t."totalQuestions",
-                  t."answerKey",
-                  t."telegramGroupLink",
-                  l.id AS lesson_id,
-                  l."lessonNumber",
-                  l.title AS lesson_title,
-                  b.id AS book_id,
-                  b.title AS book_title
+                  aw."isActive"
                 FROM "AccessWindow" aw
                 JOIN "Test" t ON t.id = aw."testId"
-                JOIN "Lesson" l ON l.id = t."lessonId"
-                JOIN "Book" b ON b.id = l."bookId"
                 WHERE aw."studentId" = $1
                   AND aw."isActive" = true
                   AND aw."openFrom" <= $2
@@ -299,46 +375,46 @@ class BotRepository:
                 student_user_id,
                 now,
             )
-            if not row:
-                return None
+        if not row:
+            return None
 
-            images = await conn.fetch(
-                'SELECT "imageUrl", "pageNumber" FROM "TestImage" WHERE "testId" = $1 ORDER BY "pageNumber" ASC',
-                row["testId"],
-            )
+        # Test content (key, lesson, images) comes from the test cache when warm.
+        test = await self.get_test(row["testId"])
+        if not test:
+            return None
 
-            return {
-                "id": row["id"],
-                "studentId": row["studentId"],
-                "testId": row["testId"],
-                "openFrom": row["openFrom"],
-                "openTo": row["openTo"],
-                "openedAt": row["openedAt"],
-                "submittedAt": row["submittedAt"],
-                "isActive": row["isActive"],
-                "test": {
-                    "id": row["testId"],
-                    "totalQuestions": row["totalQuestions"],
-                    "answerKey": self._json_load(row["answerKey"]),
-                    "telegramGroupLink": row["telegramGroupLink"],
-                    "lesson": {
-                        "id": row["lesson_id"],
-                        "lessonNumber": row["lessonNumber"],
-                        "title": row["lesson_title"],
-                        "book": {
-                            "id": row["book_id"],
-                            "title": row["book_title"],
-                        },
-                    },
-                    "images": [
-                        {
-                            "imageUrl": item["imageUrl"],
-                            "pageNumber": item["pageNumber"],
-                        }
-                        for item in images
-                    ],
-                },
-            }
+        return {
+            "id": row["id"],
+            "studentId": row["studentId"],
+            "testId": row["testId"],
+            "openFrom": row["openFrom"],
+            "openTo": row["openTo"],
+            "openedAt": row["openedAt"],
+            "submittedAt": row["submittedAt"],
+            "isActive": row["isActive"],
+            "test": test,
+        }
+
+    async def get_upcoming_window_targets(self, start: datetime, end: datetime) -> list[dict]:
+        # Warm-up runs minutes ahead of openFrom, so replica lag does not matter here.
+        async with self._read(PIN_TEST) as conn:
+            rows = await conn.fetch(
+                """
+                SELECT aw."testId", aw."openFrom", u."telegramUserId"
+                FROM "AccessWindow" aw
+                JOIN "Test" t ON t.id = aw."testId"
+                JOIN "User" u ON u.id = aw."studentId"
+                WHERE aw."isActive" = true
+                  AND aw."openFrom" >= $1
+                  AND aw."openFrom" < $2
+                  AND aw."submittedAt" IS NULL
+                  AND t."isActive" = true
+                ORDER BY aw."openFrom" ASC
+                """,
+                start,
+                end,
+            )
+            return [dict(row) for row in rows]
 
     async def mark_window_opened_once(self, window_id: str, now: datetime) -> bool:
         async with self.pool.acquire() as conn:
@@ -364,6 +440,103 @@ class BotRepository:
                 window_id,
             )
 
+    async def get_window_events(
+        self,
+        start: datetime,
+        end: datetime,
+        close_lead: timedelta,
+        window_ids: Optional[list[str]] = None,
+    ) -> list[dict]:
+        """Reminder events due in (start, end] for students linked to Telegram.
+
+        OPEN is due at openFrom, CLOSING at openTo - close_lead (skipped when that
+        falls before openFrom). ``window_ids`` restricts the scan to those windows.
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT aw.id AS "windowId", 'OPEN' AS kind, aw."openFrom" AS "dueAt"
+                FROM "AccessWindow" aw
+                JOIN "User" u ON u.id = aw."studentId"
+                WHERE aw."isActive" = true
+                  AND aw."openFrom" > $1
+                  AND aw."openFrom" <= $2
+                  AND aw."submittedAt" IS NULL
+                  AND u."telegramUserId" IS NOT NULL
+                  AND ($4::text[] IS NULL OR aw.id = ANY($4::text[]))
+                UNION ALL
+                SELECT aw.id, 'CLOSING', aw."openTo" - $3::interval
+                FROM "AccessWindow" aw
+                JOIN "User" u ON u.id = aw."studentId"
+                WHERE aw."isActive" = true
+                  AND aw."openTo" > $1 + $3::interval
+                  AND aw."openTo" <= $2 + $3::interval
+                  AND aw."openTo" - $3::interval > aw."openFrom"
+                  AND aw."submittedAt" IS NULL
+                  AND u."telegramUserId" IS NOT NULL
+                  AND ($4::text[] IS NULL OR aw.id = ANY($4::text[]))
+                """,
+                start,
+                end,
+                close_lead,
+                window_ids,
+            )
+            return [dict(row) for row in rows]
+
+    async def claim_window_reminders(
+        self,
+        events: list[tuple[str, str]],
+        now: datetime,
+        close_lead: timedelta,
+    ) -> list[dict]:
+        """Record (windowId, kind) reminders that are still valid and not yet sent.
+
+        Returns only the newly claimed ones with what the message needs; anything sent
+        before (even by a previous process) or no longer applicable is dropped.
+        """
+        if not events:
+            return []
+
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                WITH due AS (
+                  SELECT *
+                  FROM unnest($1::text[], $2::text[]) AS d("windowId", kind)
+                ),
+                claimed AS (
+                  INSERT INTO "WindowReminder" ("windowId", kind, "sentAt")
+                  SELECT d."windowId", d.kind, $3
+                  FROM due d
+                  JOIN "AccessWindow" aw ON aw.id = d."windowId"
+                  JOIN "Test" t ON t.id = aw."testId"
+                  WHERE aw."isActive" = true
+                    AND t."isActive" = true
+                    AND aw."submittedAt" IS NULL
+                    AND aw."openTo" > $3
+                    AND (
+                      (d.kind = 'OPEN' AND aw."openFrom" <= $3 AND aw."openedAt" IS NULL)
+                      OR (d.kind = 'CLOSING' AND aw."openTo" - $4::interval <= $3)
+                    )
+                  ON CONFLICT ("windowId", kind) DO NOTHING
+                  RETURNING "windowId", kind
+                )
+                SELECT c."windowId", c.kind, u."telegramUserId", aw."openTo", l."lessonNumber", b.title AS book_title
+                FROM claimed c
+                JOIN "AccessWindow" aw ON aw.id = c."windowId"
+                JOIN "User" u ON u.id = aw."studentId"
+                JOIN "Test" t ON t.id = aw."testId"
+                JOIN "Lesson" l ON l.id = t."lessonId"
+                JOIN "Book" b ON b.id = l."bookId"
+                WHERE u."telegramUserId" IS NOT NULL
+                """,
+                [window_id for window_id, _kind in events],
+                [kind for _window_id, kind in events],
+                now,
+                close_lead,
+            )
+            return [dict(row) for row in rows]
+
     async def get_active_window_for_submit(
         self,
         window_id: str,
@@ -374,9 +547,8 @@ class BotRepository:
         async with self.pool.acquire() as conn:
             row = await conn.fetchrow(
                 """
-                SELECT aw.id, aw."testId", t."totalQuestions", t."answerKey"
+                SELECT aw.id, aw."testId"
                 FROM "AccessWindow" aw
-                JOIN "Test" t ON t.id = aw."testId"
                 WHERE aw.id = $1
                   AND aw."studentId" = $2
                   AND aw."testId" = $3
@@ -391,17 +563,15 @@ class BotRepository:
                 test_id,
                 now,
             )
-            if not row:
-                return None
+        if not row:
+            return None
 
-            return {
-                "id": row["id"],
-                "test": {
-                    "id": row["testId"],
-                    "totalQuestions": row["totalQuestions"],
-                    "answerKey": self._json_load(row["answerKey"]),
-                },
-            }
+        # Scored against this key: a replica may still have the one an admin just corrected.
+        test = await self.get_test(row["testId"], primary=True)
+        if not test:
+            return None
+
+        return {"id": row["id"], "test": test}
 
     async def lock_window_for_submission(
         self,
@@ -437,7 +607,7 @@ class BotRepository:
         raw_answer_text: str,
         parsed_answers: list[str],
         score: int,
-        details: list[dict],
+        details: list[tuple[int, Optional[str], str, bool]],
     ) -> str:
         submission_id = self._new_id()
         async with self.pool.acquire() as conn:
@@ -455,17 +625,7 @@ class BotRepository:
                     score,
                 )
 
-                rows = [
-                    (
-                        self._new_id(),
-                        submission_id,
-                        d["questionNumber"],
-                        d["givenAnswer"],
-                        d["correctAnswer"],
-                        d["isCorrect"],
-                    )
-                    for d in details
-                ]
+                rows = [(self._new_id(), submission_id, *detail) for detail in details]
                 await conn.executemany(
                     """
                     INSERT INTO "SubmissionDetail"
@@ -475,17 +635,95 @@ class BotRepository:
                     rows,
                 )
 
+                audit = AuditEvent(action="SUBMIT", entity="Submission", entity_id=submission_id, actor_id=student_user_id)
+                if self.audit is None:
+                    await write_audit_events(conn, [audit])
+
+        self._pin(PIN_RESULTS, student_user_id)
+        if self.audit is not None:
+            await self.audit.record(audit)
+        return submission_id
+
+    async def commit_submission_batch(self, entries: list[dict]) -> list[str]:
+        """Write journaled submissions in one transaction; returns the window ids written.
+
+        Each entry locks its window exactly like lock_window_for_submission, so entries
+        whose window was already submitted (e.g. replayed after a crash) are skipped.
+        """
+        if not entries:
+            return []
+
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                locked = await conn.fetch(
+                    """
+                    UPDATE "AccessWindow" aw
+                    SET "submittedAt" = b."submittedAt",
+                        "isActive" = false,
+                        "openTo" = b."submittedAt"
+                    FROM unnest($1::text[], $2::text[], $3::text[], $4::timestamp[]) AS b(id, "studentId", "testId", "submittedAt")
+                    WHERE aw.id = b.id
+                      AND aw."studentId" = b."studentId"
+                      AND aw."testId" = b."testId"
+                      AND aw."isActive" = true
+                      AND aw."submittedAt" IS NULL
+                    RETURNING aw.id
+                    """,
+                    [entry["windowId"] for entry in entries],
+                    [entry["studentUserId"] for entry in entries],
+                    [entry["testId"] for entry in entries],
+                    [entry["submittedAt"] for entry in entries],
+                )
+                locked_ids = {row["id"] for row in locked}
+                written = [entry for entry in entries if entry["windowId"] in locked_ids]
+                if not written:
+                    return []
+
+                # One statement, so the summary trigger folds the whole batch in at once.
                 await conn.execute(
                     """
-                    INSERT INTO "AuditLog" (id, "actorId", action, entity, "entityId")
-                    VALUES ($1, $2, 'SUBMIT', 'Submission', $3)
+                    INSERT INTO "Submission" (id, "studentId", "testId", "rawAnswerText", "parsedAnswers", score, "createdAt")
+                    SELECT b.id, b."studentId", b."testId", b."rawAnswerText", b."parsedAnswers"::jsonb, b.score, b."createdAt"
+                    FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::int[], $7::timestamp[])
+                      AS b(id, "studentId", "testId", "rawAnswerText", "parsedAnswers", score, "createdAt")
                     """,
-                    self._new_id(),
-                    student_user_id,
-                    submission_id,
+                    [entry["submissionId"] for entry in written],
+                    [entry["studentUserId"] for entry in written],
+                    [entry["testId"] for entry in written],
+                    [entry["rawAnswerText"] for entry in written],
+                    [json.dumps(entry["parsedAnswers"]) for entry in written],
+                    [entry["score"] for entry in written],
+                    [entry["submittedAt"] for entry in written],
+                )
+                await conn.copy_records_to_table(
+                    "SubmissionDetail",
+                    records=[
+                        (self._new_id(), entry["submissionId"], *detail)
+                        for entry in written
+                        for detail in entry["details"]
+                    ],
+                    columns=["id", "submissionId", "questionNumber", "givenAnswer", "correctAnswer", "isCorrect"],
                 )
 
-        return submission_id
+                audits = [
+                    AuditEvent(
+                        action="SUBMIT",
+                        entity="Submission",
+                        entity_id=entry["submissionId"],
+                        actor_id=entry["studentUserId"],
+                        created_at=entry["submittedAt"],
+                    )
+                    for entry in written
+                ]
+                if self.audit is None:
+                    await write_audit_events(conn, audits)
+
+        for entry in written:
+            self._pin(PIN_RESULTS, entry["studentUserId"])
+        if self.audit is not None:
+            for audit in audits:
+                await self.audit.record(audit)
+        return [entry["windowId"] for entry in written]
 
     async def create_appeal(
         self,
@@ -513,29 +751,31 @@ class BotRepository:
             )
         return appeal_id
 
-    async def get_student_monthly_submissions(self, student_user_id: str, start: datetime, end: datetime) -> list[dict]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
+    async def get_student_result_summary(self, student_user_id: str) -> Optional[dict]:
+        """One row from "StudentResultSummary"; ``recent`` is newest first, at most RESULT_SUMMARY_RECENT."""
+        async with self._read(PIN_RESULTS, student_user_id) as conn:
+            row = await conn.fetchrow(
                 """
-                SELECT s.id, s.score, s."createdAt", t."totalQuestions", l."lessonNumber", l.title AS lesson_title, b.title AS book_title
-                FROM "Submission" s
-                JOIN "Test" t ON t.id = s."testId"
-                JOIN "Lesson" l ON l.id = t."lessonId"
-                JOIN "Book" b ON b.id = l."bookId"
-                WHERE s."studentId" = $1
-                  AND s."createdAt" >= $2
-                  AND s."createdAt" < $3
-                ORDER BY s."createdAt" DESC
-                LIMIT 50
+                SELECT "submissionCount", monthly, recent
+                FROM "StudentResultSummary"
+                WHERE "studentId" = $1
                 """,
                 student_user_id,
-                start,
-                end,
             )
-            return [dict(row) for row in rows]
+        if not row:
+            return None
+
+        recent = []
+        for item in self._json_load(row["recent"]) or []:
+            recent.append({**item, "createdAt": datetime.fromisoformat(item["createdAt"])})
+        return {
+            "submissionCount": int(row["submissionCount"]),
+            "monthly": self._json_load(row["monthly"]) or {},
+            "recent": recent,
+        }
 
     async def get_student_payments(self, student_registry_id: str) -> list[dict]:
-        async with self.pool.acquire() as conn:
+        async with self._read(PIN_STUDENT, student_registry_id) as conn:
             rows = await conn.fetch(
                 """
                 SELECT
@@ -555,13 +795,43 @@ class BotRepository:
                 LEFT JOIN "GroupCatalog" g ON g.id = p."groupId"
                 WHERE p."studentId" = $1
                   AND p."isDeleted" = false
-                ORDER BY p.month DESC, p."paidAt" DESC
-                LIMIT 500
                 """,
                 student_registry_id,
             )
             return [dict(row) for row in rows]
 
+    async def get_student_payment_page(
+        self,
+        student_registry_id: str,
+        cursor: Optional[tuple[datetime, str]] = None,
+        older: bool = True,
+        limit: int = 10,
+    ) -> list[dict]:
+        where, order = self._keyset("p", "createdAt", cursor, older)
+        async with self._read(PIN_STUDENT, student_registry_id) as conn:
+            rows = await conn.fetch(
+                f"""
+                SELECT
+                  p.id,
+                  p."createdAt",
+                  p.month,
+                  p."amountRequired",
+                  p."amountPaid",
+                  p.discount,
+                  g.code AS group_code
+                FROM "Payment" p
+                LEFT JOIN "GroupCatalog" g ON g.id = p."groupId"
+                WHERE p."studentId" = $1
+                  AND p."isDeleted" = false
+                  AND {where}
+                ORDER BY {order}
+                LIMIT {int(limit)}
+                """,
+                student_registry_id,
+                *(cursor or ()),
+            )
+            return [dict(row) for row in rows]
+
     async def create_payment_checkout(
         self,
         *,
@@ -571,18 +841,53 @@ class BotRepository:
         amount: int,
         group_id: str | None,
         note: str | None,
+        reuse_since: Optional[datetime] = None,
+        telegram_chat_id: Optional[int] = None,
     ) -> dict:
+        """Insert a PENDING checkout, or return the newest PENDING one created at or after
+        ``reuse_since`` for the same student, group scope, provider and amount.
+
+        Lookup and insert are one statement over the [studentId, status, createdAt] index;
+        the result carries ``reused``. A reused checkout takes the new ``telegram_chat_id``
+        so the confirmation goes to the chat that asked last. Two taps racing each other can still both insert;
+        the extra row simply expires.
+        """
         checkout_id = self._new_id()
         callback_token = uuid4().hex
 
         async with self.pool.acquire() as conn:
             row = await conn.fetchrow(
                 """
-                INSERT INTO "PaymentCheckout"
-                  (id, "studentId", "groupId", provider, amount, status, "studentCode", "callbackToken", note)
-                VALUES
-                  ($1, $2, $3, $4::"PaymentProvider", $5, 'PENDING'::"PaymentCheckoutStatus", $6, $7, $8)
-                RETURNING id, "studentId", "groupId", provider, amount, status, "studentCode", "callbackToken", "createdAt"
+                WITH existing AS (
+                  UPDATE "PaymentCheckout"
+                  SET "telegramChatId" = COALESCE($10, "telegramChatId"), "updatedAt" = now()
+                  WHERE id = (
+                      SELECT id
+                      FROM "PaymentCheckout"
+                      WHERE $9::timestamp IS NOT NULL
+                        AND "studentId" = $2
+                        AND status = 'PENDING'::"PaymentCheckoutStatus"
+                        AND "createdAt" >= $9
+                        AND provider = $4::"PaymentProvider"
+                        AND amount = $5
+                        AND "groupId" IS NOT DISTINCT FROM $3
+                      ORDER BY "createdAt" DESC
+                      LIMIT 1
+                    )
+                    AND status = 'PENDING'::"PaymentCheckoutStatus"
+                  RETURNING id, "studentId", "groupId", provider, amount, status, "studentCode", "callbackToken", "createdAt"
+                ),
+                inserted AS (
+                  INSERT INTO "PaymentCheckout"
+                    (id, "studentId", "groupId", provider, amount, status, "studentCode", "callbackToken", note, "telegramChatId", "updatedAt")
+                  SELECT
+                    $1, $2, $3, $4::"PaymentProvider", $5, 'PENDING'::"PaymentCheckoutStatus", $6, $7, $8, $10, now()
+                  WHERE NOT EXISTS (SELECT 1 FROM existing)
+                  RETURNING id, "studentId", "groupId", provider, amount, status, "studentCode", "callbackToken", "createdAt"
+                )
+                SELECT *, true AS reused FROM existing
+                UNION ALL
+                SELECT *, false AS reused FROM inserted
                 """,
                 checkout_id,
                 student_id,
@@ -592,6 +897,8 @@ class BotRepository:
                 student_code,
                 callback_token,
                 note,
+                reuse_since,
+                str(telegram_chat_id) if telegram_chat_id is not None else None,
             )
 
         return dict(row) if row else {
@@ -604,29 +911,125 @@ class BotRepository:
             "studentCode": student_code,
             "callbackToken": callback_token,
             "createdAt": datetime.utcnow(),
+            "reused": False,
         }
 
-    async def get_parent_recent_submissions(self, student_user_id: str) -> list[dict]:
+    async def expire_payment_checkouts(self, created_before: datetime, limit: int = 1000) -> int:
+        """Mark up to ``limit`` PENDING checkouts created before ``created_before`` as EXPIRED."""
+        # = ANY(ARRAY(...)) keeps the outer update on the primary key; with IN a full batch
+        # is hash-joined against a sequential scan of the whole table.
+        async with self.pool.acquire() as conn:
+            result = await conn.execute(
+                """
+                UPDATE "PaymentCheckout"
+                SET status = 'EXPIRED'::"PaymentCheckoutStatus",
+                    "updatedAt" = now()
+                WHERE id = ANY(ARRAY(
+                  SELECT id
+                  FROM "PaymentCheckout"
+                  WHERE status = 'PENDING'::"PaymentCheckoutStatus"
+                    AND "createdAt" < $1
+                  LIMIT $2
+                  FOR UPDATE SKIP LOCKED
+                ))
+                """,
+                created_before,
+                limit,
+            )
+        return self._rows_affected(result)
+
+    async def claim_paid_checkouts(
+        self,
+        checkout_ids: Optional[list[str]] = None,
+        updated_since: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> list[dict]:
+        """Mark PAID checkouts with a Telegram chat as notified and return them.
+
+        Either by id (from NOTIFY) or by ``updatedAt`` cursor over the [status, updatedAt]
+        index (fallback poll). A checkout is returned by exactly one claim. As in
+        expire_payment_checkouts, = ANY(ARRAY(...)) keeps the update on the primary key.
+        """
         async with self.pool.acquire() as conn:
             rows = await conn.fetch(
                 """
-                SELECT s.id, s.score, s."createdAt", t."totalQuestions", l."lessonNumber", b.title AS book_title
+                UPDATE "PaymentCheckout" pc
+                SET "notifiedAt" = now()
+                WHERE pc.id = ANY(ARRAY(
+                  SELECT id
+                  FROM "PaymentCheckout"
+                  WHERE status = 'PAID'::"PaymentCheckoutStatus"
+                    AND "notifiedAt" IS NULL
+                    AND "telegramChatId" IS NOT NULL
+                    AND ($1::text[] IS NULL OR id = ANY($1::text[]))
+                    AND ($2::timestamp IS NULL OR "updatedAt" > $2)
+                  ORDER BY "updatedAt"
+                  LIMIT $3
+                  FOR UPDATE SKIP LOCKED
+                ))
+                RETURNING pc.id, pc."studentId", pc."studentCode", pc."telegramChatId", pc.amount, pc."updatedAt"
+                """,
+                checkout_ids,
+                updated_since,
+                limit,
+            )
+        # The payment behind a PAID checkout may not have reached the replica yet; the
+        # confirmation's balance (and the payer's next look) must come from the primary.
+        for row in rows:
+            self._pin(PIN_STUDENT, row["studentId"])
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _keyset(alias: str, column: str, cursor: Optional[tuple[datetime, str]], older: bool) -> tuple[str, str]:
+        """WHERE fragment (params $2, $3) and ORDER BY for a (column, id) keyset page.
+
+        Older pages walk the index backwards from the cursor and newer pages forwards,
+        so every page costs the same however deep it is; newer pages come back oldest first.
+        """
+        key = f'{alias}."{column}", {alias}.id'
+        if cursor is None:
+            return "true", f'{alias}."{column}" DESC, {alias}.id DESC'
+        if older:
+            return f"({key}) < ($2, $3)", f'{alias}."{column}" DESC, {alias}.id DESC'
+        return f"({key}) > ($2, $3)", f'{alias}."{column}" ASC, {alias}.id ASC'
+
+    async def get_student_submission_page(
+        self,
+        student_user_id: str,
+        cursor: Optional[tuple[datetime, str]] = None,
+        older: bool = True,
+        limit: int = 10,
+    ) -> list[dict]:
+        where, order = self._keyset("s", "createdAt", cursor, older)
+        async with self._read(PIN_RESULTS, student_user_id) as conn:
+            rows = await conn.fetch(
+                f"""
+                SELECT s.id, s.score, s."createdAt", t."totalQuestions", l."lessonNumber", b.title AS "bookTitle"
                 FROM "Submission" s
                 JOIN "Test" t ON t.id = s."testId"
                 JOIN "Lesson" l ON l.id = t."lessonId"
                 JOIN "Book" b ON b.id = l."bookId"
                 WHERE s."studentId" = $1
-                ORDER BY s."createdAt" DESC
-                LIMIT 10
+                  AND {where}
+                ORDER BY {order}
+                LIMIT {int(limit)}
                 """,
                 student_user_id,
+                *(cursor or ()),
             )
             return [dict(row) for row in rows]
 
-    async def get_student_journal_rows(self, student_registry_id: str) -> list[dict]:
-        async with self.pool.acquire() as conn:
+    async def get_student_journal_rows(
+        self,
+        student_registry_id: str,
+        cursor: Optional[tuple[datetime, str]] = None,
+        older: bool = True,
+        limit: int = 10,
+    ) -> list[dict]:
+        where, order = self._keyset("e", "updatedAt", cursor, older)
+        async with self._read(PIN_STUDENT, student_registry_id) as conn:
             rows = await conn.fetch(
-                """
+                f"""
                 SELECT
                   e.id,
                   e.attendance,
@@ -644,9 +1047,58 @@ class BotRepository:
                 LEFT JOIN "Lesson" l ON l.id = e."lessonId"
                 LEFT JOIN "Book" b ON b.id = l."bookId"
                 WHERE e."studentId" = $1
-                ORDER BY e."updatedAt" DESC
-                LIMIT 10
+                  AND {where}
+                ORDER BY {order}
+                LIMIT {int(limit)}
                 """,
                 student_registry_id,
+                *(cursor or ()),
             )
             return [dict(row) for row in rows]
+
+    async def enqueue_message_cleanup(self, chat_id: int, message_ids: list[int]) -> str:
+        cleanup_id = self._new_id()
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                'INSERT INTO "MessageCleanup" (id, "chatId", "messageIds") VALUES ($1, $2, $3::int[])',
+                cleanup_id,
+                chat_id,
+                message_ids,
+            )
+        return cleanup_id
+
+    async def get_due_message_cleanups(self, now: datetime, limit: int = 100) -> list[dict]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT id, "chatId", "messageIds", attempts, "createdAt"
+                FROM "MessageCleanup"
+                WHERE "nextAttemptAt" <= $1
+                ORDER BY "nextAttemptAt" ASC
+                LIMIT $2
+                """,
+                now,
+                limit,
+            )
+            return [dict(row) for row in rows]
+
+    async def get_next_message_cleanup_at(self) -> Optional[datetime]:
+        async with self.pool.acquire() as conn:
+            return await conn.fetchval('SELECT min("nextAttemptAt") FROM "MessageCleanup"')
+
+    async def finish_message_cleanup(self, cleanup_id: str) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute('DELETE FROM "MessageCleanup" WHERE id = $1', cleanup_id)
+
+    async def retry_message_cleanup(self, cleanup_id: str, next_attempt_at: datetime, error: str) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE "MessageCleanup"
+                SET attempts = attempts + 1, "nextAttemptAt" = $2, "lastError" = $3
+                WHERE id = $1
+                """,
+                cleanup_id,
+                next_attempt_at,
+                error[:500],
+            )
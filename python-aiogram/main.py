@@ -1,18 +1,37 @@
 from __future__ import annotations
 
 import asyncio
+import signal
+from datetime import timedelta
 
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
-from config import load_settings
+from config import Settings, load_settings
+from db.audit import AuditLogWriter
+from db.invalidation import InvalidationBus
 from db.pool import create_pool
+from db.replica import ReplicaRouter
 from db.repository import BotRepository
+from middlewares.profiler import ProfilerMiddleware, UpdateProfiler
+from middlewares.tracing import HandlerSpanMiddleware, TelegramRequestSpanMiddleware, TracingMiddleware
 from middlewares.update_logger import UpdateLoggerMiddleware
+from middlewares.update_recorder import UpdateRecorder, UpdateRecorderMiddleware
 from routers import register_routers
 from services.bot_logic import BotLogic
+from services.cache import BotCaches
+from services.checkout_sweeper import CheckoutSweeper
+from services.images import ImagePipeline
+from services.loop_monitor import LoopMonitor
+from services.memory_diagnostics import MemoryDiagnostics
+from services.message_cleanup import MessageCleanupWorker
+from services.payment_confirmations import PaymentConfirmationNotifier
+from services.reminders import WindowReminderScheduler
 from services.session_store import SessionStore
+from services.submission_journal import SubmissionJournal
+from services.tracing import Tracer
+from services.warmup import WindowWarmup
 
 
 async def run_polling(bot: Bot, dp: Dispatcher) -> None:
@@ -43,26 +62,227 @@ async def run_webhook(bot: Bot, dp: Dispatcher, port: int, webhook_path: str, we
         await runner.cleanup()
 
 
-async def main() -> None:
-    settings = load_settings()
-    pool = await create_pool(settings.database_url)
-    repo = BotRepository(pool=pool)
-    sessions = SessionStore()
-
-    bot = Bot(token=settings.bot_token)
+def build_dispatcher(
+    settings: Settings,
+    repo: BotRepository,
+    sessions: SessionStore,
+    recorder: UpdateRecorder | None = None,
+    invalidation: InvalidationBus | None = None,
+    cleanup: MessageCleanupWorker | None = None,
+    journal: SubmissionJournal | None = None,
+    images: ImagePipeline | None = None,
+    profiler: UpdateProfiler | None = None,
+    tracer: Tracer | None = None,
+) -> Dispatcher:
     dp = Dispatcher()
 
+    if tracer is not None:
+        # First, so the root span starts at update intake and covers routing.
+        dp.update.outer_middleware(TracingMiddleware(tracer))
+        for observer in (dp.message, dp.callback_query):
+            observer.middleware(HandlerSpanMiddleware())
+
+    if recorder is not None:
+        dp.update.outer_middleware(UpdateRecorderMiddleware(recorder))
     if settings.debug_updates:
         dp.update.outer_middleware(UpdateLoggerMiddleware())
+    if profiler is not None:
+        # Registered last so it is the innermost outer middleware and times only the handlers.
+        dp.update.outer_middleware(ProfilerMiddleware(profiler))
 
-    logic = BotLogic(repo=repo, settings=settings, sessions=sessions)
+    logic = BotLogic(
+        repo=repo,
+        settings=settings,
+        sessions=sessions,
+        caches=repo.cache,
+        cleanup=cleanup,
+        journal=journal,
+        images=images,
+    )
 
     dp["logic"] = logic
     dp["repo"] = repo
     dp["settings"] = settings
     dp["sessions"] = sessions
+    dp["invalidation"] = invalidation
+    dp["profiler"] = profiler
 
     register_routers(dp)
+    return dp
+
+
+async def main() -> None:
+    settings = load_settings()
+
+    monitor = None
+    if settings.loop_monitor_interval_ms > 0:
+        monitor = LoopMonitor(
+            interval=settings.loop_monitor_interval_ms / 1000,
+            block_threshold=settings.loop_block_threshold_ms / 1000,
+            report_interval=settings.loop_lag_report_seconds,
+            report_blocking=settings.debug_updates,
+        )
+        await monitor.start()
+
+    pool = await create_pool(settings.database_url)
+    caches = BotCaches(max_image_bytes=settings.cache_image_mb * 1024 * 1024)
+    repo = BotRepository(pool=pool, fanout_budget=settings.db_fanout_budget, cache=caches)
+    sessions = SessionStore()
+
+    replica = None
+    if settings.database_replica_url:
+        replica = ReplicaRouter(
+            pool,
+            await create_pool(settings.database_replica_url),
+            max_lag=settings.replica_max_lag_seconds,
+            check_interval=settings.replica_check_seconds,
+        )
+        repo.replica = replica
+        await replica.start()
+        print(f"Read replica: lag={replica.lag} max_lag={settings.replica_max_lag_seconds}s")
+
+    images = ImagePipeline(
+        caches,
+        max_side=settings.image_max_side,
+        quality=settings.image_jpeg_quality,
+        disk_dir=settings.image_cache_dir or None,
+        disk_max_bytes=settings.image_cache_dir_mb * 1024 * 1024,
+    )
+
+    audit = None
+    if settings.audit_async:
+        audit = AuditLogWriter(
+            pool,
+            max_queue=settings.audit_queue_size,
+            batch_size=settings.audit_batch_size,
+            flush_interval=settings.audit_flush_ms / 1000,
+            overflow=settings.audit_overflow,
+            max_attempts=settings.audit_max_attempts,
+            dead_letter_path=settings.audit_dead_letter_file,
+            report_interval=settings.audit_report_seconds,
+        )
+        repo.audit = audit
+        await audit.start()
+
+    recorder = None
+    if settings.record_updates_dir:
+        recorder = UpdateRecorder(
+            settings.record_updates_dir,
+            max_bytes=settings.record_updates_max_mb * 1024 * 1024,
+            salt=settings.record_updates_salt,
+            max_files=settings.record_updates_max_files,
+        )
+        print(f"Update recording: {settings.record_updates_dir}")
+
+    profiler = None
+    if settings.profile_dir:
+        profiler = UpdateProfiler(
+            settings.profile_dir,
+            sample_rate=settings.profile_sample_rate,
+            slow_ms=settings.profile_slow_ms,
+            interval_ms=settings.profile_interval_ms,
+            enabled=settings.profile_enabled,
+        )
+        try:
+            # kill -USR2 <pid> switches profiling on and off without a restart.
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR2, profiler.toggle)
+        except (NotImplementedError, AttributeError):
+            pass
+        print(profiler.status())
+
+    tracer = None
+    if settings.trace_dir:
+        tracer = Tracer(
+            settings.trace_dir,
+            slow_ms=settings.trace_slow_ms,
+            sample_rate=settings.trace_sample_rate,
+            max_bytes=settings.trace_max_mb * 1024 * 1024,
+        )
+        print(f"Tracing: {settings.trace_dir} (slow>={settings.trace_slow_ms}ms)")
+
+    invalidation = None
+    if settings.db_listen_invalidation:
+        invalidation = InvalidationBus(settings.database_url)
+        caches.attach(invalidation)
+        images.attach(invalidation)
+        if replica is not None:
+            replica.attach(invalidation)
+
+    bot = Bot(token=settings.bot_token)
+    if tracer is not None:
+        bot.session.middleware(TelegramRequestSpanMiddleware())
+    cleanup = MessageCleanupWorker(repo, bot)
+
+    reminders = None
+    if settings.reminders_enabled:
+        reminders = WindowReminderScheduler(
+            repo,
+            bot,
+            close_lead=timedelta(minutes=settings.reminder_close_lead_minutes),
+        )
+        if invalidation is not None:
+            reminders.attach(invalidation)
+
+    journal = None
+    if settings.submission_journal_dir:
+        journal = SubmissionJournal(settings.submission_journal_dir, repo)
+        replayed = await journal.open()
+        print(f"Submission journal: {settings.submission_journal_dir} (replayed {replayed})")
+
+    dp = build_dispatcher(
+        settings,
+        repo,
+        sessions,
+        recorder=recorder,
+        invalidation=invalidation,
+        cleanup=cleanup,
+        journal=journal,
+        images=images,
+        profiler=profiler,
+        tracer=tracer,
+    )
+    memory = MemoryDiagnostics(
+        sessions,
+        caches=caches,
+        pools=[pool] if replica is None else [pool, replica.replica],
+        storage=dp.storage,
+    )
+    if settings.memory_trace_on_start:
+        print(memory.start())
+    dp["memory"] = memory
+    try:
+        # kill -USR1 <pid> prints a memory snapshot (or status) to the log.
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, memory.on_signal)
+    except (NotImplementedError, AttributeError):
+        pass
+
+    confirmations = PaymentConfirmationNotifier(repo, bot, dp["logic"], caches=caches)
+    if invalidation is not None:
+        confirmations.attach(invalidation)
+    await cleanup.start()
+    if invalidation is not None:
+        await invalidation.start()
+
+    warmup = None
+    if settings.warmup_lead_minutes > 0 and invalidation is None:
+        # Without the bus cache entries expire long before the windows open.
+        print("Window warm-up disabled: needs DB_LISTEN_INVALIDATION=true")
+    elif settings.warmup_lead_minutes > 0:
+        warmup = WindowWarmup(
+            repo,
+            dp["logic"],
+            caches,
+            bot=bot,
+            lead_minutes=settings.warmup_lead_minutes,
+            interval_seconds=settings.warmup_interval_seconds,
+            warm_chat_id=settings.warmup_chat_id,
+        )
+        await warmup.start()
+    if reminders is not None:
+        await reminders.start()
+    sweeper = CheckoutSweeper(repo, timedelta(minutes=settings.payment_checkout_ttl_minutes))
+    await sweeper.start()
+    await confirmations.start()
 
     me = await bot.get_me()
     print(f"Bot: @{me.username or me.first_name} | NODE_ENV={settings.node_env}")
@@ -75,8 +295,36 @@ async def main() -> None:
         else:
             await run_polling(bot, dp)
     finally:
+        await cleanup.close()
+        await sweeper.close()
+        await confirmations.close()
+        if reminders is not None:
+            await reminders.close()
+        if warmup is not None:
+            await warmup.close()
+        if invalidation is not None:
+            await invalidation.close()
+        if recorder is not None:
+            recorder.close()
+        if profiler is not None:
+            profiler.close()
+        if tracer is not None:
+            tracer.close()
+            print("TRACING", tracer.report())
+        if journal is not None:
+            await journal.close()
+        if audit is not None:
+            await audit.close()
+            print("AUDIT", audit.report())
+        print("IMAGES", images.report())
+        if replica is not None:
+            await replica.close()
+            print("REPLICA", replica.report())
         await repo.close()
         await bot.session.close()
+        if monitor is not None:
+            await monitor.close()
+            print("LOOP_LAG", monitor.report())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+import os
+from pathlib import Path
+import random
+import re
+import sys
+import threading
+import time
+from types import FrameType
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+
+@dataclass
+class ProfilerStats:
+    profiled: int = 0
+    written: int = 0
+    samples: int = 0
+    errors: int = 0
+
+
+@dataclass
+class _Session:
+    task: asyncio.Task
+    sampled: bool
+    stacks: Counter = field(default_factory=Counter)
+
+
+def _label(frame: FrameType) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{frame.f_globals.get('__name__', '?')}:{name}"
+
+
+class UpdateProfiler:
+    """Wall-clock sampling profiler for update handling, switchable at runtime.
+
+    While enabled, an update is profiled with probability ``sample_rate``, and with
+    ``slow_ms`` > 0 every update is profiled but only kept when it took at least that
+    long. A background thread takes a sample of each profiled update every
+    ``interval_ms``: the handler's coroutine chain (following ``cr_await``, so time
+    spent waiting on the DB or the Bot API shows up under the awaiting call), plus
+    the live Python stack when that coroutine is the one running on the loop.
+
+    Profiles are written as collapsed stacks (``frame;frame;frame count``), readable
+    by flamegraph.pl, speedscope and inferno, to
+    ``<dir>/<time>-u<update id>-<update type>-<handler>-<ms>ms.folded``; only the
+    newest ``max_files`` are kept.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.01,
+        slow_ms: int = 1000,
+        interval_ms: int = 5,
+        enabled: bool = False,
+        max_files: int = 500,
+    ) -> None:
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval_ms / 1000
+        self.enabled = enabled
+        self.max_files = max_files
+        self.stats = ProfilerStats()
+        self._sessions: dict[int, _Session] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def toggle(self) -> None:
+        self.enabled = not self.enabled
+        print("PROFILER", self.status())
+
+    def command(self, args: str) -> str:
+        """``/profile on [rate] [slow_ms]``, ``/profile off`` or ``/profile``; returns the new status."""
+        parts = args.split()
+        if parts and parts[0] in ("on", "off"):
+            self.enabled = parts[0] == "on"
+            try:
+                if len(parts) > 1:
+                    self.sample_rate = min(1.0, max(0.0, float(parts[1])))
+                if len(parts) > 2:
+                    self.slow_ms = max(0, int(parts[2]))
+            except ValueError:
+                return "Foydalanish: /profile on [rate] [slow_ms] | off"
+            print("PROFILER", self.status())
+        return self.status()
+
+    def status(self) -> str:
+        state = "yoqilgan" if self.enabled else "o'chirilgan"
+        return (
+            f"Profiler {state}: rate={self.sample_rate:g} slow={self.slow_ms}ms "
+            f"profiled={self.stats.profiled} written={self.stats.written} dir={self.directory}"
+        )
+
+    def begin(self) -> Optional[_Session]:
+        if not self.enabled:
+            return None
+        sampled = random.random() < self.sample_rate
+        task = asyncio.current_task()
+        if task is None or not (sampled or self.slow_ms > 0):
+            return None
+
+        session = _Session(task=task, sampled=sampled)
+        with self._lock:
+            self._sessions[id(session)] = session
+        if self._thread is None:
+            self._loop_thread_id = threading.get_ident()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="update-profiler", daemon=True)
+            self._thread.start()
+        self.stats.profiled += 1
+        return session
+
+    def end(self, session: _Session, event: TelegramObject, elapsed_ms: float) -> Optional[Path]:
+        # The sampler adds to stacks under the lock and skips sessions that are gone.
+        with self._lock:
+            self._sessions.pop(id(session), None)
+            stacks = Counter(session.stacks)
+        if not stacks or not (session.sampled or (self.slow_ms > 0 and elapsed_ms >= self.slow_ms)):
+            return None
+
+        update_id = getattr(event, "update_id", 0)
+        update_type = getattr(event, "event_type", None) or type(event).__name__
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        name = f"{stamp}-u{update_id}-{update_type}-{self._handler_name(stacks)}-{int(elapsed_ms)}ms.folded"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / name
+            path.write_text(
+                "".join(f"{stack} {count}\n" for stack, count in stacks.most_common()),
+                encoding="utf-8",
+            )
+        except OSError as error:
+            self.stats.errors += 1
+            print("PROFILER_WRITE_ERROR", error)
+            return None
+
+        self.stats.written += 1
+        if self.stats.written % 50 == 0:
+            self._prune()
+        return path
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    @staticmethod
+    def _handler_name(stacks: Counter) -> str:
+        # The first frame below aiogram's dispatch that most samples agree on,
+        # e.g. routers.messages:text_handler.
+        counts: Counter = Counter()
+        for stack, count in stacks.items():
+            for frame in stack.split(";"):
+                if not frame.startswith(("aiogram.", "<")):
+                    counts[frame] += count
+                    break
+        if not counts:
+            return "unhandled"
+        return re.sub(r"[^A-Za-z0-9_.]+", ".", counts.most_common(1)[0][0].removeprefix("routers."))
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob("*.folded"), key=lambda path: path.stat().st_mtime)
+        for path in files[: max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _run(self) -> None:
+        entry = ProfilerMiddleware.__call__.__code__
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                sessions = list(self._sessions.values())
+            if not sessions:
+                continue
+            loop_frame = sys._current_frames().get(self._loop_thread_id)
+            for session in sessions:
+                try:
+                    stack = self._sample(session.task, entry, loop_frame)
+                except Exception:
+                    # The coroutine chain changed under us; skip this tick.
+                    continue
+                if not stack:
+                    continue
+                with self._lock:
+                    if id(session) in self._sessions:
+                        session.stacks[stack] += 1
+                        self.stats.samples += 1
+
+    @staticmethod
+    def _sample(task: asyncio.Task, entry: Any, loop_frame: Optional[FrameType]) -> str:
+        chain: list[Any] = []
+        coro: Any = task.get_coro()
+        while coro is not None:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            chain.append(frame)
+            awaited = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+            if awaited is None:
+                # A coroutine on the CPU hides what it awaits; the loop thread's
+                # live stack below its frame says what it is doing instead.
+                if (getattr(coro, "cr_running", False) or getattr(coro, "gi_running", False)) and loop_frame:
+                    live: list[FrameType] = []
+                    current: Optional[FrameType] = loop_frame
+                    while current is not None and current.f_code is not frame.f_code:
+                        live.append(current)
+                        current = current.f_back
+                    if current is not None:
+                        chain.extend(reversed(live))
+                break
+            if hasattr(awaited, "cr_frame") or hasattr(awaited, "gi_frame"):
+                coro = awaited
+                continue
+
+            # Awaiting a future: the task knows which one.
+            waiter = getattr(task, "_fut_waiter", None)
+            pending = [child for child in getattr(waiter, "_children", None) or () if not child.done()]
+            if pending and isinstance(pending[0], asyncio.Task):
+                # asyncio.gather(): follow the first child still running.
+                chain.append("<gather>")
+                task = pending[0]
+                coro = task.get_coro()
+                continue
+            chain.append(f"<await {type(waiter or awaited).__name__}>")
+            break
+
+        for index, item in enumerate(chain):
+            if isinstance(item, FrameType) and item.f_code is entry:
+                return ";".join(item if isinstance(item, str) else _label(item) for item in chain[index + 1 :])
+        return ""
+
+
+class ProfilerMiddleware(BaseMiddleware):
+    def __init__(self, profiler: UpdateProfiler) -> None:
+        self.profiler = profiler
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        session = self.profiler.begin() if isinstance(event, Update) else None
+        if session is None:
+            return await handler(event, data)
+
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.profiler.end(session, event, (time.perf_counter() - started) * 1000)
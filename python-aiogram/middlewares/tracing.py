@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from services.tracing import KIND_CLIENT, Tracer, span
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer update middleware: opens the update's root span (routing + handler + everything below)."""
+
+    def __init__(self, tracer: Tracer) -> None:
+        self.tracer = tracer
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if not isinstance(event, Update):
+            return await handler(event, data)
+
+        update_type = event.event_type
+        user = getattr(event.event, "from_user", None)
+        with self.tracer.trace(
+            f"update {update_type}",
+            **{
+                "telegram.update_id": event.update_id,
+                "telegram.update_type": update_type,
+                "telegram.user_id": user.id if user else None,
+            },
+        ):
+            return await handler(event, data)
+
+
+class HandlerSpanMiddleware(BaseMiddleware):
+    """Inner middleware: a span for the handler the router picked, named after its function."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        callback = getattr(handler_object, "callback", None)
+        name = f"{callback.__module__}.{callback.__qualname__}" if callback is not None else "handler"
+        with span(f"handler {name}", **{"code.function": name}):
+            return await handler(event, data)
+
+
+class TelegramRequestSpanMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: a client span per Bot API call with its method and outcome."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        api_method = getattr(method, "__api_method__", type(method).__name__)
+        with span(
+            f"telegram {api_method}",
+            KIND_CLIENT,
+            **{"telegram.method": api_method, "telegram.chat_id": getattr(method, "chat_id", None)},
+        ) as current:
+            try:
+                # The session raises on API errors, so reaching the next line means "ok".
+                result = await make_request(bot, method)
+            except TelegramAPIError as error:
+                if current is not None:
+                    current.set(**{"telegram.status": type(error).__name__})
+                raise
+            if current is not None:
+                current.set(**{"telegram.status": "ok"})
+            return result
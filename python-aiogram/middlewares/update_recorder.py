@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+from datetime import datetime
+import gzip
+import hashlib
+import hmac
+import json
+import os
+from pathlib import Path
+import queue
+import re
+import secrets
+import threading
+import time
+from typing import IO, Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from services.constants import PARENT_BUTTONS, STUDENT_BUTTONS
+
+
+_DROPPED_KEYS = {"last_name", "username", "title", "bio", "vcard"}
+# Free-text bodies; appeals arrive as plain message text.
+_TEXT_KEYS = {"text", "caption"}
+_DROPPED_TEXT_KEYS = {"entities", "caption_entities", "link_preview_options"}
+# Menu buttons, commands and answer strings drive routing and carry nothing personal.
+_ANSWER_TEXT_RE = re.compile(r"[0-9A-Da-d\s.,;:)\-]+")
+_KEPT_TEXTS = STUDENT_BUTTONS | PARENT_BUTTONS
+
+
+class UpdateAnonymizer:
+    """Strips personal data from an update payload.
+
+    Telegram user and chat ids are kept as they are, so a replay resolves actors
+    against an unmodified database snapshot. Names, usernames, phone numbers and
+    free-text message bodies are masked; contacts therefore replay the
+    unknown-phone path.
+    """
+
+    def __init__(self, salt: str) -> None:
+        self._key = (salt or secrets.token_hex(16)).encode("utf-8")
+
+    def _digest(self, value: Any) -> bytes:
+        return hmac.new(self._key, str(value).encode("utf-8"), hashlib.sha256).digest()
+
+    def phone(self, value: Any) -> str:
+        digits = str(int.from_bytes(self._digest(value)[:8], "big") % 10**9).zfill(9)
+        return f"+998{digits}"
+
+    @staticmethod
+    def text(value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        stripped = value.strip()
+        if stripped in _KEPT_TEXTS or stripped.startswith("/") or _ANSWER_TEXT_RE.fullmatch(stripped):
+            return value
+        # Same length, so handlers that look at the size behave the same.
+        return "x" * len(value)
+
+    def anonymize(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self.anonymize(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        result: dict[str, Any] = {}
+        for key, item in value.items():
+            if key in _DROPPED_KEYS or key in _DROPPED_TEXT_KEYS:
+                continue
+            if key == "first_name":
+                # Required by the Bot API schema, so it is masked instead of dropped.
+                result[key] = "anon"
+            elif key in _TEXT_KEYS:
+                result[key] = self.text(item)
+            elif key == "phone_number":
+                result[key] = self.phone(item)
+            else:
+                result[key] = self.anonymize(item)
+        return result
+
+
+class UpdateRecorder:
+    """Appends anonymized updates to gzip-compressed JSONL files, rotated by size.
+
+    Compression and file I/O run on a writer thread; the event loop only dumps the
+    update and enqueues it. When the queue is full the update is not recorded.
+    Only the newest ``max_files`` recordings are kept.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        salt: str = "",
+        max_files: int = 20,
+        max_queue: int = 10000,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.anonymizer = UpdateAnonymizer(salt)
+        self.dropped = 0
+        self._queue: queue.Queue[Optional[tuple[float, dict]]] = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._file: Optional[IO[str]] = None
+        self._written = 0
+
+    def _open(self) -> IO[str]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        path = self.directory / f"updates-{stamp}-{secrets.token_hex(3)}.jsonl.gz"
+        self._written = 0
+        handle = gzip.open(path, "at", encoding="utf-8")
+        self._prune()
+        return handle
+
+    def _prune(self) -> None:
+        if self.max_files <= 0:
+            return
+        files = sorted(self.directory.glob("updates-*.jsonl.gz"), key=lambda path: path.stat().st_mtime)
+        for path in files[: max(0, len(files) - self.max_files)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def write(self, update: Update, arrived_at: float) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="update-recorder", daemon=True)
+            self._thread.start()
+
+        payload = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+        try:
+            self._queue.put_nowait((arrived_at, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write_line(*item)
+            except Exception as error:
+                print("UPDATE_RECORD_ERROR", error)
+
+    def _write_line(self, arrived_at: float, payload: dict) -> None:
+        line = json.dumps(
+            {"ts": arrived_at, "update": self.anonymizer.anonymize(payload)},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+        if self._file is None or self._written >= self.max_bytes:
+            self._close_file()
+            self._file = self._open()
+
+        self._file.write(line + "\n")
+        self._written += len(line) + 1
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+            self._thread = None
+        self._close_file()
+        if self.dropped:
+            print("UPDATE_RECORD_DROPPED", self.dropped)
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    def __init__(self, recorder: UpdateRecorder) -> None:
+        self.recorder = recorder
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                self.recorder.write(event, time.time())
+            except Exception as error:
+                print("UPDATE_RECORD_ERROR", error)
+        return await handler(event, data)
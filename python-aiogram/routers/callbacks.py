@@ -21,3 +21,8 @@ async def pay_scope_handler(callback: CallbackQuery, logic: BotLogic) -> None:
 @router.callback_query(F.data.startswith("pay_go:"))
 async def pay_provider_handler(callback: CallbackQuery, logic: BotLogic) -> None:
     await logic.handle_payment_provider(callback)
+
+
+@router.callback_query(F.data.startswith("hist:"))
+async def history_page_handler(callback: CallbackQuery, logic: BotLogic) -> None:
+    await logic.handle_history_page(callback)
@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+from typing import Optional
+
 from aiogram import Router
-from aiogram.filters import Command
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message
 
+from config import Settings
+from middlewares.profiler import UpdateProfiler
 from services.bot_logic import BotLogic
+from services.memory_diagnostics import MemoryDiagnostics
 
 router = Router(name="commands")
 
@@ -17,3 +23,28 @@ async def start_handler(message: Message, logic: BotLogic) -> None:
 @router.message(Command("ping"))
 async def ping_handler(message: Message, logic: BotLogic) -> None:
     await logic.handle_ping(message)
+
+
+@router.message(Command("profile"))
+async def profile_handler(
+    message: Message,
+    command: CommandObject,
+    settings: Settings,
+    profiler: Optional[UpdateProfiler] = None,
+) -> None:
+    # Admin only; for everyone else /profile is an ordinary text message.
+    if profiler is None or message.from_user is None or message.from_user.id not in settings.profile_admin_ids:
+        raise SkipHandler()
+    await message.answer(profiler.command(command.args or ""))
+
+
+@router.message(Command("memory"))
+async def memory_handler(
+    message: Message,
+    command: CommandObject,
+    settings: Settings,
+    memory: Optional[MemoryDiagnostics] = None,
+) -> None:
+    if memory is None or message.from_user is None or message.from_user.id not in settings.profile_admin_ids:
+        raise SkipHandler()
+    await message.answer(await memory.command(command.args or ""))
@@ -1,41 +1,109 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 import re
+from typing import Optional, Sequence
 
 
 _MATCH_RE = re.compile(r"(\d{1,3})([A-D])")
+_POSITIONAL_RE = re.compile(r"[A-D]+")
 
 
 class ParseError(ValueError):
     pass
 
 
+@dataclass
+class ScanResult:
+    # answers[i] is the answer to question i + 1, "" when it was not given.
+    answers: list[str]
+    filled: int
+    score: int = 0
+    duplicates: list[int] = field(default_factory=list)
+    # Question numbers in the order they were written.
+    order: list[int] = field(default_factory=list)
+
+    @property
+    def missing(self) -> list[int]:
+        if self.filled == len(self.answers):
+            return []
+        return [idx + 1 for idx, value in enumerate(self.answers) if not value]
+
+    def details(self, compiled_key: Sequence[str]) -> list[tuple[int, Optional[str], str, bool]]:
+        # (questionNumber, givenAnswer, correctAnswer, isCorrect) rows for SubmissionDetail.
+        return [
+            (idx + 1, given or None, correct, bool(given) and given == correct)
+            for idx, (given, correct) in enumerate(zip(self.answers, compiled_key))
+        ]
+
+
+
+def compile_answer_key(answer_key: Sequence[str], total_questions: int) -> tuple[str, ...]:
+    key = tuple(answer_key[:total_questions])
+    if len(key) < total_questions:
+        key += ("",) * (total_questions - len(key))
+    return key
+
 
-def parse_answer_text(raw_text: str, total_questions: int) -> dict:
-    raw = (raw_text or "").upper()
-    raw = re.sub(r"\s+", "", raw)
+
+def scan_answers(
+    raw_text: str,
+    total_questions: int,
+    compiled_key: Optional[Sequence[str]] = None,
+) -> ScanResult:
+    """Parse "1A2B3C..." or the bare positional "ABCD..." form in one pass.
+
+    Answers land directly in a fixed-size array indexed by question number; when a
+    compiled key is given the score is accumulated in the same pass. Out-of-range
+    numbers are ignored and the first answer for a repeated number wins.
+    """
+    raw = "".join((raw_text or "").upper().split())
 
     if len(raw) < 2 or len(raw) > 3000:
         raise ParseError("Javob formati noto'g'ri. Masalan: 1A2B3C")
 
-    by_question = [""] * total_questions
-    parsed: list[dict] = []
-    seen: set[int] = set()
+    answers = [""] * total_questions
+    result = ScanResult(answers=answers, filled=0)
 
-    for m in _MATCH_RE.finditer(raw):
-        question_number = int(m.group(1))
-        answer = m.group(2)
+    if _POSITIONAL_RE.fullmatch(raw):
+        if len(raw) > total_questions:
+            raise ParseError("Javoblar soni savollar sonidan ko'p")
+        answers[: len(raw)] = raw
+        result.filled = len(raw)
+        result.order = list(range(1, len(raw) + 1))
+        if compiled_key is not None:
+            result.score = sum(1 for given, correct in zip(raw, compiled_key) if given == correct)
+        return result
 
-        if question_number < 1 or question_number > total_questions:
+    filled = 0
+    score = 0
+    written = result.order.append
+    for number, answer in _MATCH_RE.findall(raw):
+        idx = int(number) - 1
+        if idx < 0 or idx >= total_questions:
             continue
-        if question_number in seen:
+        if answers[idx]:
+            result.duplicates.append(idx + 1)
             continue
 
-        seen.add(question_number)
-        parsed.append({"questionNumber": question_number, "answer": answer})
-        by_question[question_number - 1] = answer
+        answers[idx] = answer
+        written(idx + 1)
+        filled += 1
+        if compiled_key is not None and compiled_key[idx] == answer:
+            score += 1
 
-    if not parsed:
+    if not filled:
         raise ParseError("Javob formati noto'g'ri. Masalan: 1A2B3C")
 
-    return {"parsed": parsed, "byQuestion": by_question}
+    result.filled = filled
+    result.score = score
+    return result
+
+
+
+def parse_answer_text(raw_text: str, total_questions: int) -> dict:
+    # "parsed" keeps the order the answers were written in, as before scan_answers.
+    scan = scan_answers(raw_text, total_questions)
+    answers = scan.answers
+    parsed = [{"questionNumber": number, "answer": answers[number - 1]} for number in scan.order]
+    return {"parsed": parsed, "byQuestion": scan.answers}
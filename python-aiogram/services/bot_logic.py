@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from datetime import datetime
-import json
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Union
 from urllib.parse import quote_plus
 
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import (
+    BufferedInputFile,
     CallbackQuery,
     FSInputFile,
     InlineKeyboardButton,
@@ -18,7 +19,8 @@ from aiogram.types import (
 
 from config import Settings
 from db.repository import BotRepository
-from services.answer_parser import ParseError, parse_answer_text
+from services.answer_parser import ParseError, scan_answers
+from services.cache import BotCaches
 from services.constants import (
     PARENT_BTN_APPEAL,
     PARENT_BTN_DEBT,
@@ -32,10 +34,25 @@ from services.constants import (
     STUDENT_BTN_TEST,
     STUDENT_BUTTONS,
 )
-from services.formatters import add_months_keeping_day, format_attendance, format_date, format_date_only, format_money
+from services.debt import summarize_debt
+from services.formatters import format_attendance, format_date, format_date_only, format_money
+from services.images import ImagePipeline, default_image_roots, resolve_local_image_path
 from services.keyboards import parent_menu_keyboard, phone_keyboard, student_menu_keyboard
-from services.phone import normalize_uz_phone, phone_variants
+from services.message_cleanup import MessageCleanupWorker
+from services.pagination import (
+    KIND_JOURNAL,
+    KIND_PAYMENTS,
+    KIND_RESULTS,
+    PAGE_SIZE,
+    HistoryPage,
+    PageCursor,
+    build_page,
+    page_keyboard,
+)
+from services.phone import normalize_uz_phone
 from services.session_store import SessionStore
+from services.submission_journal import SubmissionJournal
+from services.tracing import span
 from services.types import SessionState
 
 
@@ -44,6 +61,10 @@ class BotLogic:
     repo: BotRepository
     settings: Settings
     sessions: SessionStore
+    caches: Optional[BotCaches] = None
+    cleanup: Optional[MessageCleanupWorker] = None
+    journal: Optional[SubmissionJournal] = None
+    images: Optional[ImagePipeline] = None
 
     def _get_session(self, user_id: int) -> SessionState:
         return self.sessions.get(user_id)
@@ -71,39 +92,52 @@ class BotLogic:
             return f"{self.settings.web_base_url}{image_url}"
         return f"{self.settings.web_base_url}/{image_url}"
 
-    def _resolve_local_image_path(self, image_url: str) -> Optional[Path]:
-        raw = image_url.strip()
-        rel = raw.lstrip("/")
-
-        if raw.lower().startswith(("http://", "https://")):
-            try:
-                from urllib.parse import urlparse
-
-                rel = urlparse(raw).path.lstrip("/")
-            except Exception:
-                return None
-
-        if not rel:
-            return None
-
-        root = Path(__file__).resolve().parents[2]
-        candidate1 = root / "apps" / "web" / "public" / rel
-        if candidate1.exists():
-            return candidate1
-
-        candidate2 = Path.cwd() / "apps" / "web" / "public" / rel
-        if candidate2.exists():
-            return candidate2
+    def local_image_path(self, image_url: str) -> Optional[Path]:
+        if self.images is not None:
+            return self.images.local_path(image_url)
+        return resolve_local_image_path(image_url, default_image_roots())
+
+    def photo_input(
+        self, image_url: str, data: Optional[bytes] = None
+    ) -> Union[str, BufferedInputFile, FSInputFile]:
+        # Pass what ImagePipeline.load returned: the cache may evict it before the upload.
+        if data is None and self.caches is not None:
+            data = self.caches.image_bytes.get(image_url)
+        if data:
+            name = Path(image_url).name or "test.jpg"
+            if self.images is not None:
+                # Pipeline bytes are always re-encoded JPEGs.
+                name = f"{Path(name).stem}.jpg"
+            return BufferedInputFile(data, filename=name)
+
+        local_path = self.local_image_path(image_url)
+        if local_path:
+            return FSInputFile(str(local_path))
+        return self._resolve_image_url(image_url)
 
-        return None
+    def remember_photo(self, image_url: str, sent: Optional[Message]) -> None:
+        # Later sends of the same image reuse Telegram's file_id instead of uploading again.
+        if self.caches is not None and sent and sent.photo:
+            self.caches.image_file_ids.put(image_url, sent.photo[-1].file_id)
 
     async def _send_test_image(self, message: Message, image_url: str) -> Optional[int]:
-        local_path = self._resolve_local_image_path(image_url)
-        if local_path:
-            sent = await message.answer_photo(FSInputFile(str(local_path)), protect_content=True)
-        else:
-            sent = await message.answer_photo(self._resolve_image_url(image_url), protect_content=True)
-        return sent.message_id if sent else None
+        with span("send_test_image", **{"image.url": image_url}) as current:
+            file_id = self.caches.image_file_ids.get(image_url) if self.caches is not None else None
+            if file_id:
+                try:
+                    sent = await message.answer_photo(file_id, protect_content=True)
+                    if current is not None:
+                        current.set(**{"image.source": "file_id"})
+                    return sent.message_id if sent else None
+                except TelegramBadRequest:
+                    self.caches.image_file_ids.pop(image_url)
+
+            data = await self.images.load(image_url) if self.images is not None else None
+            if current is not None:
+                current.set(**{"image.source": "upload"})
+            sent = await message.answer_photo(self.photo_input(image_url, data), protect_content=True)
+            self.remember_photo(image_url, sent)
+            return sent.message_id if sent else None
 
     async def handle_start(self, message: Message) -> None:
         if not message.from_user:
@@ -129,8 +163,9 @@ class BotLogic:
             )
             return
 
+        children = actor.get("children") or [actor["student"]]
         await message.answer(
-            f"Kelajakmediklari botiga xush kelibsiz!\nFarzandingiz: {actor['student']['fullName']}",
+            "Kelajakmediklari botiga xush kelibsiz!\nFarzandingiz: " + ", ".join(child["fullName"] for child in children),
             reply_markup=parent_menu_keyboard(),
         )
 
@@ -146,8 +181,7 @@ class BotLogic:
             return
 
         session = self._get_session(message.from_user.id)
-        variants = phone_variants(message.contact.phone_number)
-        found = await self.repo.find_eligible_student_by_phone(variants)
+        found = await self.repo.find_eligible_student_by_phone(normalize_uz_phone(message.contact.phone_number))
 
         if not found:
             await message.answer(REJECT_TEXT, reply_markup=ReplyKeyboardRemove())
@@ -157,8 +191,7 @@ class BotLogic:
 
         try:
             if found["personType"] == "STUDENT":
-                user_id = await self.repo.ensure_student_user_for_bot(student, phone_variants(student["phone"]))
-                await self.repo.link_user_telegram(user_id, message.from_user.id)
+                await self.repo.link_student_for_bot(student, normalize_uz_phone(student["phone"]), message.from_user.id)
 
                 self._clear_session(session)
                 await message.answer(
@@ -188,118 +221,32 @@ class BotLogic:
             print("BOT_CONTACT_LINK_ERROR", error)
             await message.answer("Raqamni bog'lashda xatolik bo'ldi. Iltimos, qayta urinib ko'ring.")
 
-    async def _student_debt_summary(self, student_registry_id: str) -> dict:
-        rows = await self.repo.get_student_payments(student_registry_id)
-        now = datetime.utcnow().date()
-
-        latest_by_group: dict[str, dict] = {}
-        groups_map: dict[str, dict] = {}
-        total_base = 0
-
-        for row in rows:
-            base_debt = max(0, int(row["amountRequired"]) - int(row.get("discount") or 0) - int(row["amountPaid"]))
-            total_base += base_debt
-
-            group_id = row.get("groupId")
-            group_code = row.get("group_code") or "-"
-            if group_id:
-                group_item = groups_map.get(group_id)
-                if not group_item:
-                    group_item = {
-                        "groupId": group_id,
-                        "groupCode": group_code,
-                        "baseDebt": 0,
-                        "extraDebt": 0,
-                        "totalDebt": 0,
-                    }
-                    groups_map[group_id] = group_item
-                group_item["baseDebt"] += base_debt
-
-            period_end = row.get("periodEnd")
-            if not group_id or not period_end:
-                continue
-
-            previous = latest_by_group.get(group_id)
-            if not previous or previous["periodEnd"] < period_end:
-                latest_by_group[group_id] = row
-
-        total_extra = 0
-        for group_id, latest in latest_by_group.items():
-            group_status = latest.get("group_status")
-            group_price = latest.get("group_price")
-            period_end = latest.get("periodEnd")
-            if group_status != "OCHIQ" or not group_price or not period_end:
-                continue
-
-            end_date = period_end.date()
-            if now <= end_date:
-                continue
-
-            periods = 0
-            cursor = end_date
-            while cursor <= now:
-                periods += 1
-                cursor = add_months_keeping_day(end_date, periods)
-
-            extra_debt = periods * int(group_price)
-            total_extra += extra_debt
-
-            group_item = groups_map.get(group_id)
-            if group_item:
-                group_item["extraDebt"] += extra_debt
-
-        top_rows: list[dict] = []
-        for row in rows[:10]:
-            net = max(0, int(row["amountRequired"]) - int(row.get("discount") or 0))
-            debt = max(0, net - int(row["amountPaid"]))
-            top_rows.append(
-                {
-                    "month": row["month"],
-                    "groupCode": row.get("group_code") or "-",
-                    "net": net,
-                    "paid": int(row["amountPaid"]),
-                    "debt": debt,
-                }
-            )
+    async def student_debt_summary(self, student_registry_id: str) -> dict:
+        generation = 0
+        if self.caches is not None:
+            cached = self.caches.debts.get(student_registry_id)
+            if cached is not None:
+                return cached
+            generation = self.caches.debts.generation
 
-        groups: list[dict] = []
-        for group in groups_map.values():
-            total = int(group["baseDebt"]) + int(group["extraDebt"])
-            if total <= 0:
-                continue
-            group["totalDebt"] = total
-            groups.append(group)
-
-        groups.sort(key=lambda item: item["totalDebt"], reverse=True)
-
-        return {
-            "totalDebt": total_base + total_extra,
-            "totalBase": total_base,
-            "totalExtra": total_extra,
-            "topRows": top_rows,
-            "groups": groups,
-        }
+        rows = await self.repo.get_student_payments(student_registry_id)
+        debt = summarize_debt(rows, datetime.utcnow().date())
+        if self.caches is not None:
+            self.caches.debts.put(student_registry_id, debt, generation=generation)
+        return debt
 
     def _build_debt_summary_text(self, debt: dict, student_code: str) -> str:
         group_lines = []
         for idx, group in enumerate(debt.get("groups", []), start=1):
             group_lines.append(f"{idx}) {group['groupCode']}: {format_money(group['totalDebt'])} so'm")
 
-        lines = []
-        for idx, row in enumerate(debt.get("topRows", []), start=1):
-            lines.append(
-                f"{idx}) {row['month']} | {row['groupCode']}\n"
-                f"Talab: {format_money(row['net'])} | To'langan: {format_money(row['paid'])} | Qarz: {format_money(row['debt'])}"
-            )
-
         text = (
             "💳 To'lov holati\n\n"
             f"Student_ID: {student_code}\n"
             f"Jami qarzdorlik: {format_money(debt['totalDebt'])} so'm\n"
             + (f"Shundan kechikkan davrlar uchun: {format_money(debt['totalExtra'])} so'm\n" if debt["totalExtra"] > 0 else "")
             + (f"\nGuruhlar kesimida:\n" + "\n".join(group_lines) + "\n" if group_lines else "")
-            + "\nTo'lov yo'riqnomasi: Payme/Click/Uzum/Paynet -> To'lov izohiga Student_ID ni yozing.\n\n"
-            + ("Yaqin yozuvlar:\n" + "\n\n".join(lines) if lines else "To'lov yozuvlari topilmadi.")
+            + "\nTo'lov yo'riqnomasi: Payme/Click/Uzum/Paynet -> To'lov izohiga Student_ID ni yozing."
         )
         return text
 
@@ -375,9 +322,7 @@ class BotLogic:
             url = url.replace(f"{{{key}}}", value)
         return url
     async def _show_payment_options(self, message: Message, actor: dict, is_parent: bool) -> None:
-        debt = await self._student_debt_summary(actor["student"]["id"])
-        student_code = actor["student"].get("studentCode") or "-"
-        summary_text = self._build_debt_summary_text(debt, student_code)
+        debt = await self.student_debt_summary(actor["student"]["id"])
 
         if debt["totalDebt"] <= 0:
             await message.answer(
@@ -386,7 +331,12 @@ class BotLogic:
             )
             return
 
-        await message.answer(summary_text, reply_markup=parent_menu_keyboard() if is_parent else student_menu_keyboard())
+        # The summary carries the first page of payment records and its ◀️/▶️ buttons.
+        summary_text, history_keyboard = await self._history_view(KIND_PAYMENTS, actor)
+        await message.answer(
+            summary_text,
+            reply_markup=history_keyboard or (parent_menu_keyboard() if is_parent else student_menu_keyboard()),
+        )
         if not debt.get("groups"):
             await message.answer(
                 "Qarzdorlik yozuvi bor, lekin guruh birikmasi topilmadi. Administratorga murojaat qiling.",
@@ -399,71 +349,168 @@ class BotLogic:
             reply_markup=self._payment_scope_keyboard(debt["groups"]),
         )
 
-    async def _show_student_monthly_results(self, message: Message, actor: dict) -> None:
-        now = datetime.now()
-        start = datetime(now.year, now.month, 1)
-        if now.month == 12:
-            end = datetime(now.year + 1, 1, 1)
-        else:
-            end = datetime(now.year, now.month + 1, 1)
-
-        rows = await self.repo.get_student_monthly_submissions(actor["userId"], start, end)
-        if not rows:
-            await message.answer("Bu oy uchun topshirilgan test natijalari topilmadi.", reply_markup=student_menu_keyboard())
-            return
-
-        month_text = f"{now.month:02d}.{now.year}"
-        lines = []
-        for idx, row in enumerate(rows, start=1):
-            lines.append(
-                f"{idx}) {format_date(row['createdAt'])}\n"
-                f"{row['book_title']} | {row['lessonNumber']}-dars | {row['score']}/{row['totalQuestions']}"
-            )
-
-        await message.answer(f"📊 Joriy oy natijalari ({month_text})\n\n" + "\n\n".join(lines), reply_markup=student_menu_keyboard())
+    async def _show_student_results(self, message: Message, actor: dict) -> None:
+        text, keyboard = await self._history_view(KIND_RESULTS, actor)
+        await message.answer(text, reply_markup=keyboard or student_menu_keyboard())
 
-    async def _show_student_payment_info(self, message: Message, actor: dict) -> None:
-        await self._show_payment_options(message, actor, is_parent=False)
-
-    async def _show_parent_debt(self, message: Message, actor: dict) -> None:
-        await self._show_payment_options(message, actor, is_parent=True)
+    @staticmethod
+    def _history_student(actor: dict, child: int) -> Optional[dict]:
+        # Parents page each child separately; the cursor carries the child's position.
+        if actor["type"] != "PARENT":
+            return actor["student"] if child == 0 else None
+        children = actor.get("children") or [actor["student"]]
+        return children[child] if 0 <= child < len(children) else None
 
-    async def _show_parent_results(self, message: Message, actor: dict) -> None:
-        student = actor["student"]
-        tests = []
-        if student.get("userId"):
-            tests = await self.repo.get_parent_recent_submissions(student["userId"])
-
-        journals = await self.repo.get_student_journal_rows(student["id"])
-
-        if tests:
-            test_text = "\n\n".join(
-                f"{idx}) {format_date(row['createdAt'])}\n"
-                f"{row['book_title']} | {row['lessonNumber']}-dars | {row['score']}/{row['totalQuestions']}"
-                for idx, row in enumerate(tests, start=1)
-            )
+    @staticmethod
+    def _history_owner(kind: str, actor: dict, student: dict) -> Optional[str]:
+        if kind == KIND_RESULTS:
+            return actor.get("userId") or student.get("userId")
+        return student["id"]
+
+    async def _history_page(self, kind: str, owner_id: str, cursor: Optional[PageCursor]) -> tuple[HistoryPage, Optional[dict]]:
+        if kind == KIND_RESULTS and cursor is None:
+            # The newest page comes straight from the summary row.
+            summary = await self.repo.get_student_result_summary(owner_id)
+            if not summary:
+                return HistoryPage(rows=[], has_newer=False, has_older=False), None
+            recent = summary["recent"]
+            has_older = len(recent) > PAGE_SIZE or summary["submissionCount"] > PAGE_SIZE
+            return HistoryPage(rows=recent[:PAGE_SIZE], has_newer=False, has_older=has_older), summary
+
+        fetch = {
+            KIND_RESULTS: self.repo.get_student_submission_page,
+            KIND_JOURNAL: self.repo.get_student_journal_rows,
+            KIND_PAYMENTS: self.repo.get_student_payment_page,
+        }[kind]
+        rows = await fetch(
+            owner_id,
+            (cursor.at, cursor.row_id) if cursor else None,
+            cursor.older if cursor else True,
+            PAGE_SIZE + 1,
+        )
+        page = build_page(rows, cursor)
+        if cursor is not None and not cursor.older and not page.has_newer:
+            # Paged back to the top: show a full first page rather than a short one.
+            return await self._history_page(kind, owner_id, None)
+        return page, None
+
+    async def _history_view(
+        self,
+        kind: str,
+        actor: dict,
+        cursor: Optional[PageCursor] = None,
+        child: int = 0,
+    ) -> tuple[str, Optional[InlineKeyboardMarkup]]:
+        if cursor is not None:
+            child = cursor.child
+        # Payments follow the student the payment buttons act on.
+        student = actor["student"] if kind == KIND_PAYMENTS else self._history_student(actor, child)
+        owner_id = self._history_owner(kind, actor, student) if student else None
+        if owner_id:
+            page, summary = await self._history_page(kind, owner_id, cursor)
         else:
-            test_text = "Test natijalari topilmadi."
-
-        if journals:
+            page, summary = HistoryPage(rows=[], has_newer=False, has_older=False), None
+
+        if kind == KIND_RESULTS:
+            header = "📊 Test natijalari"
+            now = datetime.now()
+            month = (summary or {}).get("monthly", {}).get(f"{now.year}-{now.month:02d}")
+            if month and month.get("questions"):
+                header += (
+                    f"\nJoriy oy ({now.month:02d}.{now.year}): {month['count']} ta test | "
+                    f"O'rtacha: {round(100 * month['score'] / month['questions'])}%"
+                )
+            items = [
+                f"{format_date(row['createdAt'])}\n"
+                f"{row['bookTitle']} | {row['lessonNumber']}-dars | {row['score']}/{row['totalQuestions']}"
+                for row in page.rows
+            ]
+            empty = "Test natijalari topilmadi."
+            key = "createdAt"
+        elif kind == KIND_JOURNAL:
+            header = "🧾 Davomat va baholash"
             items = []
-            for idx, row in enumerate(journals, start=1):
+            for row in page.rows:
                 lesson = "-"
                 if row.get("lessonNumber") is not None and row.get("book_title"):
                     lesson = f"{row['book_title']} | {row['lessonNumber']}-dars"
                 items.append(
-                    f"{idx}) {format_date_only(row['journalDate'])} | {row['group_code']}\n"
+                    f"{format_date_only(row['journalDate'])} | {row['group_code']}\n"
                     f"{format_attendance(row['attendance'])}\n"
                     f"Dars: {lesson}\n"
                     f"Nazariy: {row.get('theoryScore') if row.get('theoryScore') is not None else '-'}% | "
                     f"Amaliy: {row.get('practicalScore') if row.get('practicalScore') is not None else '-'}%"
                 )
-            journal_text = "\n\n".join(items)
+            empty = "Davomat/baholash natijalari topilmadi."
+            key = "updatedAt"
         else:
-            journal_text = "Davomat/baholash natijalari topilmadi."
+            # Every page keeps the debt summary above the records (cached per student).
+            header = "💳 To'lov holati"
+            if student:
+                debt = await self.student_debt_summary(student["id"])
+                header = self._build_debt_summary_text(debt, student.get("studentCode") or "-")
+            header += "\n\nTo'lov yozuvlari:"
+            items = []
+            for row in page.rows:
+                net = max(0, int(row["amountRequired"]) - int(row.get("discount") or 0))
+                items.append(
+                    f"{row['month']} | {row.get('group_code') or '-'}\n"
+                    f"Talab: {format_money(net)} | To'langan: {format_money(row['amountPaid'])} | "
+                    f"Qarz: {format_money(max(0, net - int(row['amountPaid'])))}"
+                )
+            empty = "To'lov yozuvlari topilmadi."
+            key = "createdAt"
+
+        if actor["type"] == "PARENT" and student and kind != KIND_PAYMENTS:
+            header += f"\n{student['fullName']}"
+        body = "\n\n".join(f"{idx}) {item}" for idx, item in enumerate(items, start=1)) if items else empty
+        return f"{header}\n\n{body}", page_keyboard(kind, page, key, child)
+
+    async def handle_history_page(self, callback: CallbackQuery) -> None:
+        if not callback.from_user:
+            await callback.answer("Xatolik", show_alert=True)
+            return
+
+        cursor = PageCursor.unpack(callback.data or "")
+        if cursor is None:
+            await callback.answer("Noto'g'ri so'rov", show_alert=True)
+            return
+
+        actor = await self.repo.resolve_actor_by_telegram_user_id(callback.from_user.id)
+        if not actor:
+            await callback.answer("Avval /start qiling", show_alert=True)
+            return
 
-        await message.answer(f"📘 Oxirgi 10 ta test natija\n\n{test_text}", reply_markup=parent_menu_keyboard())
-        await message.answer(f"🧾 Oxirgi 10 ta davomat va baholash\n\n{journal_text}", reply_markup=parent_menu_keyboard())
+        if not callback.message:
+            await callback.answer("Xabar topilmadi", show_alert=True)
+            return
+
+        text, keyboard = await self._history_view(cursor.kind, actor, cursor)
+        try:
+            await callback.message.edit_text(text, reply_markup=keyboard)
+        except TelegramBadRequest as error:
+            # A double tap renders the same page again.
+            if "message is not modified" not in str(error):
+                raise
+        await callback.answer()
+
+    async def _show_student_payment_info(self, message: Message, actor: dict) -> None:
+        await self._show_payment_options(message, actor, is_parent=False)
+
+    async def _show_parent_debt(self, message: Message, actor: dict) -> None:
+        await self._show_payment_options(message, actor, is_parent=True)
+
+    async def _show_parent_results(self, message: Message, actor: dict) -> None:
+        children = actor.get("children") or [actor["student"]]
+        views = await self.repo.gather_reads(
+            *(
+                lambda kind=kind, child=child: self._history_view(kind, actor, child=child)
+                for child in range(len(children))
+                for kind in (KIND_RESULTS, KIND_JOURNAL)
+            )
+        )
+        for text, keyboard in views:
+            await message.answer(text, reply_markup=keyboard or parent_menu_keyboard())
 
     async def _create_appeal_from_student(self, message: Message, actor: dict, text: str) -> bool:
         trimmed = text.strip()
@@ -508,6 +555,12 @@ class BotLogic:
         if not session.active_window_id or not session.active_test_id:
             return False
 
+        if self.journal is not None and self.journal.is_pending(session.active_window_id):
+            # Accepted already; the window row is just not written back yet.
+            self._clear_session(session)
+            await message.answer("Sizda aktiv test yo'q.", reply_markup=student_menu_keyboard())
+            return True
+
         active_window = await self.repo.get_active_window_for_submit(
             window_id=session.active_window_id,
             student_user_id=actor["userId"],
@@ -522,8 +575,11 @@ class BotLogic:
 
         test = active_window["test"]
 
+        total_questions = int(test["totalQuestions"])
+        key = test["compiledKey"]
+
         try:
-            parsed = parse_answer_text(text, int(test["totalQuestions"]))
+            scan = scan_answers(text, total_questions, key)
         except ParseError:
             await message.answer(
                 f"Format xato. Namuna: 1A2B3C...{test['totalQuestions']}B",
@@ -531,68 +587,75 @@ class BotLogic:
             )
             return True
 
-        missing_numbers = [idx + 1 for idx, value in enumerate(parsed["byQuestion"]) if not value]
+        missing_numbers = scan.missing
         if not self.settings.allow_partial_submissions and missing_numbers:
             preview = ", ".join(str(n) for n in missing_numbers[:20])
             suffix = " ..." if len(missing_numbers) > 20 else ""
+            duplicates = ""
+            if scan.duplicates:
+                duplicates = "\nTakrorlangan: " + ", ".join(str(n) for n in scan.duplicates[:20])
             await message.answer(
-                f"Javob to'liq emas. {test['totalQuestions']} ta savolning barchasini kiriting. Yetishmayotgan: {preview}{suffix}",
+                f"Javob to'liq emas. {test['totalQuestions']} ta savolning barchasini kiriting. Yetishmayotgan: {preview}{suffix}{duplicates}",
                 reply_markup=student_menu_keyboard(),
             )
             return True
 
-        key_raw = test["answerKey"]
-        key = key_raw if isinstance(key_raw, list) else json.loads(key_raw)
-
-        score = 0
-        details = []
-        for idx in range(int(test["totalQuestions"])):
-            given = parsed["byQuestion"][idx] or None
-            correct = key[idx] if idx < len(key) else ""
-            is_correct = given == correct
-            if is_correct:
-                score += 1
-            details.append(
-                {
-                    "questionNumber": idx + 1,
-                    "givenAnswer": given,
-                    "correctAnswer": correct,
-                    "isCorrect": is_correct,
-                }
-            )
-
         submitted_at = datetime.utcnow()
-        locked = await self.repo.lock_window_for_submission(
-            window_id=active_window["id"],
-            student_user_id=actor["userId"],
-            test_id=test["id"],
-            submitted_at=submitted_at,
-        )
-        if not locked:
-            self._clear_session(session)
-            await message.answer("Sizda aktiv test yo'q.", reply_markup=student_menu_keyboard())
-            return True
-
-        await self.repo.create_submission_with_details(
-            student_user_id=actor["userId"],
-            test_id=test["id"],
-            raw_answer_text=text,
-            parsed_answers=parsed["byQuestion"],
-            score=score,
-            details=details,
-        )
-
-        if message.chat:
-            for msg_id in session.sent_test_message_ids:
-                try:
-                    await message.bot.delete_message(chat_id=message.chat.id, message_id=msg_id)
-                except Exception:
-                    pass
+        if self.journal is not None:
+            try:
+                await self.journal.submit(
+                    window_id=active_window["id"],
+                    student_user_id=actor["userId"],
+                    test_id=test["id"],
+                    submitted_at=submitted_at,
+                    raw_answer_text=text,
+                    parsed_answers=scan.answers,
+                    score=scan.score,
+                    details=scan.details(key),
+                )
+            except ValueError:
+                self._clear_session(session)
+                await message.answer("Sizda aktiv test yo'q.", reply_markup=student_menu_keyboard())
+                return True
+        else:
+            locked = await self.repo.lock_window_for_submission(
+                window_id=active_window["id"],
+                student_user_id=actor["userId"],
+                test_id=test["id"],
+                submitted_at=submitted_at,
+            )
+            if not locked:
+                self._clear_session(session)
+                await message.answer("Sizda aktiv test yo'q.", reply_markup=student_menu_keyboard())
+                return True
+
+            await self.repo.create_submission_with_details(
+                student_user_id=actor["userId"],
+                test_id=test["id"],
+                raw_answer_text=text,
+                parsed_answers=scan.answers,
+                score=scan.score,
+                details=scan.details(key),
+            )
 
+        sent_message_ids = list(session.sent_test_message_ids)
         self._clear_session(session)
         await message.answer("Qabul qilindi ✅", reply_markup=student_menu_keyboard())
+
+        if message.chat and sent_message_ids:
+            await self._cleanup_test_messages(message, sent_message_ids)
         return True
 
+    async def _cleanup_test_messages(self, message: Message, message_ids: list[int]) -> None:
+        if self.cleanup is not None:
+            self.cleanup.schedule(message.chat.id, message_ids)
+            return
+
+        try:
+            await message.bot.delete_messages(chat_id=message.chat.id, message_ids=message_ids)
+        except Exception as error:
+            print("MESSAGE_CLEANUP_ERROR", error)
+
     async def handle_text(self, message: Message) -> None:
         if not message.from_user or not message.text:
             return
@@ -629,7 +692,7 @@ class BotLogic:
 
             if text == STUDENT_BTN_RESULTS:
                 session.awaiting_appeal = False
-                await self._show_student_monthly_results(message, actor)
+                await self._show_student_results(message, actor)
                 return
 
             if text == STUDENT_BTN_PAY:
@@ -803,7 +866,7 @@ class BotLogic:
         scope = parts[1]
         group_id = parts[2] if scope == "g" and len(parts) >= 3 else ""
 
-        debt = await self._student_debt_summary(actor["student"]["id"])
+        debt = await self.student_debt_summary(actor["student"]["id"])
         groups = debt.get("groups", [])
         if debt["totalDebt"] <= 0 or not groups:
             await callback.answer("Qarzdorlik topilmadi", show_alert=True)
@@ -856,7 +919,7 @@ class BotLogic:
             await callback.answer("Provider noto'g'ri", show_alert=True)
             return
 
-        debt = await self._student_debt_summary(actor["student"]["id"])
+        debt = await self.student_debt_summary(actor["student"]["id"])
         groups = debt.get("groups", [])
         if debt["totalDebt"] <= 0 or not groups:
             await callback.answer("Qarzdorlik topilmadi", show_alert=True)
@@ -886,6 +949,8 @@ class BotLogic:
             amount=amount,
             group_id=selected_group_id,
             note=f"Bot checkout | source=telegram | scope={selected_group_code}",
+            reuse_since=datetime.utcnow() - timedelta(minutes=self.settings.payment_checkout_ttl_minutes),
+            telegram_chat_id=callback.message.chat.id if callback.message else callback.from_user.id,
         )
 
         url = self._build_provider_payment_url(provider, checkout)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import time
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+from db.invalidation import InvalidationBus, InvalidationEvent
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LruCache(Generic[K, V]):
+    """Least-recently-used cache bounded by entry count and, optionally, by total size."""
+
+    def __init__(
+        self,
+        max_items: int,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[V], int]] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        # Bumped by every invalidation. put(..., generation=g) is dropped when its key was
+        # popped, or the cache cleared, after g was read, so a value read before an
+        # invalidation cannot be cached after it; other keys are unaffected.
+        self.generation = 0
+        self._cleared_at = 0
+        self._popped_at: dict[K, int] = {}
+        self._sizeof = sizeof or (lambda _value: 0)
+        self._items: "OrderedDict[K, tuple[V, int, float]]" = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key: K) -> bool:
+        return self.peek(key) is not None
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def peek(self, key: K) -> Optional[V]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        if item[2] and item[2] < time.monotonic():
+            self._discard(key)
+            return None
+        return item[0]
+
+    def get(self, key: K) -> Optional[V]:
+        value = self.peek(key)
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: K, value: V, generation: Optional[int] = None) -> None:
+        if generation is not None and (generation < self._cleared_at or self._popped_at.get(key, -1) > generation):
+            return
+        size = self._sizeof(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+
+        self._discard(key)
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        self._items[key] = (value, size, expires_at)
+        self._bytes += size
+
+        while len(self._items) > self.max_items or (self.max_bytes and self._bytes > self.max_bytes):
+            _key, (_value, old_size, _expires) = self._items.popitem(last=False)
+            self._bytes -= old_size
+            self.stats.evictions += 1
+
+    def pop(self, key: K) -> Optional[V]:
+        self.generation += 1
+        if len(self._popped_at) >= self.max_items:
+            # Bound the bookkeeping; only puts already in flight are refused.
+            self._popped_at.clear()
+            self._cleared_at = self.generation
+        self._popped_at[key] = self.generation
+        return self._discard(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._cleared_at = self.generation
+        self._popped_at.clear()
+        self._items.clear()
+        self._bytes = 0
+
+    def _discard(self, key: K) -> Optional[V]:
+        item = self._items.pop(key, None)
+        if item is None:
+            return None
+        self._bytes -= item[1]
+        return item[0]
+
+
+@dataclass
+class BotCaches:
+    """In-process read caches shared by the repository, the handlers and the warm-up job.
+
+    With an invalidation bus attached entries live until a row change evicts them;
+    without one they expire after ``fallback_ttl`` seconds.
+    """
+
+    max_actors: int = 10_000
+    max_tests: int = 256
+    max_images: int = 4096
+    max_image_bytes: int = 64 * 1024 * 1024
+    max_debts: int = 10_000
+    fallback_ttl: float = 30.0
+    # Debt also grows with the calendar, so it never lives longer than this.
+    debt_ttl: float = 600.0
+    actors: LruCache[int, dict] = field(init=False)
+    tests: LruCache[str, dict] = field(init=False)
+    image_file_ids: LruCache[str, str] = field(init=False)
+    image_bytes: LruCache[str, bytes] = field(init=False)
+    debts: LruCache[str, dict] = field(init=False)
+
+    def __post_init__(self) -> None:
+        self._build(self.fallback_ttl)
+
+    def _build(self, ttl: Optional[float]) -> None:
+        self.actors = LruCache(self.max_actors, ttl=ttl)
+        self.tests = LruCache(self.max_tests, ttl=ttl)
+        # Keyed by image URL and evicted when a TestImage row with that URL changes.
+        self.image_file_ids = LruCache(self.max_images, ttl=ttl)
+        self.image_bytes = LruCache(self.max_images, max_bytes=self.max_image_bytes, sizeof=len, ttl=ttl)
+        # Keyed by Student id.
+        self.debts = LruCache(self.max_debts, ttl=min(ttl or self.debt_ttl, self.debt_ttl))
+
+    def attach(self, bus: InvalidationBus) -> None:
+        self._build(None)
+        bus.subscribe("BotActor", self._on_actor)
+        bus.subscribe("Test", self._on_test)
+        bus.subscribe("TestImage", self._on_test_image)
+        bus.subscribe("Payment", self._on_payment)
+        bus.subscribe("GroupCatalog", self._on_group)
+        bus.on_flush(self.clear)
+
+    def clear(self) -> None:
+        self.actors.clear()
+        self.tests.clear()
+        self.image_file_ids.clear()
+        self.image_bytes.clear()
+        self.debts.clear()
+
+    def _on_actor(self, event: InvalidationEvent) -> None:
+        telegram_user_id = event.get("telegramUserId")
+        if telegram_user_id is None:
+            self.actors.clear()
+            return
+        self.actors.pop(int(telegram_user_id))
+
+    def _on_test(self, event: InvalidationEvent) -> None:
+        if event.row_id is None:
+            self.tests.clear()
+            return
+        self.tests.pop(event.row_id)
+
+    def _on_test_image(self, event: InvalidationEvent) -> None:
+        test_id = event.get("testId")
+        image_url = event.get("imageUrl")
+        if test_id is None:
+            self.tests.clear()
+        else:
+            self.tests.pop(test_id)
+        if image_url is not None:
+            self.image_file_ids.pop(image_url)
+            self.image_bytes.pop(image_url)
+
+    def _on_payment(self, event: InvalidationEvent) -> None:
+        student_id = event.get("studentId")
+        if student_id is None:
+            self.debts.clear()
+            return
+        self.debts.pop(student_id)
+
+    def _on_group(self, _event: InvalidationEvent) -> None:
+        # Group status and price feed every member's extra debt.
+        self.debts.clear()
+
+    def report(self) -> dict[str, Any]:
+        return {
+            name: {
+                "items": len(cache),
+                "bytes": cache.size_bytes,
+                "hitRate": round(cache.stats.hit_rate, 3),
+                "evictions": cache.stats.evictions,
+            }
+            for name, cache in (
+                ("actors", self.actors),
+                ("tests", self.tests),
+                ("imageFileIds", self.image_file_ids),
+                ("imageBytes", self.image_bytes),
+                ("debts", self.debts),
+            )
+        }
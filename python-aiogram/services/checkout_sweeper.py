@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from db.repository import BotRepository
+
+
+@dataclass
+class SweepStats:
+    runs: int = 0
+    expired: int = 0
+
+
+class CheckoutSweeper:
+    """Marks PENDING PaymentCheckout rows older than ``ttl`` as EXPIRED in bulk.
+
+    Rows are only re-labelled, not deleted: a provider callback that arrives late still
+    finds its checkout. Each pass updates ``batch_size`` rows per statement until none
+    are left.
+    """
+
+    def __init__(
+        self,
+        repo: BotRepository,
+        ttl: timedelta,
+        interval_seconds: float = 300.0,
+        batch_size: int = 1000,
+    ) -> None:
+        self.repo = repo
+        self.ttl = ttl
+        self.interval = interval_seconds
+        self.batch_size = batch_size
+        self.stats = SweepStats()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                expired = await self.run_once()
+                if expired:
+                    print("CHECKOUT_SWEEP", "expired", expired)
+            except Exception as error:
+                print("CHECKOUT_SWEEP_ERROR", error)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        cutoff = (now or datetime.utcnow()) - self.ttl
+        total = 0
+        while True:
+            expired = await self.repo.expire_payment_checkouts(cutoff, self.batch_size)
+            total += expired
+            if expired < self.batch_size:
+                break
+        self.stats.runs += 1
+        self.stats.expired += total
+        return total
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from datetime import date
+
+from services.formatters import add_months_keeping_day
+
+
+def summarize_debt(rows: list[dict], today: date) -> dict:
+    latest_by_group: dict[str, dict] = {}
+    groups_map: dict[str, dict] = {}
+    total_base = 0
+
+    for row in rows:
+        base_debt = max(0, int(row["amountRequired"]) - int(row.get("discount") or 0) - int(row["amountPaid"]))
+        total_base += base_debt
+
+        group_id = row.get("groupId")
+        group_code = row.get("group_code") or "-"
+        if group_id:
+            group_item = groups_map.get(group_id)
+            if not group_item:
+                group_item = {
+                    "groupId": group_id,
+                    "groupCode": group_code,
+                    "baseDebt": 0,
+                    "extraDebt": 0,
+                    "totalDebt": 0,
+                }
+                groups_map[group_id] = group_item
+            group_item["baseDebt"] += base_debt
+
+        period_end = row.get("periodEnd")
+        if not group_id or not period_end:
+            continue
+
+        previous = latest_by_group.get(group_id)
+        if not previous or previous["periodEnd"] < period_end:
+            latest_by_group[group_id] = row
+
+    total_extra = 0
+    for group_id, latest in latest_by_group.items():
+        group_status = latest.get("group_status")
+        group_price = latest.get("group_price")
+        period_end = latest.get("periodEnd")
+        if group_status != "OCHIQ" or not group_price or not period_end:
+            continue
+
+        end_date = period_end.date()
+        if today <= end_date:
+            continue
+
+        periods = 0
+        cursor = end_date
+        while cursor <= today:
+            periods += 1
+            cursor = add_months_keeping_day(end_date, periods)
+
+        extra_debt = periods * int(group_price)
+        total_extra += extra_debt
+
+        group_item = groups_map.get(group_id)
+        if group_item:
+            group_item["extraDebt"] += extra_debt
+
+    groups: list[dict] = []
+    for group in groups_map.values():
+        total = int(group["baseDebt"]) + int(group["extraDebt"])
+        if total <= 0:
+            continue
+        group["totalDebt"] = total
+        groups.append(group)
+
+    groups.sort(key=lambda item: item["totalDebt"], reverse=True)
+
+    return {
+        "totalDebt": total_base + total_extra,
+        "totalBase": total_base,
+        "totalExtra": total_extra,
+        "groups": groups,
+    }
@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import hashlib
+import io
+import os
+from pathlib import Path
+import time
+from typing import Any, Optional
+from urllib.parse import urlparse
+
+from PIL import Image, ImageOps
+
+from db.invalidation import InvalidationBus, InvalidationEvent
+from services.cache import BotCaches
+
+
+def default_image_roots() -> list[Path]:
+    """Where the web app's public directory lives: next to this repo or the working directory."""
+    return [
+        Path(__file__).resolve().parents[2] / "apps" / "web" / "public",
+        Path.cwd() / "apps" / "web" / "public",
+    ]
+
+
+def resolve_local_image_path(image_url: str, roots: list[Path]) -> Optional[Path]:
+    """Map a TestImage URL (relative or absolute) to a file under one of ``roots``."""
+    raw = image_url.strip()
+    rel = raw.lstrip("/")
+    if raw.lower().startswith(("http://", "https://")):
+        try:
+            rel = urlparse(raw).path.lstrip("/")
+        except Exception:
+            return None
+    if not rel:
+        return None
+
+    for root in roots:
+        candidate = root / rel
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def encode_page(data: bytes, max_side: int, quality: int) -> bytes:
+    """Re-encode a test page as a JPEG no larger than ``max_side`` on its long edge.
+
+    Grayscale scans stay single-channel; transparency is flattened onto white. If the
+    result is not smaller than an original JPEG that already fits, the original wins.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        original_format = source.format
+        image = ImageOps.exif_transpose(source)
+        fits = max(image.size) <= max_side
+
+        if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=quality, optimize=True, progressive=True)
+
+    encoded = out.getvalue()
+    if original_format == "JPEG" and fits and len(encoded) >= len(data):
+        return data
+    return encoded
+
+
+@dataclass
+class ImageStats:
+    loads: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    encoded: int = 0
+    missing: int = 0
+    errors: int = 0
+    original_bytes: int = 0
+    encoded_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return (self.memory_hits + self.disk_hits) / self.loads if self.loads else 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.encoded_bytes
+
+
+class ImagePipeline:
+    """Loads test pages as Telegram-sized JPEG bytes.
+
+    Local paths are resolved once per image URL; a miss is remembered for
+    ``miss_ttl`` seconds, or until the TestImage row changes. Encoded bytes live in
+    ``BotCaches.image_bytes`` (size-bounded LRU, evicted with TestImage changes) and,
+    when ``disk_dir`` is set, in a disk cache keyed by the source file's size and
+    mtime plus the encoding settings, pruned oldest-first above ``disk_max_bytes``.
+    Encoding runs in a worker thread.
+    """
+
+    def __init__(
+        self,
+        caches: BotCaches,
+        roots: Optional[list[Path]] = None,
+        max_side: int = 2048,
+        quality: int = 85,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024,
+        miss_ttl: float = 60.0,
+    ) -> None:
+        self.caches = caches
+        self.roots = roots if roots is not None else default_image_roots()
+        self.max_side = max_side
+        self.quality = quality
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.miss_ttl = miss_ttl
+        self.stats = ImageStats()
+        self._paths: dict[str, Path] = {}
+        self._misses: dict[str, float] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def attach(self, bus: InvalidationBus) -> None:
+        bus.subscribe("TestImage", self._on_test_image)
+        bus.on_flush(self._clear_paths)
+
+    def _on_test_image(self, event: InvalidationEvent) -> None:
+        image_url = event.get("imageUrl")
+        if image_url is None:
+            self._clear_paths()
+            return
+        self.forget(image_url)
+
+    def _clear_paths(self) -> None:
+        self._paths.clear()
+        self._misses.clear()
+
+    def local_path(self, image_url: str) -> Optional[Path]:
+        path = self._paths.get(image_url)
+        if path is not None:
+            return path
+        now = time.monotonic()
+        missed_at = self._misses.get(image_url)
+        if missed_at is not None and now - missed_at < self.miss_ttl:
+            return None
+
+        path = resolve_local_image_path(image_url, self.roots)
+        if path is None:
+            # Short-lived, so a page uploaded after its first miss is still found.
+            self._misses[image_url] = now
+        else:
+            self._misses.pop(image_url, None)
+            self._paths[image_url] = path
+        return path
+
+    def forget(self, image_url: str) -> None:
+        self._paths.pop(image_url, None)
+        self._misses.pop(image_url, None)
+        self.caches.image_bytes.pop(image_url)
+
+    async def load(self, image_url: str) -> Optional[bytes]:
+        """Encoded bytes for a local image, or None when it is not on this host."""
+        self.stats.loads += 1
+        data = self.caches.image_bytes.get(image_url)
+        if data is not None:
+            self.stats.memory_hits += 1
+            return data
+
+        # Concurrent first sends of the same page share one read + encode.
+        pending = self._inflight.get(image_url)
+        if pending is not None:
+            self.stats.memory_hits += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[image_url] = future
+        try:
+            data = await self._load(image_url)
+            future.set_result(data)
+            return data
+        except BaseException as error:
+            future.set_exception(error)
+            # Nobody else may be waiting; don't log "exception was never retrieved".
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(image_url, None)
+
+    async def _load(self, image_url: str) -> Optional[bytes]:
+        generation = self.caches.image_bytes.generation
+        path = self.local_path(image_url)
+        if path is None:
+            self.stats.missing += 1
+            return None
+
+        try:
+            data, original_size = await asyncio.to_thread(self._read_encoded, path)
+        except FileNotFoundError:
+            # Moved or deleted since it was resolved; look it up again next time.
+            self._paths.pop(image_url, None)
+            self.stats.missing += 1
+            return None
+        except Exception as error:
+            self.stats.errors += 1
+            print("IMAGE_ENCODE_ERROR", image_url, error)
+            data = await asyncio.to_thread(path.read_bytes)
+            self.caches.image_bytes.put(image_url, data, generation=generation)
+            return data
+
+        if original_size is None:
+            self.stats.disk_hits += 1
+        else:
+            self.stats.encoded += 1
+            self.stats.original_bytes += original_size
+            self.stats.encoded_bytes += len(data)
+        self.caches.image_bytes.put(image_url, data, generation=generation)
+        return data
+
+    def _disk_key(self, path: Path, stat: os.stat_result) -> str:
+        raw = f"{path}|{stat.st_size}|{stat.st_mtime_ns}|{self.max_side}|{self.quality}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest() + ".jpg"
+
+    def _read_encoded(self, path: Path) -> tuple[bytes, Optional[int]]:
+        """Encoded bytes and the source size; the size is None for a disk cache hit.
+
+        Runs in a worker thread, so it leaves ``stats`` to the caller.
+        """
+        stat = path.stat()
+        cached_file = self.disk_dir / self._disk_key(path, stat) if self.disk_dir is not None else None
+        if cached_file is not None:
+            try:
+                data = cached_file.read_bytes()
+                os.utime(cached_file)
+                return data, None
+            except FileNotFoundError:
+                pass
+
+        original = path.read_bytes()
+        data = encode_page(original, self.max_side, self.quality)
+
+        if cached_file is not None:
+            tmp = cached_file.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, cached_file)
+            self._prune_disk()
+        return data, len(original)
+
+    def _prune_disk(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.disk_dir) as scan:
+            for entry in scan:
+                if entry.is_file() and entry.name.endswith(".jpg"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.disk_max_bytes:
+            return
+        for _mtime, size, file_path in sorted(entries):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.disk_max_bytes:
+                break
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "loads": self.stats.loads,
+            "hitRate": round(self.stats.hit_rate, 3),
+            "memoryHits": self.stats.memory_hits,
+            "diskHits": self.stats.disk_hits,
+            "encoded": self.stats.encoded,
+            "missing": self.stats.missing,
+            "errors": self.stats.errors,
+            "bytesSaved": self.stats.bytes_saved,
+            "memoryBytes": self.caches.image_bytes.size_bytes,
+        }
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Optional
+
+
+# Upper bounds (ms) of the lag histogram buckets; the last bucket is unbounded.
+LAG_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_HANDLE_RUN = asyncio.Handle._run.__code__
+
+
+@dataclass
+class LagHistogram:
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LAG_BUCKETS_MS) + 1))
+    total: int = 0
+    sum_ms: float = 0.0
+    max_ms: float = 0.0
+
+    def observe(self, lag_ms: float) -> None:
+        index = 0
+        while index < len(LAG_BUCKETS_MS) and lag_ms > LAG_BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile (``max_ms`` for the last one)."""
+        if not self.total:
+            return 0.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= q * self.total:
+                return float(LAG_BUCKETS_MS[index]) if index < len(LAG_BUCKETS_MS) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def snapshot(self) -> dict[str, Any]:
+        # Cumulative, Prometheus style: "25" is the number of samples with lag <= 25ms.
+        buckets: dict[str, int] = {}
+        seen = 0
+        for bound, count in zip([*map(str, LAG_BUCKETS_MS), "+Inf"], self.counts):
+            seen += count
+            buckets[bound] = seen
+        return {
+            "count": self.total,
+            "avgMs": round(self.sum_ms / self.total, 2) if self.total else 0.0,
+            "p50Ms": self.quantile(0.5),
+            "p99Ms": self.quantile(0.99),
+            "maxMs": round(self.max_ms, 1),
+            "buckets": buckets,
+        }
+
+
+@dataclass
+class _Stall:
+    task: str
+    stack: list[str]
+
+
+class LoopMonitor:
+    """Measures event-loop scheduling lag and, optionally, reports what blocked the loop.
+
+    Every ``interval`` seconds a probe sleeps and records how late it woke up in a
+    histogram, printed as ``LOOP_LAG`` every ``report_interval`` seconds (the window
+    since the previous line) and returned whole by ``report()``.
+
+    With ``report_blocking`` (debug mode), a watchdog thread also pings the loop with
+    ``call_soon_threadsafe``. When a ping is not answered within ``block_threshold``,
+    it captures the loop thread's stack and current task while the blocking code is
+    still running, and ``LOOP_BLOCKED`` is printed with them once the loop gets back
+    to the ping.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        block_threshold: float = 0.1,
+        report_interval: float = 60.0,
+        report_blocking: bool = False,
+    ) -> None:
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.report_interval = report_interval
+        self.report_blocking = report_blocking
+        self.histogram = LagHistogram()
+        self.window = LagHistogram()
+        self.blocked = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._ping_sent: Optional[float] = None
+        self._stall: Optional[_Stall] = None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._task = asyncio.create_task(self._probe())
+        if self.report_blocking:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+
+    async def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_report = loop.time() + self.report_interval
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            now = loop.time()
+            lag_ms = max(0.0, now - expected) * 1000
+            self.histogram.observe(lag_ms)
+            self.window.observe(lag_ms)
+            if now >= next_report:
+                print("LOOP_LAG", self.window.snapshot())
+                self.window = LagHistogram()
+                next_report = now + self.report_interval
+
+    def _watch(self) -> None:
+        check = min(self.block_threshold / 4, 0.05)
+        while not self._stop.wait(check):
+            with self._lock:
+                sent = self._ping_sent
+                if sent is None:
+                    self._ping_sent = time.monotonic()
+                elif self._stall is None and time.monotonic() - sent > self.block_threshold:
+                    self._stall = self._capture()
+            if sent is None:
+                try:
+                    self._loop.call_soon_threadsafe(self._pong)
+                except RuntimeError:
+                    # Loop closed during shutdown.
+                    return
+
+    def _capture(self) -> _Stall:
+        # Innermost frames up to the asyncio Handle running the callback or task step.
+        frames = []
+        frame = sys._current_frames().get(self._loop_thread_id)
+        while frame is not None and frame.f_code is not _HANDLE_RUN and len(frames) < 40:
+            frames.append((frame, frame.f_lineno))
+            frame = frame.f_back
+        stack = traceback.format_list(traceback.StackSummary.extract(reversed(frames)))
+        # Read-only peek at the loop's running task from another thread.
+        current = getattr(asyncio.tasks, "_current_tasks", {}).get(self._loop)
+        if current is None:
+            task = "callback"
+        else:
+            coro = current.get_coro()
+            task = f"{current.get_name()} {getattr(coro, '__qualname__', coro)}"
+        return _Stall(task=task, stack=stack)
+
+    def _pong(self) -> None:
+        with self._lock:
+            sent, stall = self._ping_sent, self._stall
+            self._ping_sent = None
+            self._stall = None
+        if stall is None or sent is None:
+            return
+        self.blocked += 1
+        blocked_ms = round((time.monotonic() - sent) * 1000, 1)
+        print("LOOP_BLOCKED", {"ms": blocked_ms, "task": stall.task}, "\n" + "".join(stall.stack).rstrip())
+
+    def report(self) -> dict[str, Any]:
+        return {**self.histogram.snapshot(), "blocked": self.blocked}
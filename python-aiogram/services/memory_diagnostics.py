@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+from collections import Counter
+import gc
+import os
+import tracemalloc
+from typing import Any, Optional, Sequence
+
+import asyncpg
+
+from services.cache import BotCaches
+from services.session_store import SessionStore
+from services.types import SessionState
+
+
+# Allocations by tracemalloc, these diagnostics and the import system are noise.
+# They are dropped from the per-line statistics rather than with
+# Snapshot.filter_traces(), which costs seconds on a large heap.
+_IGNORED_FILES = (
+    tracemalloc.__file__,
+    __file__,
+    "<frozen importlib._bootstrap>",
+    "<frozen importlib._bootstrap_external>",
+    "<unknown>",
+)
+# Telegram rejects longer messages.
+MAX_REPLY_CHARS = 4000
+
+
+def _size(value: float) -> str:
+    if abs(value) < 1024:
+        return f"{int(value)} B"
+    for unit in ("KiB", "MiB"):
+        value /= 1024
+        if abs(value) < 1024:
+            return f"{value:.1f} {unit}"
+    return f"{value / 1024:.1f} GiB"
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class MemoryDiagnostics:
+    """On-demand memory inspection for the long-running bot process.
+
+    Nothing runs until asked: tracemalloc is started by ``start()`` and stopped
+    again by ``stop()``, so the process pays for it only while it is on. ``snapshot()``
+    reports the top allocating lines and what changed since the previous
+    snapshot; ``diff()`` compares a fresh snapshot with the first one taken since
+    ``start()`` to show slow growth. ``status()`` needs no tracing and reports RSS,
+    the session store, live ``SessionState`` objects, the most common object types
+    and the bot's caches, including asyncpg's per-connection statement caches.
+    """
+
+    def __init__(
+        self,
+        sessions: SessionStore,
+        caches: Optional[BotCaches] = None,
+        pools: Sequence[asyncpg.Pool] = (),
+        storage: Any = None,
+        top: int = 10,
+    ) -> None:
+        self.sessions = sessions
+        self.caches = caches
+        self.pools = list(pools)
+        self.storage = storage
+        self.top = top
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._signal_task: Optional[asyncio.Task] = None
+
+    def on_signal(self) -> None:
+        # SIGUSR1: print a snapshot (or the status while tracemalloc is off) to the log.
+        if self._signal_task is None or self._signal_task.done():
+            self._signal_task = asyncio.get_running_loop().create_task(self._print_report())
+
+    async def _print_report(self) -> None:
+        print("MEMORY", await self.command("snapshot" if tracemalloc.is_tracing() else "status"))
+
+    async def command(self, args: str) -> str:
+        """``/memory [status|start|snapshot|diff|stop]``; returns the reply text."""
+        action = (args.split() or ["status"])[0]
+        if action == "start":
+            text = self.start()
+        elif action == "stop":
+            text = self.stop()
+        elif action == "snapshot":
+            text = await asyncio.to_thread(self.snapshot)
+        elif action == "diff":
+            text = await asyncio.to_thread(self.diff)
+        elif action == "status":
+            text = await asyncio.to_thread(self.status)
+        else:
+            text = "Foydalanish: /memory status | start | snapshot | diff | stop"
+        return text if len(text) <= MAX_REPLY_CHARS else text[: MAX_REPLY_CHARS - 3] + "..."
+
+    def start(self) -> str:
+        if not tracemalloc.is_tracing():
+            # One frame is all "file:line" statistics use; more only slows snapshots.
+            tracemalloc.start(1)
+            self._baseline = None
+            self._previous = None
+        return "tracemalloc yoqilgan"
+
+    def stop(self) -> str:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._baseline = None
+        self._previous = None
+        return "tracemalloc o'chirilgan"
+
+    def _take(self) -> tracemalloc.Snapshot:
+        snapshot = tracemalloc.take_snapshot()
+        if self._baseline is None:
+            self._baseline = snapshot
+        return snapshot
+
+    def snapshot(self) -> str:
+        if not tracemalloc.is_tracing():
+            return "tracemalloc o'chirilgan: avval /memory start"
+        snapshot = self._take()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"traced {_size(current)} (peak {_size(peak)})", "Top allocators:"]
+        for stat in self._top(snapshot.statistics("lineno")):
+            frame = stat.traceback[0]
+            lines.append(f"{_size(stat.size)} n={stat.count} {frame.filename}:{frame.lineno}")
+        if self._previous is not None:
+            lines.append("Since previous snapshot:")
+            lines.extend(self._compare(snapshot, self._previous))
+        self._previous = snapshot
+        return "\n".join(lines)
+
+    def diff(self) -> str:
+        if not tracemalloc.is_tracing():
+            return "tracemalloc o'chirilgan: avval /memory start"
+        if self._baseline is None:
+            self._take()
+            return "Baseline olindi; keyinroq /memory diff"
+        baseline = self._baseline
+        snapshot = self._take()
+        self._previous = snapshot
+        return "\n".join(["Since baseline:", *self._compare(snapshot, baseline)])
+
+    def _top(self, stats: list) -> list:
+        return [stat for stat in stats if stat.traceback[0].filename not in _IGNORED_FILES][: self.top]
+
+    def _compare(self, snapshot: tracemalloc.Snapshot, older: tracemalloc.Snapshot) -> list[str]:
+        lines = []
+        for stat in self._top(snapshot.compare_to(older, "lineno")):
+            if not stat.size_diff and not stat.count_diff:
+                break
+            frame = stat.traceback[0]
+            lines.append(
+                f"{'+' if stat.size_diff >= 0 else ''}{_size(stat.size_diff)} "
+                f"n={stat.count_diff:+d} {frame.filename}:{frame.lineno}"
+            )
+        return lines or ["o'zgarish yo'q"]
+
+    def status(self) -> str:
+        rss = _rss_bytes()
+        # Only objects tracked by the GC (containers, instances), which is where leaks live.
+        types: Counter = Counter(map(type, gc.get_objects()))
+        session_states = types[SessionState]
+
+        lines = [
+            f"RSS {_size(rss) if rss is not None else '?'}",
+            f"tracemalloc {'on' if tracemalloc.is_tracing() else 'off'}",
+            f"sessions {len(self.sessions)} | SessionState live {session_states}",
+            f"gc counts {gc.get_count()}",
+        ]
+        if self.storage is not None and isinstance(getattr(self.storage, "storage", None), dict):
+            lines.append(f"FSM storage keys {len(self.storage.storage)}")
+        if self.caches is not None:
+            for name, cache in self.caches.report().items():
+                lines.append(f"cache {name}: {cache['items']} items, {_size(cache['bytes'])}")
+        for index, pool in enumerate(self.pools):
+            statements = 0
+            for holder in getattr(pool, "_holders", ()):
+                connection = getattr(holder, "_con", None)
+                cache = getattr(connection, "_stmt_cache", None)
+                if cache is not None:
+                    statements += len(cache)
+            lines.append(f"pool {index}: {pool.get_size()} conns, {statements} cached statements")
+        lines.append("Top types:")
+        lines.extend(f"{count} {kind.__module__}.{kind.__qualname__}" for kind, count in types.most_common(self.top))
+        return "\n".join(lines)
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from db.repository import BotRepository
+
+
+# deleteMessages accepts at most 100 ids per call.
+_DELETE_CHUNK = 100
+
+
+@dataclass
+class CleanupStats:
+    scheduled: int = 0
+    deleted: int = 0
+    retried: int = 0
+    dropped: int = 0
+
+
+class MessageCleanupWorker:
+    """Deletes test messages in the background from the persisted "MessageCleanup" queue.
+
+    ``schedule`` only queues in memory; the worker inserts the row, and deletes the
+    messages right away if the insert fails. Each row is removed with bulk
+    deleteMessages calls. Transient failures are
+    retried with exponential backoff (or after Telegram's retry_after); rows are dropped
+    once Telegram refuses the delete, after ``max_attempts`` or when the messages are
+    older than ``max_age`` (bots cannot delete messages older than 48 hours).
+    """
+
+    def __init__(
+        self,
+        repo: BotRepository,
+        bot: Bot,
+        max_attempts: int = 6,
+        base_delay: float = 5.0,
+        max_age: timedelta = timedelta(hours=47),
+        poll_interval: float = 60.0,
+        batch_size: int = 100,
+    ) -> None:
+        self.repo = repo
+        self.bot = bot
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_age = max_age
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.stats = CleanupStats()
+        self._incoming: list[tuple[int, list[int]]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def schedule(self, chat_id: int, message_ids: list[int]) -> None:
+        if not message_ids:
+            return
+        self._incoming.append((chat_id, list(message_ids)))
+        self.stats.scheduled += 1
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._persist_incoming()
+
+    async def _persist_incoming(self) -> None:
+        incoming, self._incoming = self._incoming, []
+        for chat_id, message_ids in incoming:
+            try:
+                await self.repo.enqueue_message_cleanup(chat_id, message_ids)
+                continue
+            except Exception as error:
+                print("MESSAGE_CLEANUP_SCHEDULE_ERROR", error)
+
+            try:
+                for idx in range(0, len(message_ids), _DELETE_CHUNK):
+                    await self.bot.delete_messages(chat_id=chat_id, message_ids=message_ids[idx : idx + _DELETE_CHUNK])
+                self.stats.deleted += len(message_ids)
+            except Exception as error:
+                self.stats.dropped += 1
+                print("MESSAGE_CLEANUP_ERROR", error)
+
+    async def _loop(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                await self._persist_incoming()
+                delay = await self.run_once()
+            except Exception as error:
+                print("MESSAGE_CLEANUP_ERROR", error)
+                delay = self.poll_interval
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self, now: Optional[datetime] = None) -> float:
+        """Process due rows; returns seconds until the next row is due."""
+        now = now or datetime.utcnow()
+        rows = await self.repo.get_due_message_cleanups(now, self.batch_size)
+        for row in rows:
+            await self._process(row, now)
+        if len(rows) >= self.batch_size:
+            return 0.0
+
+        next_at = await self.repo.get_next_message_cleanup_at()
+        if next_at is None:
+            return self.poll_interval
+        return min(max((next_at - datetime.utcnow()).total_seconds(), 0.0), self.poll_interval)
+
+    async def _process(self, row: dict, now: datetime) -> None:
+        chat_id = int(row["chatId"])
+        message_ids = list(row["messageIds"])
+
+        if now - row["createdAt"] > self.max_age:
+            await self._drop(row, "too old to delete")
+            return
+
+        try:
+            for idx in range(0, len(message_ids), _DELETE_CHUNK):
+                await self.bot.delete_messages(chat_id=chat_id, message_ids=message_ids[idx : idx + _DELETE_CHUNK])
+        except TelegramRetryAfter as error:
+            await self._retry(row, now + timedelta(seconds=error.retry_after), error)
+            return
+        except (TelegramBadRequest, TelegramForbiddenError) as error:
+            await self._drop(row, str(error))
+            return
+        except Exception as error:
+            if int(row["attempts"]) + 1 >= self.max_attempts:
+                await self._drop(row, str(error))
+            else:
+                await self._retry(row, now + timedelta(seconds=self.base_delay * 2 ** int(row["attempts"])), error)
+            return
+
+        await self.repo.finish_message_cleanup(row["id"])
+        self.stats.deleted += len(message_ids)
+
+    async def _retry(self, row: dict, next_attempt_at: datetime, error: Exception) -> None:
+        self.stats.retried += 1
+        await self.repo.retry_message_cleanup(row["id"], next_attempt_at, str(error))
+
+    async def _drop(self, row: dict, reason: str) -> None:
+        self.stats.dropped += 1
+        print("MESSAGE_CLEANUP_DROPPED", row["chatId"], list(row["messageIds"]), reason)
+        await self.repo.finish_message_cleanup(row["id"])
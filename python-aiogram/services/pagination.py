@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+PAGE_SIZE = 10
+
+# History kinds in callback data: test results, journal entries, payment records.
+KIND_RESULTS = "r"
+KIND_JOURNAL = "j"
+KIND_PAYMENTS = "p"
+HISTORY_KINDS = (KIND_RESULTS, KIND_JOURNAL, KIND_PAYMENTS)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    """Keyset position carried in callback data: ``hist:<kind>:<child>:<o|n>:<microseconds>:<id>``.
+
+    ``older`` pages continue after (at, row_id); newer ones stop before it. ``child``
+    is the position of the child in a parent's list (0 for students). Microseconds
+    are base 36 so a uuid id still fits Telegram's 64 bytes.
+    """
+
+    kind: str
+    older: bool
+    at: datetime
+    row_id: str
+    child: int = 0
+
+    def pack(self) -> str:
+        micros = (self.at - _EPOCH) // timedelta(microseconds=1)
+        return f"hist:{self.kind}:{self.child}:{'o' if self.older else 'n'}:{_base36(micros)}:{self.row_id}"
+
+    @classmethod
+    def unpack(cls, data: str) -> Optional[PageCursor]:
+        parts = data.split(":", 5)
+        if len(parts) != 6 or parts[0] != "hist" or parts[1] not in HISTORY_KINDS or parts[3] not in ("o", "n"):
+            return None
+        if not parts[2].isdigit() or not parts[5]:
+            return None
+        try:
+            at = _EPOCH + timedelta(microseconds=int(parts[4], 36))
+        except (ValueError, OverflowError):
+            return None
+        return cls(kind=parts[1], older=parts[3] == "o", at=at, row_id=parts[5], child=int(parts[2]))
+
+
+def _base36(value: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    out = ""
+    while True:
+        value, rest = divmod(value, 36)
+        out = digits[rest] + out
+        if not value:
+            return sign + out
+
+
+@dataclass
+class HistoryPage:
+    rows: list[dict]
+    has_newer: bool
+    has_older: bool
+
+
+def build_page(rows: list[dict], cursor: Optional[PageCursor], size: int = PAGE_SIZE) -> HistoryPage:
+    """Trim a ``size + 1`` keyset fetch to one newest-first page and work out its neighbours."""
+    extra = len(rows) > size
+    rows = rows[:size]
+    if cursor is None:
+        return HistoryPage(rows=rows, has_newer=False, has_older=extra)
+    if cursor.older:
+        return HistoryPage(rows=rows, has_newer=True, has_older=extra)
+    return HistoryPage(rows=list(reversed(rows)), has_newer=extra, has_older=True)
+
+
+def page_keyboard(kind: str, page: HistoryPage, key: str, child: int = 0) -> Optional[InlineKeyboardMarkup]:
+    buttons = []
+    if page.has_newer and page.rows:
+        first = page.rows[0]
+        buttons.append(
+            InlineKeyboardButton(text="◀️", callback_data=PageCursor(kind, False, first[key], first["id"], child).pack())
+        )
+    if page.has_older and page.rows:
+        last = page.rows[-1]
+        buttons.append(
+            InlineKeyboardButton(text="▶️", callback_data=PageCursor(kind, True, last[key], last["id"], child).pack())
+        )
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiogram import Bot
+
+from db.invalidation import InvalidationBus, InvalidationEvent
+from db.repository import BotRepository
+from services.bot_logic import BotLogic
+from services.cache import BotCaches
+from services.formatters import format_money
+
+
+@dataclass
+class ConfirmationStats:
+    events: int = 0
+    polls: int = 0
+    claimed: int = 0
+    sent: int = 0
+    failed: int = 0
+
+
+class PaymentConfirmationNotifier:
+    """Sends "paid ✅" with the refreshed balance to the chat that started a checkout.
+
+    PaymentCheckout status changes arrive from the invalidation bus and are claimed in
+    batches after ``batch_delay``; a poll over ``updatedAt`` every ``poll_interval``
+    seconds (and after every bus reconnect) catches anything the listener missed.
+    Claiming sets "notifiedAt", so each checkout is confirmed once across both paths
+    and across bot instances. Checkouts paid together for the same chat and student
+    are folded into one message.
+    """
+
+    def __init__(
+        self,
+        repo: BotRepository,
+        bot: Bot,
+        logic: BotLogic,
+        caches: Optional[BotCaches] = None,
+        batch_delay: float = 0.5,
+        poll_interval: float = 60.0,
+        poll_overlap: timedelta = timedelta(minutes=5),
+        lookback: timedelta = timedelta(days=1),
+        batch_size: int = 100,
+    ) -> None:
+        self.repo = repo
+        self.bot = bot
+        self.logic = logic
+        self.caches = caches
+        self.batch_delay = batch_delay
+        self.poll_interval = poll_interval
+        self.poll_overlap = poll_overlap
+        self.lookback = lookback
+        self.batch_size = batch_size
+        self.stats = ConfirmationStats()
+        self._pending: set[str] = set()
+        self._poll_due = True
+        self._cursor: Optional[datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(self, bus: InvalidationBus) -> None:
+        bus.subscribe("PaymentCheckout", self._on_checkout)
+        bus.on_flush(self._on_flush)
+
+    def _on_checkout(self, event: InvalidationEvent) -> None:
+        if event.row_id is None:
+            self._on_flush()
+            return
+        if event.get("status") != "PAID":
+            return
+        self.stats.events += 1
+        self._pending.add(event.row_id)
+        self._wakeup.set()
+
+    def _on_flush(self) -> None:
+        self._poll_due = True
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            # The first pass catches up on checkouts paid while the bot was down.
+            self._wakeup.set()
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                # Let the rest of a burst (one NOTIFY per checkout) arrive first.
+                await asyncio.sleep(self.batch_delay)
+            except asyncio.TimeoutError:
+                self._poll_due = True
+            self._wakeup.clear()
+
+            try:
+                await self.run_once()
+            except Exception as error:
+                print("PAYMENT_CONFIRM_ERROR", error)
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.utcnow()
+        rows: list[dict] = []
+
+        while self._pending:
+            ids = list(self._pending)[: self.batch_size]
+            self._pending.difference_update(ids)
+            rows.extend(await self.repo.claim_paid_checkouts(checkout_ids=ids, limit=len(ids)))
+
+        if self._poll_due:
+            self._poll_due = False
+            self.stats.polls += 1
+            since = self._cursor or now - self.lookback
+            while True:
+                batch = await self.repo.claim_paid_checkouts(updated_since=since, limit=self.batch_size)
+                rows.extend(batch)
+                if len(batch) < self.batch_size:
+                    break
+            # Commits can land after their updatedAt; re-read a short overlap next time.
+            self._cursor = now - self.poll_overlap
+
+        self.stats.claimed += len(rows)
+        if rows:
+            await self._send(rows)
+        return len(rows)
+
+    async def _send(self, rows: list[dict]) -> None:
+        groups: dict[tuple[str, str], list[dict]] = {}
+        for row in rows:
+            groups.setdefault((row["telegramChatId"], row["studentId"]), []).append(row)
+
+        for (chat_id, student_id), items in groups.items():
+            if self.caches is not None:
+                self.caches.debts.pop(student_id)
+            try:
+                debt = await self.logic.student_debt_summary(student_id)
+                balance = (
+                    f"Qolgan qarz: {format_money(debt['totalDebt'])} so'm"
+                    if debt["totalDebt"] > 0
+                    else "Qarzdorlik qolmadi."
+                )
+                await self.bot.send_message(
+                    int(chat_id),
+                    "To'lov qabul qilindi ✅\n"
+                    f"Summa: {format_money(sum(int(item['amount']) for item in items))} so'm\n"
+                    f"Student_ID: {items[0]['studentCode']}\n"
+                    f"{balance}",
+                )
+                self.stats.sent += 1
+            except Exception as error:
+                # Claimed confirmations are not retried; the balance is one tap away.
+                self.stats.failed += 1
+                print("PAYMENT_CONFIRM_SEND_ERROR", chat_id, [item["id"] for item in items], error)
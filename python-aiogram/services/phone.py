@@ -20,13 +20,5 @@ def normalize_uz_phone(raw: str) -> str:
     return f"+{digits}"
 
 
-def phone_variants(raw: str) -> list[str]:
-    normalized = normalize_uz_phone(raw)
-    if not normalized:
-        return []
-    variants = {normalized, normalized.lstrip("+")}
-    return list(variants)
-
-
 def is_uz_e164(phone: str) -> bool:
     return bool(re.fullmatch(r"\+998\d{9}", phone or ""))
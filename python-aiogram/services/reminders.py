@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import heapq
+import itertools
+from typing import Optional
+
+from aiogram import Bot
+
+from db.invalidation import InvalidationBus, InvalidationEvent
+from db.repository import BotRepository
+from services.constants import STUDENT_BTN_TEST
+from services.formatters import format_date
+from services.keyboards import student_menu_keyboard
+
+
+@dataclass
+class ReminderStats:
+    loaded: int = 0
+    reloaded: int = 0
+    due: int = 0
+    claimed: int = 0
+    sent: int = 0
+    failed: int = 0
+
+
+class WindowReminderScheduler:
+    """Sends "test opened" and "test closes soon" reminders from an in-memory min-heap.
+
+    Events are read ahead in (cursor, now + horizon] slices, so every window is
+    fetched once as the cursor moves forward; AccessWindow changes from the
+    invalidation bus trigger a targeted reload of just those windows, and a bus
+    reconnect rescans the whole range. Due events are claimed in batches through
+    "WindowReminder" before sending, which also makes a restart (that re-reads the
+    last ``grace`` minutes) skip anything already sent.
+    """
+
+    def __init__(
+        self,
+        repo: BotRepository,
+        bot: Bot,
+        close_lead: timedelta = timedelta(minutes=15),
+        horizon: timedelta = timedelta(minutes=30),
+        grace: timedelta = timedelta(minutes=10),
+        load_interval: float = 60.0,
+        batch_size: int = 50,
+        # Telegram allows about 30 messages per second per bot.
+        send_interval: float = 0.05,
+    ) -> None:
+        self.repo = repo
+        self.bot = bot
+        self.close_lead = close_lead
+        self.horizon = horizon
+        self.grace = grace
+        self.load_interval = load_interval
+        self.batch_size = batch_size
+        self.send_interval = send_interval
+        self.stats = ReminderStats()
+        self._heap: list[tuple[datetime, int, str, str]] = []
+        self._queued: set[tuple[str, str, datetime]] = set()
+        self._seq = itertools.count()
+        self._cursor: Optional[datetime] = None
+        self._next_load: Optional[datetime] = None
+        self._dirty: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def attach(self, bus: InvalidationBus) -> None:
+        bus.subscribe("AccessWindow", self._on_window_changed)
+        bus.on_flush(self._on_flush)
+
+    def _on_window_changed(self, event: InvalidationEvent) -> None:
+        if event.row_id is None:
+            self._on_flush()
+            return
+        self._dirty.add(event.row_id)
+        self._wakeup.set()
+
+    def _on_flush(self) -> None:
+        # Changes may have been missed: re-read the whole range on the next tick.
+        # Queued events are deduplicated and claims stop a second send.
+        self._cursor = None
+        self._next_load = None
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.tick(datetime.utcnow())
+            except Exception as error:
+                print("REMINDER_ERROR", error)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._sleep_seconds(datetime.utcnow()))
+            except asyncio.TimeoutError:
+                pass
+
+    def _sleep_seconds(self, now: datetime) -> float:
+        wake_at = self._next_load or now
+        if self._heap and self._heap[0][0] < wake_at:
+            wake_at = self._heap[0][0]
+        return min(max((wake_at - now).total_seconds(), 0.05), self.load_interval)
+
+    async def tick(self, now: datetime) -> None:
+        if self._cursor is None:
+            self._cursor = now - self.grace
+        if self._next_load is None or now >= self._next_load:
+            end = now + self.horizon
+            rows = await self.repo.get_window_events(self._cursor, end, self.close_lead)
+            self.stats.loaded += self._push(rows)
+            self._cursor = end
+            self._next_load = now + timedelta(seconds=self.load_interval)
+
+        if self._dirty:
+            window_ids = list(self._dirty)
+            self._dirty.clear()
+            rows = await self.repo.get_window_events(now - self.grace, self._cursor, self.close_lead, window_ids)
+            self.stats.reloaded += self._push(rows)
+
+        await self._fire_due(now)
+
+    def _push(self, rows: list[dict]) -> int:
+        added = 0
+        for row in rows:
+            key = (row["windowId"], row["kind"], row["dueAt"])
+            if key in self._queued:
+                continue
+            self._queued.add(key)
+            heapq.heappush(self._heap, (row["dueAt"], next(self._seq), row["windowId"], row["kind"]))
+            added += 1
+        return added
+
+    async def _fire_due(self, now: datetime) -> None:
+        due: list[tuple[str, str]] = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, _seq, window_id, kind = heapq.heappop(self._heap)
+            self._queued.discard((window_id, kind, due_at))
+            due.append((window_id, kind))
+        if not due:
+            return
+
+        self.stats.due += len(due)
+        for idx in range(0, len(due), self.batch_size):
+            claimed = await self.repo.claim_window_reminders(due[idx : idx + self.batch_size], now, self.close_lead)
+            self.stats.claimed += len(claimed)
+            for row in claimed:
+                await self._send(row, now)
+                await asyncio.sleep(self.send_interval)
+
+    def _text(self, row: dict, now: datetime) -> str:
+        lesson = f"{row['book_title']} | {row['lessonNumber']}-dars"
+        if row["kind"] == "OPEN":
+            return (
+                f"📝 Yangi test ochildi: {lesson}\n"
+                f"Test {format_date(row['openTo'])} gacha ochiq. "
+                f"Boshlash uchun \"{STUDENT_BTN_TEST}\" tugmasini bosing."
+            )
+        # After a restart the reminder can go out later than close_lead before the end.
+        minutes = max(1, int((row["openTo"] - now).total_seconds() // 60))
+        return (
+            f"⏰ Test yopilishiga {minutes} daqiqa qoldi: {lesson}\n"
+            f"Javoblaringizni {format_date(row['openTo'])} gacha yuboring."
+        )
+
+    async def _send(self, row: dict, now: datetime) -> None:
+        try:
+            await self.bot.send_message(
+                int(row["telegramUserId"]),
+                self._text(row, now),
+                reply_markup=student_menu_keyboard(),
+            )
+            self.stats.sent += 1
+        except Exception as error:
+            # Claimed reminders are not retried: a late "test opened" is worse than none.
+            self.stats.failed += 1
+            print("REMINDER_SEND_ERROR", row["windowId"], row["kind"], error)
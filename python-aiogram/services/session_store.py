@@ -9,6 +9,9 @@ class SessionStore:
     def __init__(self) -> None:
         self._items: Dict[int, SessionState] = {}
 
+    def __len__(self) -> int:
+        return len(self._items)
+
     def get(self, user_id: int) -> SessionState:
         existing = self._items.get(user_id)
         if existing is not None:
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+from typing import IO, Optional
+
+from db.repository import BotRepository
+
+
+@dataclass
+class JournalStats:
+    appended: int = 0
+    fsyncs: int = 0
+    committed: int = 0
+    skipped: int = 0
+    replayed: int = 0
+    commit_errors: int = 0
+    dead_lettered: int = 0
+
+
+class SubmissionJournal:
+    """Durable write-behind log for scored submissions.
+
+    ``submit`` appends the entry to ``<dir>/submissions.jsonl`` and returns once it is
+    fsynced; concurrent submits share one fsync. A background writer then
+    group-commits pending entries through BotRepository.commit_submission_batch and
+    appends a commit marker. Entries are keyed by window id: the window lock in the
+    batch makes replaying an entry that already reached Postgres a no-op, so on
+    startup every entry without a marker is simply queued again. The file is
+    truncated whenever nothing is pending.
+
+    When a batch fails its entries are committed one at a time, each up to
+    ``max_attempts`` times. Entries that still fail, and entries whose window was
+    already submitted or closed by the time they ran, are moved to
+    ``submissions.dead.jsonl`` with the reason; appending those lines back to
+    ``submissions.jsonl`` before a start queues them again.
+    """
+
+    FILE_NAME = "submissions.jsonl"
+    DEAD_LETTER_NAME = "submissions.dead.jsonl"
+
+    def __init__(
+        self,
+        directory: str,
+        repo: BotRepository,
+        batch_size: int = 200,
+        max_delay: float = 0.05,
+        retry_delay: float = 2.0,
+        max_attempts: int = 5,
+    ) -> None:
+        self.path = Path(directory) / self.FILE_NAME
+        self.dead_letter_path = Path(directory) / self.DEAD_LETTER_NAME
+        self.repo = repo
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.stats = JournalStats()
+        self._pending: dict[str, dict] = {}
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._file: Optional[IO[str]] = None
+        self._lock = asyncio.Lock()
+        self._sync_waiters: list[asyncio.Future] = []
+        self._sync_task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.Task] = None
+
+    def is_pending(self, window_id: str) -> bool:
+        return window_id in self._pending
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def open(self) -> int:
+        """Replay uncommitted entries and start the writer; returns the replayed count."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            for entry in self._read_uncommitted():
+                self._pending[entry["windowId"]] = entry
+                self._queue.put_nowait(entry["windowId"])
+            self.stats.replayed = len(self._pending)
+
+        self._file = open(self.path, "a", encoding="utf-8")
+        dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+        self._writer = asyncio.create_task(self._write_loop())
+        return self.stats.replayed
+
+    async def close(self, timeout: float = 10.0) -> None:
+        if self._writer is not None:
+            deadline = asyncio.get_running_loop().time() + timeout
+            while self._pending and asyncio.get_running_loop().time() < deadline:
+                await asyncio.sleep(0.05)
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        if self._sync_task is not None:
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._pending:
+            print("SUBMISSION_JOURNAL_PENDING", len(self._pending), "entries will be replayed on next start")
+
+    async def submit(
+        self,
+        window_id: str,
+        student_user_id: str,
+        test_id: str,
+        submitted_at: datetime,
+        raw_answer_text: str,
+        parsed_answers: list[str],
+        score: int,
+        details: list[tuple[int, Optional[str], str, bool]],
+    ) -> str:
+        if self._file is None:
+            raise RuntimeError("SUBMISSION_JOURNAL_CLOSED")
+        if window_id in self._pending:
+            raise ValueError("WINDOW_ALREADY_PENDING")
+
+        entry = {
+            "windowId": window_id,
+            "submissionId": self.repo._new_id(),
+            "studentUserId": student_user_id,
+            "testId": test_id,
+            "submittedAt": submitted_at,
+            "rawAnswerText": raw_answer_text,
+            "parsedAnswers": parsed_answers,
+            "score": score,
+            "details": details,
+        }
+        self._pending[window_id] = entry
+        try:
+            await self._append(json.dumps({**entry, "submittedAt": submitted_at.isoformat()}, ensure_ascii=False), sync=True)
+        except BaseException:
+            self._pending.pop(window_id, None)
+            raise
+
+        self.stats.appended += 1
+        self._queue.put_nowait(window_id)
+        return entry["submissionId"]
+
+    def _read_uncommitted(self) -> list[dict]:
+        entries: dict[str, dict] = {}
+        with open(self.path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # A torn last line was never acknowledged.
+                    continue
+                if "committed" in item:
+                    for window_id in item["committed"]:
+                        entries.pop(window_id, None)
+                    continue
+                item["submittedAt"] = datetime.fromisoformat(item["submittedAt"])
+                entries[item["windowId"]] = item
+        return list(entries.values())
+
+    async def _append(self, line: str, sync: bool) -> None:
+        async with self._lock:
+            self._file.write(line + "\n")
+        if not sync:
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._sync_waiters.append(waiter)
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync())
+        await waiter
+
+    async def _sync(self) -> None:
+        # Everyone who wrote before this point shares one flush + fsync.
+        while self._sync_waiters:
+            waiters, self._sync_waiters = self._sync_waiters, []
+            try:
+                async with self._lock:
+                    self._file.flush()
+                    fd = self._file.fileno()
+                await asyncio.to_thread(os.fsync, fd)
+                self.stats.fsyncs += 1
+            except Exception as error:
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_exception(error)
+                continue
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    async def _write_loop(self) -> None:
+        while True:
+            window_ids = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.max_delay
+            while len(window_ids) < self.batch_size:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    window_ids.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [self._pending[window_id] for window_id in dict.fromkeys(window_ids) if window_id in self._pending]
+            if batch:
+                try:
+                    await self._commit(batch)
+                except Exception as error:
+                    # Only a failed dead-letter write gets here; keep the entries and try later.
+                    print("SUBMISSION_JOURNAL_ERROR", len(batch), error)
+                    await asyncio.sleep(self.retry_delay)
+                    for entry in batch:
+                        if entry["windowId"] in self._pending:
+                            self._queue.put_nowait(entry["windowId"])
+                    continue
+
+            if not self._pending:
+                await self._truncate()
+
+    async def _commit(self, batch: list[dict]) -> None:
+        failed: dict[str, str] = {}
+        try:
+            written = await self.repo.commit_submission_batch(batch)
+        except Exception as error:
+            self.stats.commit_errors += 1
+            print("SUBMISSION_JOURNAL_COMMIT_ERROR", len(batch), error)
+            written = []
+            for entry in batch:
+                entry_error = await self._commit_one(entry, written)
+                if entry_error is not None:
+                    failed[entry["windowId"]] = f"commit failed: {entry_error}"
+
+        self.stats.committed += len(written)
+        await self._mark_committed(written)
+
+        # Acknowledged to the student but not written: keep them in the dead-letter file.
+        written_ids = set(written)
+        lost = [entry for entry in batch if entry["windowId"] not in written_ids]
+        if lost:
+            reasons = {entry["windowId"]: failed.get(entry["windowId"], "window already submitted or closed") for entry in lost}
+            self.stats.skipped += len(lost) - len(failed)
+            await self._dead_letter(lost, reasons)
+            await self._mark_committed(list(reasons))
+
+    async def _commit_one(self, entry: dict, written: list[str]) -> Optional[Exception]:
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                written.extend(await self.repo.commit_submission_batch([entry]))
+                return None
+            except Exception as error:
+                self.stats.commit_errors += 1
+                last_error = error
+        print("SUBMISSION_JOURNAL_COMMIT_ERROR", entry["windowId"], last_error)
+        return last_error
+
+    async def _mark_committed(self, window_ids: list[str]) -> None:
+        if not window_ids:
+            return
+        for window_id in window_ids:
+            self._pending.pop(window_id, None)
+        await self._append(json.dumps({"committed": window_ids}), sync=False)
+
+    async def _dead_letter(self, entries: list[dict], reasons: dict[str, str]) -> None:
+        lines = [
+            json.dumps(
+                {**entry, "submittedAt": entry["submittedAt"].isoformat(), "reason": reasons[entry["windowId"]]},
+                ensure_ascii=False,
+            )
+            for entry in entries
+        ]
+        await asyncio.to_thread(self._write_dead_letter, lines)
+        self.stats.dead_lettered += len(entries)
+        for entry in entries:
+            print("SUBMISSION_JOURNAL_DEAD_LETTER", entry["windowId"], reasons[entry["windowId"]])
+
+    def _write_dead_letter(self, lines: list[str]) -> None:
+        with open(self.dead_letter_path, "a", encoding="utf-8") as handle:
+            handle.write("".join(line + "\n" for line in lines))
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    async def _truncate(self) -> None:
+        async with self._lock:
+            if self._pending or self._sync_waiters:
+                return
+            self._file.flush()
+            self._file.truncate(0)
+            self._file.seek(0)
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import random
+import secrets
+import time
+from typing import IO, Any, Iterator, Optional
+
+from aiogram.dispatcher.event.bases import CancelHandler, SkipHandler
+
+
+# OTLP span kinds.
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# Spans kept per trace; later spans of a runaway update are dropped.
+MAX_SPANS = 2000
+
+# aiogram's routing signals, not failures (e.g. /profile from a non-admin). Cancellation
+# is a BaseException and is not caught at all.
+_FLOW_CONTROL = (SkipHandler, CancelHandler)
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str
+    kind: int
+    start_ns: int
+    end_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def otlp(self) -> dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": 2, "message": self.error} if self.error is not None else {"code": 1},
+        }
+
+
+@dataclass
+class Trace:
+    root: Span
+    spans: list[Span] = field(default_factory=list)
+    errored: bool = False
+    closed: bool = False
+    dropped_spans: int = 0
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def tracing_active() -> bool:
+    trace = _current_trace.get()
+    return trace is not None and not trace.closed
+
+
+@contextmanager
+def span(name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the current one; yields None (and costs nothing more) outside a trace."""
+    trace = _current_trace.get()
+    if trace is None or trace.closed:
+        yield None
+        return
+    if len(trace.spans) >= MAX_SPANS:
+        trace.dropped_spans += 1
+        yield None
+        return
+
+    parent = _current_span.get() or trace.root
+    child = Span(
+        name=name,
+        trace_id=trace.root.trace_id,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id,
+        kind=kind,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    trace.spans.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as error:
+        if not isinstance(error, _FLOW_CONTROL):
+            child.error = f"{type(error).__name__}: {error}"
+            trace.errored = True
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+@dataclass
+class TracerStats:
+    traces: int = 0
+    kept_error: int = 0
+    kept_slow: int = 0
+    kept_sampled: int = 0
+    write_errors: int = 0
+
+
+class Tracer:
+    """Per-update span tracing with tail-based sampling, exported as OTLP/JSON lines.
+
+    ``trace()`` opens the root span of an update and ``span()`` adds children to it
+    from anywhere below (handlers, BotLogic, SQL, Bot API requests) through
+    contextvars. A finished trace is kept when any span failed, when the root took
+    at least ``slow_ms``, or with probability ``sample_rate``; the rest are dropped.
+
+    Kept traces are appended one per line as OTLP ``ExportTraceServiceRequest`` JSON
+    to ``<dir>/traces-<time>-<rand>.jsonl``, rotated by size. The OpenTelemetry
+    collector's ``otlpjsonfile`` receiver, Jaeger and Tempo can load them.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        slow_ms: int = 1000,
+        sample_rate: float = 0.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        service_name: str = "python-aiogram",
+    ) -> None:
+        self.directory = Path(directory)
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.service_name = service_name
+        self.stats = TracerStats()
+        self._file: Optional[IO[str]] = None
+        self._written = 0
+
+    @contextmanager
+    def trace(self, name: str, **attributes: Any) -> Iterator[Span]:
+        root = Span(
+            name=name,
+            trace_id=secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id="",
+            kind=KIND_SERVER,
+            start_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        trace = Trace(root=root)
+        trace_token = _current_trace.set(trace)
+        span_token = _current_span.set(root)
+        try:
+            yield root
+        except Exception as error:
+            if not isinstance(error, _FLOW_CONTROL):
+                root.error = f"{type(error).__name__}: {error}"
+                trace.errored = True
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            # Tasks spawned from the update keep the context; stop them adding spans.
+            trace.closed = True
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            self.finish(trace)
+
+    def finish(self, trace: Trace) -> bool:
+        self.stats.traces += 1
+        duration_ms = (trace.root.end_ns - trace.root.start_ns) / 1e6
+        if trace.errored:
+            self.stats.kept_error += 1
+        elif duration_ms >= self.slow_ms:
+            self.stats.kept_slow += 1
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            self.stats.kept_sampled += 1
+        else:
+            return False
+
+        if trace.dropped_spans:
+            trace.root.set(**{"trace.dropped_spans": trace.dropped_spans})
+        try:
+            self._write(trace)
+        except OSError as error:
+            self.stats.write_errors += 1
+            print("TRACE_WRITE_ERROR", error)
+            return False
+        return True
+
+    def _open(self) -> IO[str]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        self._written = 0
+        return open(self.directory / f"traces-{stamp}-{secrets.token_hex(3)}.jsonl", "a", encoding="utf-8")
+
+    def _write(self, trace: Trace) -> None:
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {"service.name": self.service_name, "process.pid": os.getpid()}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "python-aiogram.tracing"},
+                            "spans": [trace.root.otlp(), *(child.otlp() for child in trace.spans)],
+                        }
+                    ],
+                }
+            ]
+        }
+        line = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+        if self._file is None or self._written >= self.max_bytes:
+            self.close()
+            self._file = self._open()
+
+        self._file.write(line + "\n")
+        self._file.flush()
+        self._written += len(line) + 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "traces": self.stats.traces,
+            "keptError": self.stats.kept_error,
+            "keptSlow": self.stats.kept_slow,
+            "keptSampled": self.stats.kept_sampled,
+            "writeErrors": self.stats.write_errors,
+        }
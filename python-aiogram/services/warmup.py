@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import Message
+
+from db.repository import BotRepository
+from services.bot_logic import BotLogic
+from services.cache import BotCaches
+
+
+@dataclass
+class WarmupReport:
+    at: datetime
+    windows: int = 0
+    tests: int = 0
+    tests_warm: int = 0
+    images: int = 0
+    images_warm: int = 0
+    actors: int = 0
+    actors_warm: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    @property
+    def coverage(self) -> float:
+        total = self.tests + self.images + self.actors
+        if not total:
+            return 1.0
+        return (self.tests_warm + self.images_warm + self.actors_warm) / total
+
+    def line(self) -> str:
+        return (
+            f"windows={self.windows} tests={self.tests_warm}/{self.tests} "
+            f"images={self.images_warm}/{self.images} actors={self.actors_warm}/{self.actors} "
+            f"coverage={self.coverage:.0%}"
+        )
+
+
+class WindowWarmup:
+    """Preloads caches for AccessWindows that open within the next ``lead`` minutes.
+
+    Per upcoming test: the compiled test (key, lesson, image list), the image bytes or,
+    when ``warm_chat_id`` is set, a Telegram file_id obtained by uploading the image to
+    that chat once; and the actor records of every student with a window on it.
+    Needs the invalidation bus: without it cache entries expire after
+    ``BotCaches.fallback_ttl`` seconds, long before the windows open.
+    """
+
+    def __init__(
+        self,
+        repo: BotRepository,
+        logic: BotLogic,
+        caches: BotCaches,
+        bot: Optional[Bot] = None,
+        lead_minutes: int = 10,
+        interval_seconds: float = 60.0,
+        warm_chat_id: Optional[int] = None,
+    ) -> None:
+        self.repo = repo
+        self.logic = logic
+        self.caches = caches
+        self.bot = bot
+        self.lead = timedelta(minutes=lead_minutes)
+        self.interval = interval_seconds
+        self.warm_chat_id = warm_chat_id
+        self.last_report: Optional[WarmupReport] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                report = await self.run_once()
+                if report.windows:
+                    print("WARMUP", report.line())
+                for error in report.errors:
+                    print("WARMUP_ERROR", error)
+            except Exception as error:
+                print("WARMUP_ERROR", error)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: Optional[datetime] = None) -> WarmupReport:
+        now = now or datetime.utcnow()
+        report = WarmupReport(at=now)
+        # Windows that opened during the last tick are included so stragglers still hit warm caches.
+        targets = await self.repo.get_upcoming_window_targets(now - timedelta(seconds=self.interval), now + self.lead)
+        report.windows = len(targets)
+
+        test_ids = list(dict.fromkeys(row["testId"] for row in targets))
+        telegram_ids = list(dict.fromkeys(int(row["telegramUserId"]) for row in targets if row["telegramUserId"]))
+
+        report.tests = len(test_ids)
+        for test_id in test_ids:
+            test = await self.repo.get_test(test_id)
+            if not test:
+                continue
+            report.tests_warm += 1
+            for image in test.get("images") or []:
+                report.images += 1
+                try:
+                    if await self._warm_image(image["imageUrl"]):
+                        report.images_warm += 1
+                except Exception as error:
+                    report.errors.append(f"image {image['imageUrl']}: {error}")
+
+        report.actors = len(telegram_ids)
+        report.actors_warm = await self.repo.warm_actors(telegram_ids)
+
+        self.last_report = report
+        return report
+
+    async def _warm_image(self, image_url: str) -> bool:
+        if image_url in self.caches.image_file_ids:
+            return True
+
+        data = None
+        if self.logic.images is not None:
+            data = await self.logic.images.load(image_url)
+        elif image_url not in self.caches.image_bytes:
+            local_path = self.logic.local_image_path(image_url)
+            if local_path:
+                data = await asyncio.to_thread(local_path.read_bytes)
+                self.caches.image_bytes.put(image_url, data)
+
+        if self.bot is None or self.warm_chat_id is None:
+            return image_url in self.caches.image_bytes
+
+        sent: Optional[Message] = await self.bot.send_photo(
+            self.warm_chat_id,
+            self.logic.photo_input(image_url, data),
+            disable_notification=True,
+            protect_content=True,
+        )
+        self.logic.remember_photo(image_url, sent)
+        if sent:
+            try:
+                await self.bot.delete_message(self.warm_chat_id, sent.message_id)
+            except Exception:
+                pass
+        return image_url in self.caches.image_file_ids or data is not None or image_url in self.caches.image_bytes
@@ -0,0 +1,255 @@
+"""Repository flows against a real database.
+
+Set TEST_DATABASE_URL to a scratch database with the Prisma migrations applied;
+without it these tests are skipped. Every test creates its own rows and removes
+them afterwards.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+import json
+import os
+from pathlib import Path
+import sys
+from uuid import uuid4
+
+import pytest
+import pytest_asyncio
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+import asyncpg
+
+from db.regrade import RegradeJob
+from db.repository import BotRepository
+from services.answer_parser import compile_answer_key, scan_answers
+from services.checkout_sweeper import CheckoutSweeper
+
+DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest_asyncio.fixture
+async def repo():
+    pool = await asyncpg.create_pool(DATABASE_URL, min_size=1, max_size=5)
+    repo = BotRepository(pool=pool)
+    try:
+        yield repo
+    finally:
+        await pool.close()
+
+
+@pytest_asyncio.fixture
+async def test_row(repo: BotRepository):
+    suffix = uuid4().hex[:12]
+    ids = {"user": f"u-{suffix}", "book": f"b-{suffix}", "lesson": f"l-{suffix}", "test": f"t-{suffix}"}
+    async with repo.pool.acquire() as conn:
+        await conn.execute('INSERT INTO "User" (id, role) VALUES ($1, \'STUDENT\')', ids["user"])
+        await conn.execute('INSERT INTO "Book" (id, title) VALUES ($1, \'Kimyo\')', ids["book"])
+        await conn.execute(
+            'INSERT INTO "Lesson" (id, "bookId", "lessonNumber", title) VALUES ($1, $2, 1, \'Atom\')',
+            ids["lesson"],
+            ids["book"],
+        )
+        await conn.execute(
+            'INSERT INTO "Test" (id, "lessonId", "answerKey", "totalQuestions") VALUES ($1, $2, $3::jsonb, 4)',
+            ids["test"],
+            ids["lesson"],
+            json.dumps(["A", "B", "C", "D"]),
+        )
+    try:
+        yield ids
+    finally:
+        async with repo.pool.acquire() as conn:
+            await conn.execute('DELETE FROM "AuditLog" WHERE "entityId" = $1 OR "actorId" = $2', ids["test"], ids["user"])
+            await conn.execute('DELETE FROM "Test" WHERE id = $1', ids["test"])
+            await conn.execute('DELETE FROM "Lesson" WHERE id = $1', ids["lesson"])
+            await conn.execute('DELETE FROM "Book" WHERE id = $1', ids["book"])
+            await conn.execute('DELETE FROM "User" WHERE id = $1', ids["user"])
+
+
+@pytest_asyncio.fixture
+async def student_row(repo: BotRepository):
+    digits = f"{uuid4().int % 10**9:09d}"
+    student_id = f"s-{digits}"
+    student_code = digits[:6]
+    async with repo.pool.acquire() as conn:
+        await conn.execute(
+            'INSERT INTO "Student" (id, "studentCode", "fullName", phone) VALUES ($1, $2, \'Ali Valiyev\', $3)',
+            student_id,
+            student_code,
+            f"+998{digits}",
+        )
+    try:
+        yield {"id": student_id, "studentCode": student_code}
+    finally:
+        async with repo.pool.acquire() as conn:
+            # PaymentCheckout rows go with the student (ON DELETE CASCADE).
+            await conn.execute('DELETE FROM "Student" WHERE id = $1', student_id)
+
+
+async def _stored(repo: BotRepository, test_id: str) -> dict[str, tuple[int, list[tuple]]]:
+    async with repo.pool.acquire() as conn:
+        rows = await conn.fetch(
+            """
+            SELECT s.id, s."rawAnswerText", s.score,
+                   array_agg(ROW(d."questionNumber", d."givenAnswer", d."correctAnswer", d."isCorrect")
+                             ORDER BY d."questionNumber") AS details
+            FROM "Submission" s
+            JOIN "SubmissionDetail" d ON d."submissionId" = s.id
+            WHERE s."testId" = $1
+            GROUP BY s.id
+            """,
+            test_id,
+        )
+    return {row["rawAnswerText"]: (row["score"], [tuple(detail) for detail in row["details"]]) for row in rows}
+
+
+@pytest.mark.asyncio
+async def test_regrade_matches_scanner(repo: BotRepository, test_row: dict[str, str]) -> None:
+    old_key = compile_answer_key(["A", "B", "C", "D"], 4)
+    new_key = compile_answer_key(["A", "C", "C", "A"], 4)
+    texts = ["1A2B3C4D", "1A2C3C", "ACCA", "4A 1B"]
+
+    for text in texts:
+        scan = scan_answers(text, 4, old_key)
+        await repo.create_submission_with_details(
+            test_row["user"], test_row["test"], text, scan.answers, scan.score, scan.details(old_key)
+        )
+    async with repo.pool.acquire() as conn:
+        await conn.execute('UPDATE "Test" SET "answerKey" = $2::jsonb WHERE id = $1', test_row["test"], json.dumps(list(new_key)))
+
+    expected = {}
+    for text in texts:
+        scan = scan_answers(text, 4, new_key)
+        expected[text] = (scan.score, scan.details(new_key))
+    before = await _stored(repo, test_row["test"])
+    changed_details = sum(
+        1 for text in texts for old, new in zip(before[text][1], expected[text][1]) if old != new
+    )
+    changed_scores = sum(1 for text in texts if before[text][0] != expected[text][0])
+
+    dry = await RegradeJob(pool=repo.pool, batch_size=2, dry_run=True).run(test_row["test"])
+    assert dry.scanned == len(texts)
+    assert dry.score_changed == changed_scores
+    assert dry.details_changed == changed_details
+    assert await _stored(repo, test_row["test"]) == before
+
+    done = await RegradeJob(pool=repo.pool, batch_size=2).run(test_row["test"])
+    assert done.score_changed == changed_scores
+    assert done.details_changed == changed_details
+    assert await _stored(repo, test_row["test"]) == expected
+
+    async with repo.pool.acquire() as conn:
+        payload = await conn.fetchval(
+            'SELECT payload FROM "AuditLog" WHERE entity = \'Test\' AND "entityId" = $1', test_row["test"]
+        )
+    assert json.loads(payload)["detailsChanged"] == changed_details
+
+
+async def _checkout(repo: BotRepository, student: dict[str, str], chat_id: int, reuse_since=None) -> dict:
+    return await repo.create_payment_checkout(
+        student_id=student["id"],
+        student_code=student["studentCode"],
+        provider="PAYME",
+        amount=500000,
+        group_id=None,
+        note=None,
+        reuse_since=reuse_since,
+        telegram_chat_id=chat_id,
+    )
+
+
+async def _checkout_state(repo: BotRepository, checkout_id: str) -> tuple[str, str]:
+    async with repo.pool.acquire() as conn:
+        row = await conn.fetchrow('SELECT status::text, "telegramChatId" FROM "PaymentCheckout" WHERE id = $1', checkout_id)
+    return row["status"], row["telegramChatId"]
+
+
+@pytest.mark.asyncio
+async def test_checkout_reuse_takes_latest_chat(repo: BotRepository, student_row: dict[str, str]) -> None:
+    since = datetime.utcnow() - timedelta(minutes=30)
+    first = await _checkout(repo, student_row, 111, since)
+    again = await _checkout(repo, student_row, 222, since)
+
+    assert (first["reused"], again["reused"]) == (False, True)
+    assert again["id"] == first["id"]
+    assert again["callbackToken"] == first["callbackToken"]
+    assert await _checkout_state(repo, first["id"]) == ("PENDING", "222")
+
+    # Without a reuse window every tap is a new checkout.
+    fresh = await _checkout(repo, student_row, 333)
+    assert not fresh["reused"] and fresh["id"] != first["id"]
+
+
+@pytest.mark.asyncio
+async def test_expired_checkout_is_not_reused(repo: BotRepository, student_row: dict[str, str]) -> None:
+    since = datetime.utcnow() - timedelta(minutes=30)
+    stale = await _checkout(repo, student_row, 111, since)
+    async with repo.pool.acquire() as conn:
+        await conn.execute('UPDATE "PaymentCheckout" SET "createdAt" = $2 WHERE id = $1', stale["id"], since - timedelta(minutes=1))
+
+    fresh = await _checkout(repo, student_row, 222, since)
+    assert not fresh["reused"] and fresh["id"] != stale["id"]
+    assert await _checkout_state(repo, stale["id"]) == ("PENDING", "111")
+
+    async with repo.pool.acquire() as conn:
+        await conn.execute('UPDATE "PaymentCheckout" SET status = \'EXPIRED\' WHERE id = $1', fresh["id"])
+    latest = await _checkout(repo, student_row, 333, since)
+    assert not latest["reused"] and latest["id"] not in (stale["id"], fresh["id"])
+
+
+@pytest.mark.asyncio
+async def test_sweeper_expires_old_pending_checkouts(repo: BotRepository, student_row: dict[str, str]) -> None:
+    long_ago = datetime(2001, 1, 1)
+    rows = [await _checkout(repo, student_row, 111) for _ in range(5)]
+    ages = [timedelta(hours=3), timedelta(hours=2), timedelta(hours=2), timedelta(minutes=10), timedelta(0)]
+    async with repo.pool.acquire() as conn:
+        for row, age in zip(rows, ages):
+            await conn.execute('UPDATE "PaymentCheckout" SET "createdAt" = $2 WHERE id = $1', row["id"], long_ago - age)
+        await conn.execute('UPDATE "PaymentCheckout" SET status = \'PAID\' WHERE id = $1', rows[1]["id"])
+
+    # Dates in 2001 keep the sweep away from any other rows in the database.
+    sweeper = CheckoutSweeper(repo, timedelta(hours=1), batch_size=1)
+    assert await sweeper.run_once(now=long_ago) == 2
+    assert await sweeper.run_once(now=long_ago) == 0
+    assert (sweeper.stats.runs, sweeper.stats.expired) == (2, 2)
+
+    states = [(await _checkout_state(repo, row["id"]))[0] for row in rows]
+    assert states == ["EXPIRED", "PAID", "EXPIRED", "PENDING", "PENDING"]
+
+
+@pytest.mark.asyncio
+async def test_result_summary_follows_admin_edits(repo: BotRepository, test_row: dict[str, str]) -> None:
+    await repo.create_submission_with_details(test_row["user"], test_row["test"], "1A2B", ["A", "B", "", ""], 2, [])
+    async with repo.pool.acquire() as conn:
+        await conn.execute(
+            """
+            INSERT INTO "Submission" (id, "studentId", "testId", "rawAnswerText", "parsedAnswers", score, "createdAt")
+            SELECT $1 || n, $2, $3, 'ABCD', '["A","B","C","D"]', 4, now() - n * interval '1 day'
+            FROM generate_series(1, 2) n
+            """,
+            f"{test_row['test']}-sub",
+            test_row["user"],
+            test_row["test"],
+        )
+    summary = await repo.get_student_result_summary(test_row["user"])
+    assert summary["submissionCount"] == 3
+    assert sum(item["score"] for item in summary["recent"]) == 10
+
+    async with repo.pool.acquire() as conn:
+        await conn.execute('UPDATE "Lesson" SET title = \'Molekula\' WHERE id = $1', test_row["lesson"])
+        await conn.execute('UPDATE "Book" SET title = \'Biologiya\' WHERE id = $1', test_row["book"])
+        await conn.execute('UPDATE "Submission" SET score = 0 WHERE id = $1', f"{test_row['test']}-sub1")
+    summary = await repo.get_student_result_summary(test_row["user"])
+    assert {(item["lessonTitle"], item["bookTitle"]) for item in summary["recent"]} == {("Molekula", "Biologiya")}
+    assert sum(item["score"] for item in summary["recent"]) == 6
+
+    # Deleting the test cascades to its submissions.
+    async with repo.pool.acquire() as conn:
+        await conn.execute('DELETE FROM "Test" WHERE id = $1', test_row["test"])
+    assert await repo.get_student_result_summary(test_row["user"]) is None
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from db.repository import BotRepository
+from services.pagination import KIND_JOURNAL, KIND_PAYMENTS, KIND_RESULTS, PageCursor, build_page, page_keyboard
+
+T0 = datetime(2026, 10, 19, 9, 30, 15, 123456)
+
+
+def _rows(count: int, newest_first: bool = True) -> list[dict]:
+    rows = [{"id": f"row-{idx}", "createdAt": T0 - timedelta(minutes=idx)} for idx in range(count)]
+    return rows if newest_first else list(reversed(rows))
+
+
+def test_page_cursor_round_trip() -> None:
+    cursor = PageCursor(KIND_JOURNAL, older=False, at=T0, row_id="0b7a4a8e-6c1d-4a8e-9a57-2d3c1d8e9f10", child=3)
+    packed = cursor.pack()
+
+    assert packed.startswith("hist:j:3:n:")
+    assert len(packed.encode("utf-8")) <= 64
+    assert PageCursor.unpack(packed) == cursor
+    assert PageCursor.unpack(PageCursor(KIND_RESULTS, True, T0, "ckx1").pack()).child == 0
+    assert PageCursor.unpack(PageCursor(KIND_PAYMENTS, True, T0, "ckx1").pack()).kind == KIND_PAYMENTS
+
+
+def test_page_cursor_rejects_malformed_data() -> None:
+    for data in (
+        "",
+        "pay_go:x",
+        "hist:r:0:o:1",
+        "hist:x:0:o:1:id",
+        "hist:r:0:z:1:id",
+        "hist:r:a:o:1:id",
+        "hist:r:0:o:!!:id",
+        "hist:r:0:o:1:",
+    ):
+        assert PageCursor.unpack(data) is None, data
+
+
+def test_build_page_first_page() -> None:
+    page = build_page(_rows(11), None)
+    assert [row["id"] for row in page.rows] == [f"row-{idx}" for idx in range(10)]
+    assert (page.has_newer, page.has_older) == (False, True)
+
+    short = build_page(_rows(4), None)
+    assert len(short.rows) == 4
+    assert (short.has_newer, short.has_older) == (False, False)
+
+
+def test_build_page_older_pages() -> None:
+    cursor = PageCursor(KIND_RESULTS, older=True, at=T0, row_id="row-0")
+    middle = build_page(_rows(11), cursor)
+    assert (middle.has_newer, middle.has_older) == (True, True)
+
+    last = build_page(_rows(3), cursor)
+    assert [row["id"] for row in last.rows] == ["row-0", "row-1", "row-2"]
+    assert (last.has_newer, last.has_older) == (True, False)
+
+
+def test_build_page_newer_pages_flip_to_newest_first() -> None:
+    cursor = PageCursor(KIND_RESULTS, older=False, at=T0 - timedelta(minutes=20), row_id="row-20")
+    # Newer pages are fetched oldest first from the cursor.
+    page = build_page(_rows(11, newest_first=False), cursor)
+    assert page.rows[0]["createdAt"] > page.rows[-1]["createdAt"]
+    assert [row["id"] for row in page.rows] == [f"row-{idx}" for idx in range(1, 11)]
+    assert (page.has_newer, page.has_older) == (True, True)
+
+    top = build_page(_rows(2, newest_first=False), cursor)
+    assert [row["id"] for row in top.rows] == ["row-0", "row-1"]
+    assert (top.has_newer, top.has_older) == (False, True)
+
+
+def test_page_keyboard_cursors_point_at_page_edges() -> None:
+    cursor = PageCursor(KIND_RESULTS, older=True, at=T0, row_id="row-0")
+    page = build_page(_rows(11), cursor)
+    keyboard = page_keyboard(KIND_RESULTS, page, "createdAt", child=1)
+
+    newer, older = (PageCursor.unpack(button.callback_data) for button in keyboard.inline_keyboard[0])
+    assert (newer.older, newer.row_id, newer.at, newer.child) == (False, "row-0", T0, 1)
+    assert (older.older, older.row_id, older.child) == (True, "row-9", 1)
+    assert page_keyboard(KIND_RESULTS, build_page(_rows(3), None), "createdAt") is None
+
+
+def test_keyset_fragments() -> None:
+    assert BotRepository._keyset("s", "createdAt", None, True) == ("true", 's."createdAt" DESC, s.id DESC')
+    assert BotRepository._keyset("s", "createdAt", (T0, "id"), True) == (
+        '(s."createdAt", s.id) < ($2, $3)',
+        's."createdAt" DESC, s.id DESC',
+    )
+    assert BotRepository._keyset("e", "updatedAt", (T0, "id"), False) == (
+        '(e."updatedAt", e.id) > ($2, $3)',
+        'e."updatedAt" ASC, e.id ASC',
+    )
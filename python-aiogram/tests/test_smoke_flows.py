@@ -16,6 +16,7 @@ from routers.callbacks import router as callbacks_router
 from routers.commands import router as commands_router
 from routers.contacts import router as contacts_router
 from routers.messages import router as messages_router
+from services.answer_parser import compile_answer_key, parse_answer_text, scan_answers
 from services.bot_logic import BotLogic
 from services.session_store import SessionStore
 from services.types import SessionState
@@ -28,6 +29,29 @@ def test_router_mapping_smoke() -> None:
     assert len(messages_router.message.handlers) >= 1
 
 
+def test_answer_scanner_smoke() -> None:
+    key = compile_answer_key(["A", "B", "C", "D"], 4)
+
+    numbered = scan_answers("1a 2b 2c 3d", 4, key)
+    assert numbered.answers == ["A", "B", "D", ""]
+    assert numbered.score == 2
+    assert numbered.missing == [4]
+    assert numbered.duplicates == [2]
+
+    positional = scan_answers("A B C D", 4, key)
+    assert positional.answers == ["A", "B", "C", "D"]
+    assert positional.score == 4
+    assert positional.details(key)[3] == (4, "D", "D", True)
+
+
+def test_parse_answer_text_keeps_written_order() -> None:
+    result = parse_answer_text("3c 1a 3d 9b 2b", 4)
+    assert [(row["questionNumber"], row["answer"]) for row in result["parsed"]] == [(3, "C"), (1, "A"), (2, "B")]
+    assert result["byQuestion"] == ["A", "B", "C", ""]
+    assert scan_answers("3c 1a 3d 9b 2b", 4).order == [3, 1, 2]
+    assert scan_answers("CAB", 4).order == [1, 2, 3]
+
+
 @dataclass
 class DummyChat:
     id: int
@@ -37,9 +61,9 @@ class DummyBot:
     def __init__(self) -> None:
         self.deleted: list[int] = []
 
-    async def delete_message(self, chat_id: int, message_id: int) -> None:
+    async def delete_messages(self, chat_id: int, message_ids: list[int]) -> None:
         assert chat_id == 9001
-        self.deleted.append(message_id)
+        self.deleted.extend(message_ids)
 
 
 class DummyMessage:
@@ -75,6 +99,7 @@ class FakeRepo:
                 "id": "t1",
                 "totalQuestions": 3,
                 "answerKey": ["A", "B", "C"],
+                "compiledKey": ("A", "B", "C"),
             },
         }
 
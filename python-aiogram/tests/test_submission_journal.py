@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+import itertools
+import json
+from pathlib import Path
+import sys
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from services.submission_journal import SubmissionJournal
+
+
+class JournalRepo:
+    def __init__(self, failing: set[str] = frozenset(), taken: set[str] = frozenset()) -> None:
+        self.failing = set(failing)
+        self.taken = set(taken)
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.batches: list[list[str]] = []
+        self.rows: dict[str, dict] = {}
+        self._ids = itertools.count(1)
+
+    def _new_id(self) -> str:
+        return f"sub-{next(self._ids)}"
+
+    async def commit_submission_batch(self, entries: list[dict]) -> list[str]:
+        await self.gate.wait()
+        window_ids = [entry["windowId"] for entry in entries]
+        self.batches.append(window_ids)
+        if self.failing & set(window_ids):
+            raise RuntimeError("constraint violation")
+        written = []
+        for entry in entries:
+            if entry["windowId"] in self.taken:
+                continue
+            self.taken.add(entry["windowId"])
+            self.rows[entry["windowId"]] = entry
+            written.append(entry["windowId"])
+        return written
+
+
+async def _submit(journal: SubmissionJournal, window_id: str) -> str:
+    return await journal.submit(
+        window_id=window_id,
+        student_user_id="u1",
+        test_id="t1",
+        submitted_at=datetime(2026, 10, 19, 9, 30),
+        raw_answer_text="1A2B",
+        parsed_answers=["A", "B"],
+        score=2,
+        details=[(1, "A", "A", True), (2, "B", "C", False)],
+    )
+
+
+async def _drain(journal: SubmissionJournal) -> None:
+    for _ in range(200):
+        if not journal.pending:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{journal.pending} entries still pending")
+
+
+@pytest.mark.asyncio
+async def test_journal_replays_unacknowledged_entries_after_crash(tmp_path: Path) -> None:
+    repo = JournalRepo()
+    journal = SubmissionJournal(str(tmp_path), repo, max_delay=0.01)
+    await journal.open()
+
+    await _submit(journal, "w1")
+    await _drain(journal)
+
+    repo.gate.clear()
+    ids = {window_id: await _submit(journal, window_id) for window_id in ("w2", "w3")}
+    # Crash while the writer waits on the commit; the file is never closed cleanly.
+    await asyncio.sleep(0.05)
+    journal._writer.cancel()
+    await asyncio.gather(journal._writer, return_exceptions=True)
+    journal._file.close()
+
+    restarted_repo = JournalRepo(taken={"w1"})
+    restarted = SubmissionJournal(str(tmp_path), restarted_repo, max_delay=0.01)
+    assert await restarted.open() == 2
+    await _drain(restarted)
+    await restarted.close()
+
+    assert sorted(restarted_repo.rows) == ["w2", "w3"]
+    assert {window_id: row["submissionId"] for window_id, row in restarted_repo.rows.items()} == ids
+    assert restarted_repo.rows["w2"]["submittedAt"] == datetime(2026, 10, 19, 9, 30)
+    assert restarted.stats.committed == 2
+    assert tmp_path.joinpath(SubmissionJournal.FILE_NAME).stat().st_size == 0
+
+
+@pytest.mark.asyncio
+async def test_journal_dead_letters_failing_and_skipped_entries(tmp_path: Path) -> None:
+    repo = JournalRepo(failing={"bad"}, taken={"late"})
+    journal = SubmissionJournal(str(tmp_path), repo, max_delay=0.05, retry_delay=0, max_attempts=3)
+    await journal.open()
+
+    await asyncio.gather(*(_submit(journal, window_id) for window_id in ("ok", "bad", "late")))
+    await _drain(journal)
+    await journal.close()
+
+    assert sorted(repo.rows) == ["ok"]
+    assert repo.batches.count(["bad"]) == 3
+    assert journal.stats.committed == 1
+    assert journal.stats.skipped == 1
+    assert journal.stats.dead_lettered == 2
+
+    lines = tmp_path.joinpath(SubmissionJournal.DEAD_LETTER_NAME).read_text(encoding="utf-8").splitlines()
+    dead = {item["windowId"]: item for item in map(json.loads, lines)}
+    assert dead["bad"]["reason"] == "commit failed: constraint violation"
+    assert dead["late"]["reason"] == "window already submitted or closed"
+    assert dead["bad"]["details"] == [[1, "A", "A", True], [2, "B", "C", False]]
+
+    # Nothing is retried after a restart.
+    restarted = SubmissionJournal(str(tmp_path), JournalRepo(), max_delay=0.01)
+    assert await restarted.open() == 0
+    await restarted.close()
@@ -0,0 +1,99 @@
+"""Rewrite stored phones to the canonical +998XXXXXXXXX form used by bot lookups.
+
+    python -m tools.canonicalize_phones [--dry-run]
+
+Covers Student.phone, Student.parentPhone, User.phone and ParentContact.phone.
+Values that cannot be canonicalized, or whose canonical form is already taken by
+another row of a unique column, are left untouched and listed for manual review.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+import asyncpg  # noqa: E402
+
+from config import load_settings  # noqa: E402
+from db.pool import create_pool  # noqa: E402
+from db.repository import BotRepository  # noqa: E402
+from services.phone import is_uz_e164, normalize_uz_phone  # noqa: E402
+
+# (table, column, unique)
+TARGETS = [
+    ("Student", "phone", True),
+    ("Student", "parentPhone", False),
+    ("User", "phone", True),
+    ("ParentContact", "phone", True),
+]
+
+
+async def canonicalize_column(conn: asyncpg.Connection, table: str, column: str, unique: bool, dry_run: bool) -> dict:
+    rows = await conn.fetch(
+        f"""
+        SELECT id, "{column}" AS phone
+        FROM "{table}"
+        WHERE "{column}" IS NOT NULL
+          AND "{column}" !~ '^\\+998[0-9]{{9}}$'
+        """
+    )
+
+    stats = {"candidates": len(rows), "updated": 0, "invalid": [], "conflicts": []}
+    for row in rows:
+        canonical = normalize_uz_phone(row["phone"])
+        if not is_uz_e164(canonical):
+            stats["invalid"].append((row["id"], row["phone"]))
+            continue
+        if dry_run:
+            stats["updated"] += 1
+            continue
+
+        guard = f'AND NOT EXISTS (SELECT 1 FROM "{table}" WHERE "{column}" = $2)' if unique else ""
+        result = await conn.execute(
+            f'UPDATE "{table}" SET "{column}" = $2 WHERE id = $1 {guard}',
+            row["id"],
+            canonical,
+        )
+        if BotRepository._rows_affected(result) > 0:
+            stats["updated"] += 1
+        else:
+            stats["conflicts"].append((row["id"], row["phone"], canonical))
+
+    return stats
+
+
+async def run(dry_run: bool) -> None:
+    settings = load_settings()
+    pool = await create_pool(settings.database_url)
+    try:
+        async with pool.acquire() as conn:
+            for table, column, unique in TARGETS:
+                stats = await canonicalize_column(conn, table, column, unique, dry_run)
+                print(
+                    f'PHONES "{table}"."{column}": candidates={stats["candidates"]} '
+                    f'{"would_update" if dry_run else "updated"}={stats["updated"]} '
+                    f'invalid={len(stats["invalid"])} conflicts={len(stats["conflicts"])}'
+                )
+                for row_id, phone in stats["invalid"]:
+                    print(f"  invalid  {row_id}: {phone!r}")
+                for row_id, phone, canonical in stats["conflicts"]:
+                    print(f"  conflict {row_id}: {phone!r} -> {canonical} already used")
+    finally:
+        await pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
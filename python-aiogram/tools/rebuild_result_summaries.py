@@ -0,0 +1,81 @@
+"""Rebuild "StudentResultSummary" from Submission history.
+
+    python -m tools.rebuild_result_summaries [--student USER_ID] [--check]
+
+Every student with submissions or a stored summary is recomputed with
+km_result_summary_compute(). By default drifted rows are rewritten through
+km_result_summary_rebuild(); with --check they are only listed and the exit
+code is 1 when anything drifted.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import sys
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from config import load_settings  # noqa: E402
+from db.pool import create_pool  # noqa: E402
+
+DRIFT_SQL = """
+WITH ids AS (
+  SELECT DISTINCT "studentId" AS id FROM "Submission"
+  UNION
+  SELECT "studentId" FROM "StudentResultSummary"
+)
+SELECT ids.id,
+       r."studentId" IS NOT NULL AS stored,
+       km_result_summary_compute(ids.id) IS NOT NULL AS expected
+FROM ids
+LEFT JOIN "StudentResultSummary" r ON r."studentId" = ids.id
+WHERE ($1::text IS NULL OR ids.id = $1)
+  AND (to_jsonb(r) - 'studentId' - 'updatedAt') IS DISTINCT FROM km_result_summary_compute(ids.id)
+ORDER BY ids.id
+"""
+
+
+async def run(student_id: Optional[str], check: bool) -> None:
+    settings = load_settings()
+    pool = await create_pool(settings.database_url)
+    try:
+        async with pool.acquire() as conn:
+            total = await conn.fetchval('SELECT count(*) FROM "StudentResultSummary"')
+            drifted = await conn.fetch(DRIFT_SQL, student_id)
+
+            print(f"RESULT_SUMMARIES stored={total} drifted={len(drifted)}")
+            for row in drifted:
+                if not row["stored"]:
+                    kind = "missing"
+                elif not row["expected"]:
+                    kind = "stale"
+                else:
+                    kind = "changed"
+                print(f"  {kind:<8} {row['id']}")
+
+            if not check and drifted:
+                for row in drifted:
+                    await conn.execute("SELECT km_result_summary_rebuild($1)", row["id"])
+                print(f"RESULT_SUMMARIES rebuilt={len(drifted)}")
+    finally:
+        await pool.close()
+
+    if drifted and check:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--student", help="only this student's User id")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.student, args.check))
+
+
+if __name__ == "__main__":
+    main()
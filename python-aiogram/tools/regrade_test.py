@@ -0,0 +1,55 @@
+"""Recompute scores and SubmissionDetail rows after a test's answer key was corrected.
+
+    python -m tools.regrade_test <testId> [--batch-size 2000] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from config import load_settings  # noqa: E402
+from db.pool import create_pool  # noqa: E402
+from db.regrade import RegradeJob, RegradeProgress  # noqa: E402
+
+
+def print_progress(progress: RegradeProgress) -> None:
+    pct = (progress.scanned / progress.total * 100) if progress.total else 100.0
+    rate = progress.scanned / progress.elapsed if progress.elapsed else 0.0
+    print(
+        f"REGRADE {progress.scanned}/{progress.total} ({pct:.1f}%) "
+        f"score_changed={progress.score_changed} details_changed={progress.details_changed} "
+        f"{rate:.0f} rows/s"
+    )
+
+
+async def run(test_id: str, batch_size: int, dry_run: bool) -> None:
+    settings = load_settings()
+    pool = await create_pool(settings.database_url)
+    try:
+        job = RegradeJob(pool=pool, batch_size=batch_size, dry_run=dry_run, on_progress=print_progress)
+        progress = await job.run(test_id)
+    finally:
+        await pool.close()
+
+    mode = "DRY_RUN" if dry_run else "DONE"
+    print(f"REGRADE_{mode} test={test_id} submissions={progress.scanned} in {progress.elapsed:.1f}s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("test_id")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--dry-run", action="store_true", help="only count what would change")
+    args = parser.parse_args()
+    asyncio.run(run(args.test_id, args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
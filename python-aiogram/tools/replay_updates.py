@@ -0,0 +1,239 @@
+"""Replay recorded updates through the dispatcher and compare latency distributions.
+
+    python -m tools.replay_updates replay recordings/*.jsonl.gz --speed 10 --out build-a.json
+    python -m tools.replay_updates compare build-a.json build-b.json --tolerance 0.15
+
+Replay runs against DATABASE_URL (point it at a local snapshot); Bot API calls are
+answered by an in-process fake session, so nothing is sent to Telegram.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import replace
+from datetime import datetime
+import gzip
+import itertools
+import json
+import os
+from pathlib import Path
+import sys
+import time
+from typing import Any, Iterator, Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from aiogram import Bot  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.methods import TelegramMethod  # noqa: E402
+from aiogram.types import Chat, Message, Update, User  # noqa: E402
+
+from config import load_settings  # noqa: E402
+from db.pool import create_pool  # noqa: E402
+from db.repository import BotRepository  # noqa: E402
+from main import build_dispatcher  # noqa: E402
+from services.session_store import SessionStore  # noqa: E402
+
+
+class ReplaySession(BaseSession):
+    """Answers every Bot API call locally with a minimal well-formed result."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._message_ids = itertools.count(1)
+        self.calls: dict[str, int] = {}
+
+    async def close(self) -> None:
+        return None
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[Any], timeout: Optional[int] = None) -> Any:
+        name = type(method).__name__
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+        returning = method.__returning__
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.utcnow(),
+                chat=Chat(id=int(chat_id) if str(chat_id).lstrip("-").isdigit() else 0, type="private"),
+            ).as_(bot)
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="replay")
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[dict] = None, timeout: int = 30, chunk_size: int = 65536, raise_for_status: bool = True) -> Any:
+        raise RuntimeError("stream_content is not available during replay")
+
+
+def iter_records(paths: list[str]) -> Iterator[dict]:
+    for path in sorted(paths):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def update_kind(update: Update) -> str:
+    if update.message:
+        if update.message.contact:
+            return "message.contact"
+        if update.message.text and update.message.text.startswith("/"):
+            return "message.command"
+        return "message.text"
+    if update.callback_query:
+        data = update.callback_query.data or ""
+        return f"callback.{data.split(':', 1)[0]}"
+    return update.event_type
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def summarize(latencies: list[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p90": percentile(latencies, 0.90),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies) if latencies else 0.0,
+    }
+
+
+async def replay(paths: list[str], speed: float, out: str, limit: int) -> None:
+    os.environ.setdefault("BOT_TOKEN", "123456:replay")
+    settings = replace(load_settings(), record_updates_dir="", debug_updates=False)
+
+    pool = await create_pool(settings.database_url)
+    repo = BotRepository(pool=pool, fanout_budget=settings.db_fanout_budget)
+    session = ReplaySession()
+    bot = Bot(token=settings.bot_token, session=session)
+    dp = build_dispatcher(settings, repo, SessionStore())
+
+    samples: list[dict] = []
+    errors = 0
+
+    async def feed(update: Update, kind: str) -> None:
+        nonlocal errors
+        started = time.perf_counter()
+        error = None
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as exc:
+            errors += 1
+            error = type(exc).__name__
+        samples.append({"kind": kind, "ms": (time.perf_counter() - started) * 1000, "error": error})
+
+    tasks: list[asyncio.Task] = []
+    first_ts: Optional[float] = None
+    wall_start = time.perf_counter()
+
+    try:
+        for count, record in enumerate(iter_records(paths)):
+            if limit and count >= limit:
+                break
+            if first_ts is None:
+                first_ts = record["ts"]
+            if speed > 0:
+                due = (record["ts"] - first_ts) / speed
+                delay = due - (time.perf_counter() - wall_start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            update = Update.model_validate(record["update"], context={"bot": bot})
+            tasks.append(asyncio.create_task(feed(update, update_kind(update))))
+
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        await repo.close()
+        await bot.session.close()
+
+    by_kind: dict[str, list[float]] = {}
+    for sample in samples:
+        by_kind.setdefault(sample["kind"], []).append(sample["ms"])
+
+    result = {
+        "files": sorted(paths),
+        "speed": speed,
+        "wallSeconds": time.perf_counter() - wall_start,
+        "errors": errors,
+        "botApiCalls": session.calls,
+        "overall": summarize([s["ms"] for s in samples]),
+        "byKind": {kind: summarize(values) for kind, values in sorted(by_kind.items())},
+        "samples": samples,
+    }
+    Path(out).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"REPLAY_DONE updates={len(samples)} errors={errors} -> {out}")
+    print_summary("overall", result["overall"])
+
+
+def print_summary(label: str, stats: dict) -> None:
+    print(
+        f"{label:<24} n={stats['count']:<6} mean={stats['mean']:.1f}ms "
+        f"p50={stats['p50']:.1f} p90={stats['p90']:.1f} p99={stats['p99']:.1f} max={stats['max']:.1f}"
+    )
+
+
+def compare(base_path: str, head_path: str, tolerance: float) -> int:
+    base = json.loads(Path(base_path).read_text(encoding="utf-8"))
+    head = json.loads(Path(head_path).read_text(encoding="utf-8"))
+
+    regressions = []
+    kinds = ["overall"] + sorted(set(base["byKind"]) | set(head["byKind"]))
+    for kind in kinds:
+        a = base["overall"] if kind == "overall" else base["byKind"].get(kind)
+        b = head["overall"] if kind == "overall" else head["byKind"].get(kind)
+        if not a or not b:
+            print(f"{kind:<24} only in {'head' if b else 'base'}")
+            continue
+
+        parts = []
+        for metric in ("p50", "p90", "p99"):
+            delta = (b[metric] - a[metric]) / a[metric] if a[metric] else 0.0
+            parts.append(f"{metric} {a[metric]:.1f}->{b[metric]:.1f} ({delta:+.0%})")
+            if metric == "p99" and delta > tolerance:
+                regressions.append(kind)
+        print(f"{kind:<24} " + " | ".join(parts))
+
+    if regressions:
+        print(f"REGRESSION p99 > +{tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("replay", help="feed recorded updates through the dispatcher")
+    run.add_argument("files", nargs="+")
+    run.add_argument("--speed", type=float, default=1.0, help="1 = real time, 10 = 10x faster, 0 = no pauses")
+    run.add_argument("--out", default="replay-result.json")
+    run.add_argument("--limit", type=int, default=0)
+
+    cmp_ = sub.add_parser("compare", help="compare two replay results")
+    cmp_.add_argument("base")
+    cmp_.add_argument("head")
+    cmp_.add_argument("--tolerance", type=float, default=0.10)
+
+    args = parser.parse_args()
+    if args.command == "replay":
+        asyncio.run(replay(args.files, args.speed, args.out, args.limit))
+        return
+    raise SystemExit(compare(args.base, args.head, args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare the trigger-maintained "BotActor" table with a fresh resolution.
+
+    python -m tools.verify_bot_actors [--repair]
+
+Every Telegram id known to User, ParentContact or BotActor is recomputed with
+km_bot_actor_compute() and diffed against its stored row. With --repair the
+drifted ids are rewritten through km_bot_actor_refresh().
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+import sys
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from config import load_settings  # noqa: E402
+from db.pool import create_pool  # noqa: E402
+
+DRIFT_SQL = """
+WITH ids AS (
+  SELECT "telegramUserId" AS tg FROM "User" WHERE "telegramUserId" IS NOT NULL
+  UNION
+  SELECT "telegramUserId" FROM "ParentContact"
+  UNION
+  SELECT "telegramUserId" FROM "BotActor"
+)
+SELECT ids.tg,
+       b."telegramUserId" IS NOT NULL AS stored,
+       km_bot_actor_compute(ids.tg) IS NOT NULL AS expected
+FROM ids
+LEFT JOIN "BotActor" b ON b."telegramUserId" = ids.tg
+WHERE (to_jsonb(b) - 'updatedAt') IS DISTINCT FROM (km_bot_actor_compute(ids.tg) - 'updatedAt')
+ORDER BY ids.tg
+"""
+
+
+async def run(repair: bool) -> None:
+    settings = load_settings()
+    pool = await create_pool(settings.database_url)
+    try:
+        async with pool.acquire() as conn:
+            total = await conn.fetchval('SELECT count(*) FROM "BotActor"')
+            drifted = await conn.fetch(DRIFT_SQL)
+
+            print(f"BOT_ACTORS stored={total} drifted={len(drifted)}")
+            for row in drifted:
+                if not row["stored"]:
+                    kind = "missing"
+                elif not row["expected"]:
+                    kind = "stale"
+                else:
+                    kind = "changed"
+                print(f"  {kind:<8} {row['tg']}")
+
+            if repair and drifted:
+                for row in drifted:
+                    await conn.execute("SELECT km_bot_actor_refresh($1)", row["tg"])
+                print(f"BOT_ACTORS repaired={len(drifted)}")
+    finally:
+        await pool.close()
+
+    if drifted and not repair:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repair", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(run(args.repair))
+
+
+if __name__ == "__main__":
+    main()